@@ -0,0 +1,121 @@
+"""Measure how much memory the cache uses per entity.
+
+Run with ``python -m benchmarks.cache`` from the repository root.
+A GUILD_CREATE with synthetic members is fed through the cache and the growth measured with :mod:`tracemalloc`.
+The payloads are freed before measuring, so only what the cache keeps is counted.
+"""
+from __future__ import annotations
+
+import gc
+import tracemalloc
+from asyncio import run
+from typing import TYPE_CHECKING
+
+from nextcord import Client, Intents
+from nextcord.core.cache import LRU, NoCache, Unbounded
+
+if TYPE_CHECKING:
+    from typing import Any
+
+MEMBERS = 50_000
+GUILDS = 1_000
+MESSAGES = 10_000
+
+
+def make_member(user_id: int) -> dict[str, Any]:
+    return {
+        "user": {
+            "id": str(80351110224678912 + user_id),
+            "username": f"user{user_id}",
+            "discriminator": f"{user_id % 10000:04}",
+            "avatar": "a_1269e74af4df7417b13759eae50c83dc",
+        },
+        "roles": ["613425648685547541", "613425648685547542"],
+        "nick": None,
+        "joined_at": "2021-08-29T12:00:00.000000+00:00",
+    }
+
+
+def make_guild(guild_id: int, members: list[dict[str, Any]]) -> dict[str, Any]:
+    return {
+        "id": str(613425648685547000 + guild_id),
+        "name": f"guild {guild_id}",
+        "owner_id": "80351110224678912",
+        "icon": None,
+        "member_count": len(members),
+        "channels": [],
+        "members": members,
+    }
+
+
+def make_message(message_id: int) -> dict[str, Any]:
+    return {
+        "id": str(900000000000000000 + message_id),
+        "channel_id": "613425648685547541",
+        "author": make_member(message_id % 100)["user"],
+        "content": "Hello world! This is a fairly typical message.",
+    }
+
+
+def measure(policies: dict[str, Any], events: list[tuple[str, dict[str, Any]]]) -> int:
+    async def inner() -> int:
+        client = Client("token", Intents(), cache_policies=policies)
+        dispatch = client.state.gateway.event_dispatcher.dispatch
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for event_name, data in events:
+            dispatch(event_name, None, data)
+        events.clear()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        await client.state.http.close()
+        return after - before
+
+    return run(inner())
+
+
+def main() -> None:
+    nothing = {"guilds": NoCache(), "channels": NoCache(), "members": NoCache(), "users": NoCache()}
+    print(f"{'entity':>22} {'count':>7} {'bytes/entity':>13}")
+
+    cases: list[tuple[str, int, dict[str, Any], Any]] = [
+        (
+            "member (with user)",
+            MEMBERS,
+            {**nothing, "members": Unbounded(), "users": Unbounded()},
+            lambda: [("GUILD_CREATE", make_guild(0, [make_member(i) for i in range(MEMBERS)]))],
+        ),
+        (
+            "member (no user)",
+            MEMBERS,
+            {**nothing, "members": Unbounded()},
+            lambda: [("GUILD_CREATE", make_guild(0, [make_member(i) for i in range(MEMBERS)]))],
+        ),
+        (
+            "member (LRU)",
+            MEMBERS,
+            {**nothing, "members": LRU(MEMBERS)},
+            lambda: [("GUILD_CREATE", make_guild(0, [make_member(i) for i in range(MEMBERS)]))],
+        ),
+        (
+            "guild",
+            GUILDS,
+            {**nothing, "guilds": Unbounded()},
+            lambda: [("GUILD_CREATE", make_guild(i, [])) for i in range(GUILDS)],
+        ),
+        (
+            "message (LRU)",
+            MESSAGES,
+            {**nothing, "messages": LRU(MESSAGES)},
+            lambda: [("MESSAGE_CREATE", make_message(i)) for i in range(MESSAGES)],
+        ),
+    ]
+    for name, count, policies, make_events in cases:
+        used = measure(policies, make_events())
+        print(f"{name:>22} {count:>7} {used / count:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare event dispatch throughput with and without inline dispatch.
+
+Run with ``python -m benchmarks.dispatch`` from the repository root.
+Decoded payloads from ``benchmarks/data/gateway_events.jsonl`` are fed through a shard the same way its receive loop
+does (opcode dispatcher, event dispatcher, then the gateway dispatchers) with one coroutine listener per event.
+"""
+from __future__ import annotations
+
+import json
+from asyncio import get_running_loop, run, sleep
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from nextcord import Client, Intents
+from nextcord.core.gateway.enums import OpcodeEnum
+
+if TYPE_CHECKING:
+    from typing import Any
+
+TRACE = Path(__file__).parent / "data" / "gateway_events.jsonl"
+ROUNDS = 50
+
+
+def load_trace() -> list[dict[str, Any]]:
+    with TRACE.open() as file:
+        return [json.loads(line) for line in file]
+
+
+async def bench(events: list[dict[str, Any]], inline: bool) -> float:
+    client = Client("token", Intents(), inline_dispatch=inline)
+    gateway = client.state.gateway
+    gateway.shard_count = 1
+    shard = client.state.type_sheet.shard(client.state, 0)
+    gateway.shards = [shard]
+
+    total = len(events) * ROUNDS
+    handled = 0
+    done = get_running_loop().create_future()
+
+    async def listener(*_: Any) -> None:
+        nonlocal handled
+        handled += 1
+        if handled == total:
+            done.set_result(None)
+
+    gateway.event_dispatcher.add_listener(listener)
+
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        for data in events:
+            shard.opcode_dispatcher.dispatch(data["op"], data)
+            if data["op"] == OpcodeEnum.DISPATCH.value:
+                shard.event_dispatcher.dispatch(data["t"], data["d"])
+        # Let listeners run like they would between websocket reads
+        await sleep(0)
+    await done
+    elapsed = perf_counter() - start
+
+    await client.state.http.close()
+    return total / elapsed
+
+
+def main() -> None:
+    events = load_trace()
+    print(f"{len(events) * ROUNDS} events through one shard, one listener")
+    print(f"{'mode':>8} {'events/s':>10}")
+    for name, inline in (("task", False), ("inline", True)):
+        rate = run(bench(events, inline))
+        print(f"{name:>8} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
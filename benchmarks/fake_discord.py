@@ -0,0 +1,307 @@
+"""A local stand-in for the Discord REST API and gateway, to benchmark and test against without discord.
+
+The REST side answers every route with ratelimit headers like discord does: each route has a bucket per major
+parameter, there is a global limit, and going over either gets a 429. ``GET /gateway/bot`` points at the gateway side,
+which says hello, answers identify, resume and heartbeats, then replays a trace of recorded events to every shard.
+Payloads are compressed with ``zlib-stream`` if the client asks for it.
+
+.. code-block:: python3
+
+    async with FakeDiscord(events=load_trace()) as discord:
+        client = Client("token", Intents(), shard_count=2)
+        client.state.http.api_base = discord.api_base
+"""
+from __future__ import annotations
+
+import json
+import zlib
+from asyncio import Event, get_running_loop, sleep
+from email.utils import formatdate
+from hashlib import sha1
+from itertools import count
+from pathlib import Path
+from time import perf_counter, time
+from typing import TYPE_CHECKING
+
+from aiohttp import WSMsgType, web
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+TRACE = Path(__file__).parent / "data" / "gateway_events.jsonl"
+MAJOR_PARAMETERS = {"guilds", "channels", "webhooks"}
+
+
+def load_trace(path: Path = TRACE) -> list[dict[str, Any]]:
+    """Load recorded gateway payloads, one JSON object per line"""
+    with path.open() as file:
+        return [json.loads(line) for line in file]
+
+
+def bucket_key(method: str, path: str, *, keep_major: bool = True) -> str:
+    """The bucket a request falls under. Ids are left in for major parameters, like discord does"""
+    parts = path.split("/")
+    for index, part in enumerate(parts):
+        if part.isdigit() and not (keep_major and parts[index - 1] in MAJOR_PARAMETERS):
+            parts[index] = "{id}"
+    return f"{method}:{'/'.join(parts)}"
+
+
+class _Window:
+    """A fixed ratelimit window which starts with its first request"""
+
+    __slots__ = ("limit", "per", "remaining", "reset_at")
+
+    def __init__(self, limit: int, per: float) -> None:
+        self.limit: int = limit
+        self.per: float = per
+        self.remaining: int = limit
+        self.reset_at: float = 0
+
+    def take(self, now: float) -> bool:
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining == 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+class FakeDiscord:
+    """A fake discord. Use as a async context manager or call :meth:`start` and :meth:`close`
+
+    Parameters
+    ----------
+    events:
+        Gateway payloads to replay to every shard after it is ready. Sequence numbers are rewritten
+    loops: :class:`int`
+        How many times to replay ``events``
+    event_rate: :class:`Optional[float]`
+        Events per second per shard. None sends them as fast as the connection takes them
+    shards: :class:`int`
+        The recommended shard count ``GET /gateway/bot`` returns
+    max_concurrency: :class:`int`
+        How many shards can identify every 5 seconds
+    route_limit: :class:`int`
+        How many requests each bucket allows per ``route_per`` seconds
+    route_per: :class:`float`
+        The length of a bucket window in seconds
+    global_limit: :class:`int`
+        How many requests are allowed per second across every route
+    clock_skew: :class:`float`
+        How many seconds the server clock is ahead of the local one, for the ``Date`` and ``X-RateLimit-Reset`` headers
+    latency: :class:`float`
+        How many seconds each REST request takes
+    heartbeat_interval: :class:`int`
+        The heartbeat interval sent in hello, in milliseconds
+    """
+
+    def __init__(
+        self,
+        *,
+        events: Optional[list[dict[str, Any]]] = None,
+        loops: int = 1,
+        event_rate: Optional[float] = None,
+        shards: int = 1,
+        max_concurrency: int = 1,
+        route_limit: int = 5,
+        route_per: float = 1,
+        global_limit: int = 50,
+        clock_skew: float = 0,
+        latency: float = 0,
+        heartbeat_interval: int = 41250,
+    ) -> None:
+        self.events: list[dict[str, Any]] = events or []
+        self.loops: int = loops
+        self.event_rate: Optional[float] = event_rate
+        self.shards: int = shards
+        self.max_concurrency: int = max_concurrency
+        self.route_limit: int = route_limit
+        self.route_per: float = route_per
+        self.clock_skew: float = clock_skew
+        self.latency: float = latency
+        self.heartbeat_interval: int = heartbeat_interval
+
+        self._buckets: dict[str, _Window] = {}
+        self._global = _Window(global_limit, 1)
+        self._runner: Optional[web.AppRunner] = None
+        self._session_ids = count()
+        self.url: str = ""
+
+        # Stats
+        self.requests: int = 0
+        """REST requests answered, including 429s"""
+        self.ratelimited: int = 0
+        """REST requests answered with a 429"""
+        self.identifies: int = 0
+        self.resumes: int = 0
+        self.sent_at: dict[int, list[float]] = {}
+        """Shard id -> when each replayed event was sent (:func:`time.perf_counter`), indexed by sequence number"""
+        self.replayed: Event = Event()
+        """Set once every shard of the recommended shard count has been sent the whole replay"""
+        self._replays_done: int = 0
+
+    @property
+    def api_base(self) -> str:
+        """What to set :attr:`HTTPClient.api_base <nextcord.core.http.HTTPClient.api_base>` to"""
+        return f"{self.url}/api/v9"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/gateway", self._handle_gateway)
+        app.router.add_route("*", "/api/v9/{tail:.*}", self._handle_rest)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> FakeDiscord:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+    # REST
+    async def _handle_rest(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await sleep(self.latency)
+        now = time() + self.clock_skew
+        headers = {"Date": formatdate(now, usegmt=True), "Via": "1.1 google"}
+
+        path = "/" + request.match_info["tail"]
+        if path == "/gateway/bot":
+            return web.json_response(self._gateway_bot(), headers=headers)
+        if path == "/gateway":
+            return web.json_response({"url": self.url.replace("http", "ws", 1) + "/gateway"}, headers=headers)
+
+        if not self._global.take(now):
+            return self._ratelimited(headers, self._global.reset_at - now, "global")
+
+        key = bucket_key(request.method, path)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Window(self.route_limit, self.route_per)
+        allowed = bucket.take(now)
+        headers |= {
+            "X-RateLimit-Limit": str(bucket.limit),
+            "X-RateLimit-Remaining": str(bucket.remaining),
+            "X-RateLimit-Reset": f"{bucket.reset_at:.3f}",
+            "X-RateLimit-Reset-After": f"{bucket.reset_at - now:.3f}",
+            "X-RateLimit-Bucket": sha1(bucket_key(request.method, path, keep_major=False).encode()).hexdigest()[:16],
+        }
+        if not allowed:
+            return self._ratelimited(headers, bucket.reset_at - now, "user")
+
+        if request.method == "DELETE":
+            return web.Response(status=204, headers=headers)
+        return web.json_response({"id": "0"}, headers=headers)
+
+    def _ratelimited(self, headers: dict[str, str], retry_after: float, scope: str) -> web.Response:
+        self.ratelimited += 1
+        headers = {**headers, "Retry-After": str(max(round(retry_after), 1)), "X-RateLimit-Scope": scope}
+        is_global = scope == "global"
+        if is_global:
+            headers["X-RateLimit-Global"] = "true"
+        body = {"message": "You are being rate limited.", "retry_after": round(retry_after, 3), "global": is_global}
+        return web.json_response(body, status=429, headers=headers)
+
+    def _gateway_bot(self) -> dict[str, Any]:
+        return {
+            "url": self.url.replace("http", "ws", 1) + "/gateway",
+            "shards": self.shards,
+            "session_start_limit": {
+                "total": 1000,
+                "remaining": 1000,
+                "reset_after": 86400000,
+                "max_concurrency": self.max_concurrency,
+            },
+        }
+
+    # Gateway
+    async def _handle_gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        compressor = zlib.compressobj() if request.query.get("compress") == "zlib-stream" else None
+
+        async def send(payload: dict[str, Any]) -> None:
+            data = json.dumps(payload, separators=(",", ":")).encode()
+            if compressor is None:
+                await ws.send_str(data.decode())
+            else:
+                await ws.send_bytes(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        await send({"op": 10, "d": {"heartbeat_interval": self.heartbeat_interval}, "s": None, "t": None})
+        replay = None
+        async for message in ws:
+            if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                break
+            payload = json.loads(message.data)
+            op = payload["op"]
+            if op == 1:
+                await send({"op": 11, "d": None, "s": None, "t": None})
+            elif op == 2:
+                self.identifies += 1
+                shard_id = (payload["d"].get("shard") or (0, 1))[0]
+                ready = {
+                    "v": 9,
+                    "session_id": f"session-{next(self._session_ids)}",
+                    "resume_gateway_url": self.url.replace("http", "ws", 1) + "/gateway",
+                    "user": {"id": "1", "username": "bot", "discriminator": "0000", "bot": True},
+                    "guilds": [],
+                    "shard": payload["d"].get("shard"),
+                }
+                await send({"op": 0, "t": "READY", "s": 0, "d": ready})
+                replay = get_running_loop().create_task(self._replay(send, shard_id))
+            elif op == 6:
+                self.resumes += 1
+                await send({"op": 0, "t": "RESUMED", "s": payload["d"]["seq"], "d": {}})
+        if replay is not None:
+            replay.cancel()
+        return ws
+
+    async def _replay(self, send: Any, shard_id: int) -> None:
+        sent_at = self.sent_at[shard_id] = [0.0]
+        interval = None if self.event_rate is None else 1 / self.event_rate
+        start = perf_counter()
+        sequence = 0
+        try:
+            for _ in range(self.loops):
+                for event in self.events:
+                    sequence += 1
+                    if interval is not None:
+                        # Paced against the start so slow sends do not lower the rate
+                        delay = start + sequence * interval - perf_counter()
+                        if delay > 0:
+                            await sleep(delay)
+                    sent_at.append(perf_counter())
+                    await send({**event, "s": sequence})
+                # Let the client read between loops when sending as fast as possible
+                await sleep(0)
+        except ConnectionResetError:
+            return
+        self._replays_done += 1
+        if self._replays_done >= self.shards:
+            self.replayed.set()
+
+
+async def main() -> None:
+    """Run a fake discord until interrupted, to point a bot at by hand"""
+    async with FakeDiscord(events=load_trace()) as discord:
+        print(f"Listening on {discord.url}, set HTTPClient.api_base to {discord.api_base}")
+        await Event().wait()
+
+
+if __name__ == "__main__":
+    from asyncio import run
+
+    run(main())
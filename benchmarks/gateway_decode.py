@@ -0,0 +1,83 @@
+"""Compare gateway decode throughput across encodings and transport compressions.
+
+Run with ``python -m benchmarks.gateway_decode`` from the repository root.
+Payloads are replayed from ``benchmarks/data/gateway_events.jsonl``, a trace shaped like a busy guild
+(mostly PRESENCE_UPDATE, TYPING_START and GUILD_MEMBER_UPDATE).
+"""
+from __future__ import annotations
+
+import json
+import zlib
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from nextcord.core.gateway import etf
+from nextcord.core.gateway.compression import create_inflater, zstandard
+from nextcord.utils import json_loads
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Optional
+
+TRACE = Path(__file__).parent / "data" / "gateway_events.jsonl"
+ROUNDS = 20
+
+
+def load_trace() -> list[dict[str, Any]]:
+    with TRACE.open() as file:
+        return [json.loads(line) for line in file]
+
+
+def encode(events: list[dict[str, Any]], encoding: str) -> list[bytes]:
+    if encoding == "etf":
+        return [etf.dumps(event) for event in events]
+    return [json.dumps(event, separators=(",", ":")).encode("utf-8") for event in events]
+
+
+def compress(payloads: list[bytes], compression: Optional[str]) -> list[bytes]:
+    if compression == "zlib-stream":
+        compressor = zlib.compressobj()
+        return [compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH) for payload in payloads]
+    if compression == "zstd-stream":
+        zstd = zstandard.ZstdCompressor().compressobj()
+        return [zstd.compress(payload) + zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) for payload in payloads]
+    return payloads
+
+
+def bench(events: list[dict[str, Any]], encoding: str, compression: Optional[str]) -> tuple[float, int]:
+    frames = compress(encode(events, encoding), compression)
+    loads: Callable[[Any], Any] = etf.loads if encoding == "etf" else json_loads
+
+    start = perf_counter()
+    for _ in range(ROUNDS):
+        if compression is None:
+            for frame in frames:
+                loads(frame)
+        else:
+            inflater = create_inflater(compression)  # type: ignore
+            for frame in frames:
+                loads(inflater.decompress(frame))
+    elapsed = perf_counter() - start
+    return len(frames) * ROUNDS / elapsed, sum(len(frame) for frame in frames)
+
+
+def main() -> None:
+    events = load_trace()
+    modes: list[tuple[str, Optional[str]]] = [
+        ("json", None),
+        ("json", "zlib-stream"),
+        ("etf", None),
+        ("etf", "zlib-stream"),
+    ]
+    if zstandard is not None:
+        modes += [("json", "zstd-stream"), ("etf", "zstd-stream")]
+
+    print(f"{len(events)} events, ETF decoder: {'erlpack' if etf.erlpack is not None else 'pure python'}")
+    print(f"{'encoding':>8} {'compression':>12} {'events/s':>10} {'wire bytes':>11}")
+    for encoding, compression in modes:
+        rate, wire_bytes = bench(events, encoding, compression)
+        print(f"{encoding:>8} {str(compression):>12} {rate:>10.0f} {wire_bytes:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Microbenchmark for waking up queued ratelimit waiters.
+
+Run with ``python -m benchmarks.ratelimiter`` from the repository root. The cost per released waiter should stay flat as the queue grows.
+"""
+from __future__ import annotations
+
+from asyncio import get_running_loop, run, sleep
+from time import perf_counter, time
+
+from nextcord.core.http import Bucket, Route
+from nextcord.core.ratelimiter import TimesPer
+
+QUEUE_SIZES = (100, 1_000, 10_000)
+
+
+async def bench_bucket(waiters: int) -> float:
+    bucket = Bucket(Route("POST", "/channels/{channel_id}/messages", channel_id=1))
+    bucket.limit = waiters
+    bucket.reset_at = time() + 3600
+    bucket.remaining = 0
+
+    loop = get_running_loop()
+    tasks = [loop.create_task(bucket.__aenter__()) for _ in range(waiters)]
+    await sleep(0)  # Let every task queue up
+
+    start = perf_counter()
+    bucket._reset()
+    elapsed = perf_counter() - start
+
+    await sleep(0)
+    assert all(task.done() for task in tasks)
+    return elapsed / waiters
+
+
+async def bench_times_per(waiters: int) -> float:
+    ratelimiter = TimesPer(waiters, 3600)
+    ratelimiter.current = 0
+    ratelimiter.pending_reset = True  # Keep the window closed until we reset manually
+
+    loop = get_running_loop()
+    tasks = [loop.create_task(ratelimiter.acquire()) for _ in range(waiters)]
+    await sleep(0)
+
+    start = perf_counter()
+    ratelimiter.reset()
+    elapsed = perf_counter() - start
+
+    await sleep(0)
+    assert all(task.done() for task in tasks)
+    return elapsed / waiters
+
+
+async def main() -> None:
+    print(f"{'waiters':>10} {'Bucket ns/wake':>16} {'TimesPer ns/wake':>18}")
+    for waiters in QUEUE_SIZES:
+        bucket = await bench_bucket(waiters)
+        times_per = await bench_times_per(waiters)
+        print(f"{waiters:>10} {bucket * 1e9:>16.0f} {times_per * 1e9:>18.0f}")
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,65 @@
+"""Measure the per-request overhead of creating routes and looking up their ratelimit buckets.
+
+Run with ``python -m benchmarks.routes`` from the repository root.
+Every iteration does what :meth:`HTTPClient.request <nextcord.core.http.HTTPClient.request>` does before sending:
+create the route, then find its bucket. The best of a few runs is reported to filter out noise.
+"""
+from __future__ import annotations
+
+from asyncio import run
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from nextcord.client.state import State
+from nextcord.core.http import Route
+from nextcord.type_sheet import TypeSheet
+
+if TYPE_CHECKING:
+    from typing import Any
+
+ITERATIONS = 50_000
+REPEATS = 7
+ROUTES: list[tuple[str, str, dict[str, Any]]] = [
+    ("POST", "/channels/{channel_id}/messages", {"channel_id": 613425648685547541}),
+    ("PATCH", "/channels/{channel_id}/messages/{message_id}", {"channel_id": 1, "message_id": 2}),
+    (
+        "PUT",
+        "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        {"channel_id": 1, "message_id": 2, "emoji": "%F0%9F%91%8D"},
+    ),
+    ("GET", "/guilds/{guild_id}/members/{user_id}", {"guild_id": 1, "user_id": 2}),
+    ("GET", "/gateway/bot", {}),
+]
+
+
+class FakeClient:
+    ...
+
+
+async def bench(method: str, path: str, parameters: dict[str, Any]) -> float:
+    state = State(FakeClient(), TypeSheet.default(), "token", 0, None)  # type: ignore
+    http = state.http
+    # Learn the bucket hash like after the first response
+    first = Route(method, path, **parameters)  # type: ignore
+    http._set_bucket_hash(first, http._get_bucket(first), "abcd")
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = perf_counter()
+        for _ in range(ITERATIONS):
+            route = Route(method, path, **parameters)  # type: ignore
+            http._get_bucket(route)
+        best = min(best, perf_counter() - start)
+    await http.close()
+    return best / ITERATIONS
+
+
+def main() -> None:
+    print(f"{'route':>60} {'ns/request':>11}")
+    for method, path, parameters in ROUTES:
+        per_request = run(bench(method, path, parameters))
+        print(f"{method + ' ' + path:>60} {per_request * 1e9:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
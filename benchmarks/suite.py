@@ -0,0 +1,153 @@
+"""Measure REST and gateway throughput against a local fake discord.
+
+Run with ``python -m benchmarks.suite`` from the repository root. Reports:
+
+- REST requests per second through :class:`HTTPClient <nextcord.core.http.HTTPClient>`, and how many got a 429
+- Events per second per shard, from the fake gateway sending them to a listener being called
+- p50 and p99 latency from the fake gateway sending a event to a listener being called, at a steady rate
+- Memory allocated by nextcord per shard after replaying the trace, with the default entity cache
+
+The fake discord runs in the same process, so its work counts against the numbers. Compare runs on the same machine.
+"""
+from __future__ import annotations
+
+import tracemalloc
+from asyncio import Event, gather, run, wait_for
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from nextcord import Client, Intents
+from nextcord.core.http import Route
+from nextcord.core.ratelimiter import TimesPer
+
+from .fake_discord import FakeDiscord, load_trace
+
+if TYPE_CHECKING:
+    from typing import Any
+
+REST_CHANNELS = 100
+REST_REQUESTS_PER_CHANNEL = 20
+THROUGHPUT_SHARDS = 2
+THROUGHPUT_LOOPS = 50
+LATENCY_RATE = 2000
+LATENCY_LOOPS = 10
+MEMORY_SHARDS = 4
+
+
+async def connect(discord: FakeDiscord, shard_count: int) -> Client:
+    client = Client("token", Intents(), shard_count=shard_count)
+    client.state.http.api_base = discord.api_base
+    await client.state.gateway.connect()
+    return client
+
+
+async def close(client: Client) -> None:
+    await client.state.gateway.close()
+    await client.state.http.close()
+
+
+async def bench_rest() -> tuple[float, int]:
+    # Large bots get a raised global limit. Lift it so the buckets and the client overhead are measured
+    async with FakeDiscord(route_limit=REST_REQUESTS_PER_CHANNEL, global_limit=1_000_000) as discord:
+        client = Client("token", Intents())
+        http = client.state.http
+        http.api_base = discord.api_base
+        http._global_ratelimiter = TimesPer(1_000_000, 1)
+
+        routes = [
+            Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+            for channel_id in range(REST_CHANNELS)
+            for _ in range(REST_REQUESTS_PER_CHANNEL)
+        ]
+        start = perf_counter()
+        for response in await gather(*(http.request(route, json={"content": "hello"}) for route in routes)):
+            response.release()
+        elapsed = perf_counter() - start
+        await http.close()
+        return len(routes) / elapsed, discord.ratelimited
+
+
+async def wait_for_events(client: Client, total: int) -> float:
+    """Wait until a listener got ``total`` events, returning when the last one arrived"""
+    handled = 0
+    done = Event()
+    finished_at = 0.0
+
+    def listener(*_: Any) -> None:
+        nonlocal handled, finished_at
+        handled += 1
+        if handled == total:
+            finished_at = perf_counter()
+            done.set()
+
+    client.state.gateway.event_dispatcher.add_listener(listener)
+    await wait_for(done.wait(), 120)
+    return finished_at
+
+
+async def bench_throughput(events: list[dict[str, Any]]) -> float:
+    async with FakeDiscord(
+        events=events, loops=THROUGHPUT_LOOPS, shards=THROUGHPUT_SHARDS, max_concurrency=THROUGHPUT_SHARDS
+    ) as discord:
+        total = len(events) * THROUGHPUT_LOOPS * THROUGHPUT_SHARDS
+        client = await connect(discord, THROUGHPUT_SHARDS)
+        # READY is dispatched too
+        finished_at = await wait_for_events(client, total + THROUGHPUT_SHARDS)
+        started_at = min(sent_at[1] for sent_at in discord.sent_at.values())
+        await close(client)
+        return total / (finished_at - started_at) / THROUGHPUT_SHARDS
+
+
+async def bench_latency(events: list[dict[str, Any]]) -> tuple[float, float]:
+    async with FakeDiscord(events=events, loops=LATENCY_LOOPS, event_rate=LATENCY_RATE) as discord:
+        latencies = []
+
+        def listener(shard: Any, _: Any) -> None:
+            # The sequence is set before listeners are called
+            latencies.append(perf_counter() - discord.sent_at[shard.shard_id][shard._seq])
+
+        client = Client("token", Intents(), shard_count=1)
+        client.state.http.api_base = discord.api_base
+        for event_name in {event["t"] for event in events}:
+            client.state.gateway.event_dispatcher.add_listener(listener, event_name)
+        await client.state.gateway.connect()
+        await wait_for(discord.replayed.wait(), 120)
+        await close(client)
+
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+async def bench_memory(events: list[dict[str, Any]]) -> float:
+    async with FakeDiscord(events=events, shards=MEMORY_SHARDS, max_concurrency=MEMORY_SHARDS) as discord:
+        # Only count allocations made from nextcord code, not the fake discord in the same process
+        only_nextcord = [tracemalloc.Filter(True, "*/nextcord/*", all_frames=True)]
+        tracemalloc.start(25)
+        before = tracemalloc.take_snapshot().filter_traces(only_nextcord)
+
+        client = await connect(discord, MEMORY_SHARDS)
+        await wait_for_events(client, (len(events) + 1) * MEMORY_SHARDS)
+
+        after = tracemalloc.take_snapshot().filter_traces(only_nextcord)
+        tracemalloc.stop()
+        await close(client)
+
+        grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        return grown / MEMORY_SHARDS
+
+
+def main() -> None:
+    events = load_trace()
+    print(f"Trace of {len(events)} events")
+
+    rate, ratelimited = run(bench_rest())
+    print(f"{'REST requests/s':>24} {rate:>12.0f}  ({ratelimited} 429s)")
+    print(f"{'events/s per shard':>24} {run(bench_throughput(events)):>12.0f}")
+    p50, p99 = run(bench_latency(events))
+    print(f"{'dispatch latency p50':>24} {p50 * 1e6:>10.0f}us")
+    print(f"{'dispatch latency p99':>24} {p99 * 1e6:>10.0f}us")
+    print(f"{'memory per shard':>24} {run(bench_memory(events)) / 1024:>10.0f}KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@
 # DEALINGS IN THE SOFTWARE.
 from __future__ import annotations
 
+from asyncio import gather
 from asyncio.futures import Future
 from logging import getLogger
 from typing import TYPE_CHECKING
@@ -30,8 +31,10 @@ from ..type_sheet import TypeSheet
 from .state import State
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Any, Iterable, Literal, Optional
 
+    from ..core.gateway.protocols.session_store import SessionStoreProtocol
+    from ..core.protocols.metrics import MetricsProtocol
     from ..flags import Intents
 
 
@@ -54,6 +57,53 @@ class Client:
 
         .. note::
             This will be locked in if you set it. If your bot ever outgrows your shardcount, you will get a error
+    gateway_encoding: :class:`str`
+        The encoding to receive gateway payloads in. Either ``json`` or ``etf``.
+        ETF uses `erlpack <https://github.com/discord/erlpack>`_ if installed. Without it ETF decodes about 20 times
+        slower than ``json``, and it is not smaller on the wire. See ``benchmarks/gateway_decode.py``.
+    gateway_compression: :class:`Optional[str]`
+        The transport compression to use. Either ``zlib-stream``, ``zstd-stream`` or None for no compression.
+        ``zstd-stream`` requires `zstandard <https://pypi.org/project/zstandard/>`_.
+    lazy_parsing: :class:`bool`
+        Skip parsing events which have no listeners. Only the payload header is read for these.
+        This only works with the ``json`` encoding.
+    session_store: :class:`Optional[SessionStoreProtocol]`
+        Where to store gateway sessions when closing, so the next start resumes them instead of identifying.
+        See :mod:`nextcord.core.gateway.session_store`
+    inline_dispatch: :class:`bool`
+        Run event listeners in a bounded pool of worker tasks instead of a new task per listener call.
+        ``benchmarks/dispatch.py`` measures about 1.5 times the events per second of the default with listeners that
+        do not wait. A slow listener can hold up other listeners once every worker is busy.
+    event_queue_size: :class:`Optional[int]`
+        How many listener calls can queue up before ``event_overflow`` kicks in. None for unbounded.
+        Setting this turns on ``inline_dispatch``.
+    event_overflow: :class:`str`
+        What to do when the event queue is full. ``block`` stops reading from the gateway until there is room,
+        ``drop_oldest`` drops the oldest queued listener call and ``drop_events`` drops ``droppable_events``
+        and blocks for everything else.
+        Blocking for longer than the heartbeat interval makes the shard miss heartbeat acks and resume.
+        Queue depth and dropped events can be read from :attr:`GatewayProtocol.event_dispatcher`.
+    droppable_events: :class:`Iterable[str]`
+        Events which can be dropped with ``drop_events``, for example ``{"TYPING_START", "PRESENCE_UPDATE"}``
+    event_partition: :class:`Optional[str]`
+        Run listeners for events with the same ``guild_id`` or ``channel_id`` one at a time in the order discord sent
+        them, while events for different guilds or channels run concurrently. Events without the field are not ordered.
+        Setting this turns on ``inline_dispatch``. Use :func:`nextcord.dispatcher.run_in_executor` for CPU heavy listeners.
+    cache_policies: :class:`Optional[dict[str, Any]]`
+        How to cache each entity type (``guilds``, ``channels``, ``members``, ``users`` and ``messages``).
+        Members and users are not cached unless a policy is set for them.
+        See :mod:`nextcord.core.cache` for the available policies.
+    http_cache_ttls: :class:`Optional[dict[str, float]]`
+        How many seconds to cache GET responses for by route key, for example ``{"GET:/channels/{channel_id}": 30}``.
+        Responses are dropped early when a gateway event changes them.
+    http_connection_limit: :class:`int`
+        How many connections to the REST API can be open at the same time.
+        The default matches the global ratelimit of 50 requests per second.
+    http_prewarm_connections: :class:`int`
+        How many REST API connections to open while connecting, so the first requests do not wait for TLS setup.
+    metrics: :class:`Optional[MetricsProtocol]`
+        Where to send measurements of ratelimit waits, gateway parsing, heartbeat latency and listener run time.
+        See :mod:`nextcord.core.metrics` for the available sinks. Nothing is measured by default.
     """
 
     def __init__(
@@ -63,10 +113,44 @@ class Client:
         *,
         type_sheet: Optional[TypeSheet] = None,
         shard_count: Optional[int] = None,
+        gateway_encoding: Literal["json", "etf"] = "json",
+        gateway_compression: Optional[Literal["zlib-stream", "zstd-stream"]] = "zlib-stream",
+        lazy_parsing: bool = False,
+        session_store: Optional[SessionStoreProtocol] = None,
+        inline_dispatch: bool = False,
+        event_queue_size: Optional[int] = None,
+        event_overflow: Literal["block", "drop_oldest", "drop_events"] = "block",
+        droppable_events: Iterable[str] = (),
+        event_partition: Optional[Literal["guild_id", "channel_id"]] = None,
+        cache_policies: Optional[dict[str, Any]] = None,
+        http_cache_ttls: Optional[dict[str, float]] = None,
+        http_connection_limit: int = 50,
+        http_prewarm_connections: int = 2,
+        metrics: Optional[MetricsProtocol] = None,
     ) -> None:
         if type_sheet is None:
             type_sheet = TypeSheet.default()
-        self.state: State = State(self, type_sheet, token, intents.value, shard_count)
+        self.state: State = State(
+            self,
+            type_sheet,
+            token,
+            intents.value,
+            shard_count,
+            gateway_encoding=gateway_encoding,
+            gateway_compression=gateway_compression,
+            lazy_parsing=lazy_parsing,
+            session_store=session_store,
+            inline_dispatch=inline_dispatch,
+            event_queue_size=event_queue_size,
+            event_overflow=event_overflow,
+            droppable_events=droppable_events,
+            event_partition=event_partition,
+            cache_policies=cache_policies,
+            http_cache_ttls=http_cache_ttls,
+            http_connection_limit=http_connection_limit,
+            http_prewarm_connections=http_prewarm_connections,
+            metrics=metrics,
+        )
         self._error_future: Future[
             None
         ] = Future()  # TODO: Make this return a Optional error instead of setting a attribute
@@ -78,7 +162,7 @@ class Client:
         .. note::
             This will run until the bot shuts down.
         """
-        await self.state.gateway.connect()
+        await gather(self.state.http.prewarm(), self.state.gateway.connect())
 
         await self._error_future
         if self._error:
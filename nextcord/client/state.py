@@ -21,9 +21,13 @@ from __future__ import annotations
 from asyncio import AbstractEventLoop, get_event_loop
 from typing import TYPE_CHECKING
 
+from ..core.metrics import NoMetrics
+
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Any, Iterable, Literal, Optional
 
+    from ..core.gateway.protocols.session_store import SessionStoreProtocol
+    from ..core.protocols.metrics import MetricsProtocol
     from ..type_sheet import TypeSheet
     from .client import Client
 
@@ -36,6 +40,21 @@ class State:
         token: str,
         intents: int,
         shard_count: Optional[int],
+        *,
+        gateway_encoding: Literal["json", "etf"] = "json",
+        gateway_compression: Optional[Literal["zlib-stream", "zstd-stream"]] = "zlib-stream",
+        lazy_parsing: bool = False,
+        session_store: Optional[SessionStoreProtocol] = None,
+        inline_dispatch: bool = False,
+        event_queue_size: Optional[int] = None,
+        event_overflow: Literal["block", "drop_oldest", "drop_events"] = "block",
+        droppable_events: Iterable[str] = (),
+        event_partition: Optional[Literal["guild_id", "channel_id"]] = None,
+        cache_policies: Optional[dict[str, Any]] = None,
+        http_cache_ttls: Optional[dict[str, float]] = None,
+        http_connection_limit: int = 50,
+        http_prewarm_connections: int = 2,
+        metrics: Optional[MetricsProtocol] = None,
     ):
         self.client: Client = client
         self.type_sheet: TypeSheet = type_sheet
@@ -43,7 +62,22 @@ class State:
 
         self.token: str = token
         self.intents: int = intents
+        self.gateway_encoding: Literal["json", "etf"] = gateway_encoding
+        self.gateway_compression: Optional[Literal["zlib-stream", "zstd-stream"]] = gateway_compression
+        self.lazy_parsing: bool = lazy_parsing
+        self.session_store: Optional[SessionStoreProtocol] = session_store
+        self.inline_dispatch: bool = inline_dispatch
+        self.event_queue_size: Optional[int] = event_queue_size
+        self.event_overflow: Literal["block", "drop_oldest", "drop_events"] = event_overflow
+        self.droppable_events: Iterable[str] = droppable_events
+        self.event_partition: Optional[Literal["guild_id", "channel_id"]] = event_partition
+        self.cache_policies: dict[str, Any] = cache_policies or {}
+        self.http_cache_ttls: dict[str, float] = http_cache_ttls or {}
+        self.http_connection_limit: int = http_connection_limit
+        self.http_prewarm_connections: int = http_prewarm_connections
+        self.metrics: MetricsProtocol = NoMetrics() if metrics is None else metrics
 
         # Instances
         self.http = self.type_sheet.http_client(self)
         self.gateway = self.type_sheet.gateway(self, shard_count=shard_count)
+        self.cache = self.type_sheet.cache(self)
@@ -0,0 +1,384 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""Run many REST requests as fast as the ratelimits allow.
+
+Operations are grouped by ratelimit bucket and each bucket gets as many requests in flight as its limit,
+which is learned from the first response. Message deletes in the same channel and bans in the same guild
+can be merged into discord's bulk endpoints.
+"""
+
+from __future__ import annotations
+
+from asyncio import Event, Queue, Semaphore, Task, get_event_loop
+from collections import deque
+from logging import getLogger
+from time import time
+from typing import TYPE_CHECKING
+
+from attr import Factory, dataclass
+
+from ..exceptions import DiscordException, HTTPException
+from .http import Route
+
+if TYPE_CHECKING:
+    from typing import (
+        Any,
+        AsyncIterable,
+        AsyncIterator,
+        Hashable,
+        Iterable,
+        Optional,
+        Union,
+    )
+
+    from aiohttp.client_reqrep import ClientResponse
+
+    from .protocols.http import HTTPClientProtocol, RouteProtocol
+
+__all__ = ("BulkOperation", "BulkResult", "bulk_request")
+
+logger = getLogger(__name__)
+
+DISCORD_EPOCH = 1420070400000
+# Bulk delete refuses messages older than two weeks, keep a minute of margin for clock drift
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
+BULK_DELETE_MAX = 100
+BULK_BAN_MAX = 200
+
+_DELETE_MESSAGE = "DELETE:/channels/{channel_id}/messages/{message_id}"
+_BAN = "PUT:/guilds/{guild_id}/bans/{user_id}"
+_BULK_BAN = "POST:/guilds/{guild_id}/bulk-ban"
+
+
+@dataclass(slots=True)
+class BulkOperation:
+    """A request to run with :func:`bulk_request`
+
+    Parameters
+    ----------
+    route: :class:`RouteProtocol`
+        The route to request
+    kwargs: :class:`dict[str, Any]`
+        Keyword arguments passed to :meth:`HTTPClientProtocol.request`
+    tag: :class:`Any`
+        Anything to recognise the result by
+    """
+
+    route: RouteProtocol
+    kwargs: dict[str, Any] = Factory(dict)
+    tag: Any = None
+
+
+@dataclass(slots=True)
+class BulkResult:
+    """The outcome of a :class:`BulkOperation`.
+
+    Merged operations share the response of the bulk request they were sent in.
+    """
+
+    operation: BulkOperation
+    response: Optional[ClientResponse] = None
+    """The response, with the body already read"""
+    error: Optional[Exception] = None
+    """Why the request failed"""
+    merged: bool = False
+    """If this was sent as part of a bulk request"""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _Group:
+    """The operations of one ratelimit bucket"""
+
+    __slots__ = ("key", "queue", "limit", "running")
+
+    def __init__(self, key: Hashable) -> None:
+        self.key: Hashable = key
+        self.queue: deque[tuple[RouteProtocol, dict[str, Any], list[BulkOperation]]] = deque()
+        # One request at a time until the first response tells us the limit
+        self.limit: int = 1
+        self.running: int = 0
+
+
+def _snowflake_time(snowflake: Any) -> float:
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH) / 1000
+
+
+def _headers_key(kwargs: dict[str, Any]) -> Optional[tuple[Any, ...]]:
+    """Operations can be merged when they only differ in the route. None if they have a body or similar"""
+    if kwargs.keys() - {"headers"}:
+        return None
+    return tuple(sorted((kwargs.get("headers") or {}).items()))
+
+
+def _ban_key(kwargs: dict[str, Any]) -> Optional[tuple[Any, ...]]:
+    body = kwargs.get("json") or {}
+    if kwargs.keys() - {"headers", "json"} or body.keys() - {"delete_message_seconds"}:
+        return None
+    return (body.get("delete_message_seconds"), *sorted((kwargs.get("headers") or {}).items()))
+
+
+class _BulkRunner:
+    def __init__(self, http: HTTPClientProtocol, max_in_flight: int, max_pending: int, merge: bool) -> None:
+        self.http: HTTPClientProtocol = http
+        self.max_pending: int = max_pending
+        self.merge: bool = merge
+
+        self._groups: dict[Hashable, _Group] = {}
+        self._in_flight: Semaphore = Semaphore(max_in_flight)
+        self._tasks: set[Task[None]] = set()
+        self._sending: int = 0
+        self._results: Queue[Optional[BulkResult]] = Queue()
+        # Operations read but not handed to the consumer yet. Bounded so a huge input is not read all at once
+        self._outstanding: int = 0
+        self._room: Event = Event()
+        self._fed: bool = False
+
+        # Operations waiting to be merged, by what they would be merged into
+        self._deletes: dict[tuple[Any, ...], list[BulkOperation]] = {}
+        self._bans: dict[tuple[Any, ...], list[BulkOperation]] = {}
+
+    async def run(
+        self, operations: Union[Iterable[BulkOperation], AsyncIterable[BulkOperation]]
+    ) -> AsyncIterator[BulkResult]:
+        feeder = get_event_loop().create_task(self._feed(operations))
+        try:
+            while True:
+                result = await self._results.get()
+                if result is None:
+                    break
+                self._outstanding -= 1
+                self._room.set()
+                yield result
+            # Raise errors from reading the operations
+            await feeder
+        finally:
+            feeder.cancel()
+            for task in self._tasks:
+                task.cancel()
+
+    async def _feed(self, operations: Union[Iterable[BulkOperation], AsyncIterable[BulkOperation]]) -> None:
+        try:
+            if hasattr(operations, "__aiter__"):
+                async for operation in operations:
+                    await self._wait_for_room()
+                    self._add(operation)
+            else:
+                for operation in operations:
+                    await self._wait_for_room()
+                    self._add(operation)
+            self._flush()
+        finally:
+            self._fed = True
+            self._check_done()
+
+    async def _wait_for_room(self) -> None:
+        while self._outstanding >= self.max_pending:
+            # Operations held back for merging could be all that is outstanding, send them instead of waiting forever
+            self._flush()
+            self._room.clear()
+            await self._room.wait()
+
+    def _add(self, operation: BulkOperation) -> None:
+        self._outstanding += 1
+        route = operation.route
+        if self.merge:
+            if route.key == _DELETE_MESSAGE:
+                key = _headers_key(operation.kwargs)
+                message_id = route.path.rsplit("/", 1)[1]
+                if key is not None and time() - _snowflake_time(message_id) < BULK_DELETE_MAX_AGE:
+                    # Major parameters are (guild_id, channel_id, webhook_id, webhook_token)
+                    self._hold(self._deletes, (route.major_parameters[1], *key), operation, BULK_DELETE_MAX)
+                    return
+            elif route.key == _BAN:
+                key = _ban_key(operation.kwargs)
+                if key is not None:
+                    self._hold(self._bans, (route.major_parameters[0], *key), operation, BULK_BAN_MAX)
+                    return
+        self._queue(route, operation.kwargs, [operation])
+
+    def _hold(
+        self,
+        held: dict[tuple[Any, ...], list[BulkOperation]],
+        key: tuple[Any, ...],
+        operation: BulkOperation,
+        limit: int,
+    ) -> None:
+        batch = held.setdefault(key, [])
+        batch.append(operation)
+        if len(batch) >= limit:
+            del held[key]
+            self._send_batch(batch)
+
+    def _flush(self) -> None:
+        for held in (self._deletes, self._bans):
+            for batch in held.values():
+                self._send_batch(batch)
+            held.clear()
+
+    def _send_batch(self, batch: list[BulkOperation]) -> None:
+        first = batch[0]
+        if len(batch) == 1:
+            # The bulk endpoints need at least two
+            self._queue(first.route, first.kwargs, batch)
+            return
+
+        ids = [operation.route.path.rsplit("/", 1)[1] for operation in batch]
+        kwargs = {key: value for key, value in first.kwargs.items() if key == "headers"}
+        if first.route.key == _DELETE_MESSAGE:
+            channel_id = first.route.major_parameters[1]
+            route = Route("POST", "/channels/{channel_id}/messages/bulk-delete", channel_id=channel_id)
+            kwargs["json"] = {"messages": ids}
+        else:
+            route = Route("POST", "/guilds/{guild_id}/bulk-ban", guild_id=first.route.major_parameters[0])
+            kwargs["json"] = {**(first.kwargs.get("json") or {}), "user_ids": ids}
+        logger.debug("Merged %s operations into %s", len(batch), route.key)
+        self._queue(route, kwargs, batch)
+
+    def _bucket_of(self, route: RouteProtocol) -> Hashable:
+        """The bucket the client sends a route under. Different routes can share one once discord sent the hash"""
+        get_bucket = getattr(self.http, "_get_bucket", None)
+        if get_bucket is None:
+            return route.bucket
+        bucket: Hashable = get_bucket(route)
+        return bucket
+
+    def _group_of(self, key: Hashable) -> _Group:
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(key)
+        return group
+
+    def _queue(self, route: RouteProtocol, kwargs: dict[str, Any], operations: list[BulkOperation]) -> None:
+        group = self._group_of(self._bucket_of(route))
+        group.queue.append((route, kwargs, operations))
+        self._start(group)
+
+    def _regroup(self, group: _Group, route: RouteProtocol) -> _Group:
+        """Move the queue of a group over if the response showed its bucket is shared with another group"""
+        key = self._bucket_of(route)
+        if key == group.key:
+            return group
+        target = self._group_of(key)
+        logger.debug("Operations on %s share a bucket with other operations", route.key)
+        target.limit = group.limit
+        target.queue.extend(group.queue)
+        group.queue.clear()
+        return target
+
+    def _start(self, group: _Group) -> None:
+        loop = get_event_loop()
+        while group.running < group.limit and group.queue:
+            group.running += 1
+            self._sending += 1
+            task = loop.create_task(self._send(group, *group.queue.popleft()))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(
+        self, group: _Group, route: RouteProtocol, kwargs: dict[str, Any], operations: list[BulkOperation]
+    ) -> None:
+        response = None
+        error = None
+        failed: frozenset[str] = frozenset()
+        merged = len(operations) > 1
+        try:
+            async with self._in_flight:
+                response = await self.http.request(route, **kwargs)
+                # Release the connection for the next request
+                await response.read()
+            if (limit := response.headers.get("X-RateLimit-Limit")) is not None:
+                group.limit = max(int(limit), 1)
+            if merged and route.key == _BULK_BAN:
+                # Bulk ban succeeds as long as one user was banned, the rest are listed
+                failed = frozenset(str(user_id) for user_id in (await response.json()).get("failed_users", ()))
+        except Exception as e:
+            # Reported through the result, one failure should not stop the rest
+            error = e
+        finally:
+            group.running -= 1
+            self._sending -= 1
+        if response is not None:
+            group = self._regroup(group, route)
+
+        if merged and isinstance(error, HTTPException) and error.status_code == 403:
+            # The bulk endpoints need permissions the single ones may not, retry them one by one
+            logger.debug("Missing permissions for %s, sending %s operations separately", route.key, len(operations))
+            for operation in operations:
+                self._queue(operation.route, operation.kwargs, [operation])
+        else:
+            for operation in operations:
+                operation_error = error
+                if failed and operation.route.path.rsplit("/", 1)[1] in failed:
+                    operation_error = DiscordException(f"{operation.route.path} was not banned by the bulk ban")
+                self._results.put_nowait(BulkResult(operation, response, operation_error, merged))
+        self._start(group)
+        self._check_done()
+
+    def _check_done(self) -> None:
+        if self._fed and not self._sending and not any(group.queue for group in self._groups.values()):
+            self._results.put_nowait(None)
+
+
+def bulk_request(
+    http: HTTPClientProtocol,
+    operations: Union[Iterable[BulkOperation], AsyncIterable[BulkOperation]],
+    *,
+    max_in_flight: int = 50,
+    max_pending: int = 1000,
+    merge: bool = False,
+) -> AsyncIterator[BulkResult]:
+    """Run many requests, as many at the same time as the ratelimits allow.
+
+    Results are yielded as they complete, not in the order of ``operations``. Failed requests are
+    yielded with :attr:`BulkResult.error` set instead of raising.
+
+    .. code-block:: python3
+
+        operations = (BulkOperation(Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+            guild_id=guild_id, user_id=user_id, role_id=role_id)) for user_id in user_ids)
+        async for result in bulk_request(client.state.http, operations):
+            if not result.ok:
+                print(result.operation.route.path, result.error)
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to send the requests with
+    operations:
+        A iterable or async iterable of :class:`BulkOperation`. It is read lazily
+    max_in_flight: :class:`int`
+        How many requests can wait for a response at the same time, across every bucket
+    max_pending: :class:`int`
+        How many operations are read ahead of the results being consumed
+    merge: :class:`bool`
+        Send message deletes in the same channel through bulk delete and bans in the same guild through bulk ban.
+        Only operations without a body (other than ``delete_message_seconds`` for bans) are merged, and only
+        messages younger than two weeks. Operations are held back until a batch is full, the input ends or
+        ``max_pending`` is reached.
+
+        .. note::
+            Bulk delete needs ``MANAGE_MESSAGES`` even for your own messages and bulk ban needs ``MANAGE_GUILD``
+            as well as ``BAN_MEMBERS``. Merged requests failing with 403 are retried one by one.
+    """
+    return _BulkRunner(http, max_in_flight, max_pending, merge).run(operations)
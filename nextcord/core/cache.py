@@ -0,0 +1,512 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""An in-memory cache of discord entities, fed by gateway events.
+
+Entities are stored as slotted records holding the fields bots use the most. Every entity type has its own policy,
+set through the ``cache_policies`` option of :class:`Client <nextcord.client.client.Client>`.
+
+.. code-block:: python3
+
+    client = Client(token, intents, cache_policies={"members": LRU(100_000), "messages": TTL(60 * 10)})
+
+To share one copy between processes see :mod:`nextcord.core.shared_cache`.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from attr import dataclass
+
+from .protocols.cache import CacheProtocol
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Hashable, Iterable, Optional, Union
+
+    from ..client.state import State
+    from .gateway.protocols.shard import ShardProtocol
+
+    Store = Union[dict[Any, Any], "LRUStore", "TTLStore"]
+
+__all__ = (
+    "Cache",
+    "NoCache",
+    "Unbounded",
+    "LRU",
+    "TTL",
+    "GuildRecord",
+    "ChannelRecord",
+    "MemberRecord",
+    "UserRecord",
+    "MessageRecord",
+)
+
+
+# Records
+@dataclass(slots=True, weakref_slot=False)
+class GuildRecord:
+    """A cached guild"""
+
+    id: int
+    name: str
+    owner_id: int
+    icon: Optional[str]
+    member_count: int
+
+
+@dataclass(slots=True, weakref_slot=False)
+class ChannelRecord:
+    """A cached channel. ``guild_id`` is None for DM channels"""
+
+    id: int
+    guild_id: Optional[int]
+    type: int
+    name: Optional[str]
+    position: Optional[int]
+    parent_id: Optional[int]
+
+
+@dataclass(slots=True, weakref_slot=False)
+class MemberRecord:
+    """A cached guild member. The user is cached separately, see :meth:`Cache.get_user`"""
+
+    guild_id: int
+    user_id: int
+    nick: Optional[str]
+    roles: tuple[int, ...]
+
+
+@dataclass(slots=True, weakref_slot=False)
+class UserRecord:
+    """A cached user"""
+
+    id: int
+    username: str
+    discriminator: str
+    avatar: Optional[str]
+    bot: bool
+
+
+@dataclass(slots=True, weakref_slot=False)
+class MessageRecord:
+    """A cached message"""
+
+    id: int
+    channel_id: int
+    guild_id: Optional[int]
+    author_id: int
+    content: str
+
+
+# Stores
+class LRUStore:
+    """Keeps the ``max_size`` most recently used entities"""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size: int = max_size
+        self.on_evict: Optional[Callable[[Hashable, Any], Any]] = None
+        """Called with the key and value of every evicted entity"""
+        # OrderedDict evicts in O(1). Evicting the first key of a plain dict slows down as deleted entries pile up
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            evicted = self._data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(*evicted)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def items(self) -> Iterable[tuple[Hashable, Any]]:
+        return self._data.items()
+
+
+class TTLStore:
+    """Keeps entities for ``seconds`` after they were last updated"""
+
+    def __init__(self, seconds: float, max_size: Optional[int] = None) -> None:
+        self.seconds: float = seconds
+        self.max_size: Optional[int] = max_size
+        self.on_evict: Optional[Callable[[Hashable, Any], Any]] = None
+        """Called with the key and value of every expired or evicted entity"""
+        self._data: dict[Hashable, Any] = {}
+        # Ordered by expiry as every entry lives equally long
+        self._expires: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._data)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._expire()
+        self._data[key] = value
+        self._expires[key] = monotonic() + self.seconds
+        self._expires.move_to_end(key)
+        if self.max_size is not None and len(self._data) > self.max_size:
+            oldest, _ = self._expires.popitem(last=False)
+            self._evict(oldest)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        expires = self._expires.get(key)
+        if expires is None:
+            return None
+        if expires <= monotonic():
+            del self._expires[key]
+            self._evict(key)
+            return None
+        return self._data[key]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        self._expires.pop(key, None)
+        return self._data.pop(key, default)
+
+    def items(self) -> Iterable[tuple[Hashable, Any]]:
+        self._expire()
+        return self._data.items()
+
+    def _expire(self) -> None:
+        now = monotonic()
+        expires = self._expires
+        while expires:
+            key, expires_at = next(iter(expires.items()))
+            if expires_at > now:
+                return
+            expires.popitem(last=False)
+            self._evict(key)
+
+    def _evict(self, key: Hashable) -> None:
+        value = self._data.pop(key)
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+
+# Policies
+class NoCache:
+    """Do not cache this entity type"""
+
+    def create_store(self, entity: str) -> Optional[Store]:
+        return None
+
+
+class Unbounded:
+    """Cache every entity until discord says it is gone"""
+
+    def create_store(self, entity: str) -> Optional[Store]:
+        return {}
+
+
+class LRU:
+    """Cache the most recently used entities
+
+    Parameters
+    ----------
+    max_size: :class:`int`
+        How many entities to keep
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size: int = max_size
+
+    def create_store(self, entity: str) -> Optional[Store]:
+        return LRUStore(self.max_size)
+
+
+class TTL:
+    """Cache entities for a while after they were last updated
+
+    Parameters
+    ----------
+    seconds: :class:`float`
+        How long to keep entities
+    max_size: :class:`Optional[int]`
+        How many entities to keep at most. The ones expiring first are dropped
+    """
+
+    def __init__(self, seconds: float, max_size: Optional[int] = None) -> None:
+        self.seconds: float = seconds
+        self.max_size: Optional[int] = max_size
+
+    def create_store(self, entity: str) -> Optional[Store]:
+        return TTLStore(self.seconds, self.max_size)
+
+
+DEFAULT_POLICIES: dict[str, Any] = {
+    "guilds": Unbounded(),
+    "channels": Unbounded(),
+    # Large bots see millions of these, caching them is opt in
+    "members": NoCache(),
+    "users": NoCache(),
+    "messages": LRU(1000),
+}
+
+
+def _snowflake(value: Optional[str]) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+class Cache(CacheProtocol):
+    """The default :class:`CacheProtocol` implementation
+
+    Policies are read from :attr:`State.cache_policies`, entity types without a policy use the defaults:
+    guilds and channels are unbounded, messages keep the last 1000 and members and users are not cached.
+    Changed records are set in their store again, as stores are allowed to hold copies.
+
+    Parameters
+    ----------
+    state: :class:`State`
+        The current bot state
+    """
+
+    def __init__(self, state: State) -> None:
+        policies = {**DEFAULT_POLICIES, **state.cache_policies}
+        self.guilds: Optional[Store] = policies["guilds"].create_store("guilds")
+        self.channels: Optional[Store] = policies["channels"].create_store("channels")
+        self.members: Optional[Store] = policies["members"].create_store("members")
+        """Members by ``(guild_id, user_id)``"""
+        self.users: Optional[Store] = policies["users"].create_store("users")
+        self.messages: Optional[Store] = policies["messages"].create_store("messages")
+        # Members of a guild share a handful of roles, share the int objects too instead of one per member
+        self._role_ids: dict[str, int] = {}
+        # Channel ids and member user ids by guild id, so removing a guild does not scan every store
+        self._guild_channels: dict[int, set[int]] = {}
+        self._guild_members: dict[int, set[int]] = {}
+        for store, unindex in ((self.channels, self._unindex_channel), (self.members, self._unindex_member)):
+            if isinstance(store, (LRUStore, TTLStore)):
+                store.on_evict = unindex
+
+        handlers: dict[str, Callable[[ShardProtocol, dict[str, Any]], None]] = {}
+        if self.guilds is not None or self.channels is not None or self.members is not None or self.users is not None:
+            handlers.update(
+                GUILD_CREATE=self._handle_guild_create,
+                GUILD_UPDATE=self._handle_guild_update,
+                GUILD_DELETE=self._handle_guild_delete,
+            )
+        if self.channels is not None:
+            handlers.update(
+                CHANNEL_CREATE=self._handle_channel_update,
+                CHANNEL_UPDATE=self._handle_channel_update,
+                CHANNEL_DELETE=self._handle_channel_delete,
+            )
+        if self.members is not None or self.users is not None:
+            handlers.update(
+                GUILD_MEMBER_ADD=self._handle_member_update,
+                GUILD_MEMBER_UPDATE=self._handle_member_update,
+                GUILD_MEMBER_REMOVE=self._handle_member_remove,
+                GUILD_MEMBERS_CHUNK=self._handle_members_chunk,
+            )
+        if self.messages is not None or self.members is not None or self.users is not None:
+            handlers["MESSAGE_CREATE"] = self._handle_message_create
+        if self.messages is not None:
+            handlers.update(
+                MESSAGE_UPDATE=self._handle_message_update,
+                MESSAGE_DELETE=self._handle_message_delete,
+                MESSAGE_DELETE_BULK=self._handle_message_delete_bulk,
+            )
+        # Plain functions, so the dispatcher calls them directly without a task
+        for event_name, handler in handlers.items():
+            state.gateway.event_dispatcher.add_listener(handler, event_name)
+
+    # Lookups
+    def get_guild(self, guild_id: int) -> Optional[GuildRecord]:
+        return None if self.guilds is None else self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id: int) -> Optional[ChannelRecord]:
+        return None if self.channels is None else self.channels.get(channel_id)
+
+    def get_member(self, guild_id: int, user_id: int) -> Optional[MemberRecord]:
+        return None if self.members is None else self.members.get((guild_id, user_id))
+
+    def get_user(self, user_id: int) -> Optional[UserRecord]:
+        return None if self.users is None else self.users.get(user_id)
+
+    def get_message(self, message_id: int) -> Optional[MessageRecord]:
+        return None if self.messages is None else self.messages.get(message_id)
+
+    # Updating
+    def _add_channel(self, data: dict[str, Any], guild_id: Optional[int]) -> None:
+        if self.channels is None:
+            return
+        channel_id = int(data["id"])
+        if guild_id is not None:
+            self._guild_channels.setdefault(guild_id, set()).add(channel_id)
+        self.channels[channel_id] = ChannelRecord(
+            channel_id,
+            guild_id,
+            data["type"],
+            data.get("name"),
+            data.get("position"),
+            _snowflake(data.get("parent_id")),
+        )
+
+    def _add_user(self, data: dict[str, Any]) -> int:
+        user_id = int(data["id"])
+        if self.users is None:
+            return user_id
+        user = self.users.get(user_id)
+        if user is None:
+            self.users[user_id] = UserRecord(
+                user_id, data["username"], data["discriminator"], data.get("avatar"), data.get("bot", False)
+            )
+        else:
+            user.username = data["username"]
+            user.discriminator = data["discriminator"]
+            user.avatar = data.get("avatar")
+            self.users[user_id] = user
+        return user_id
+
+    def _add_member(self, data: dict[str, Any], guild_id: int, user_id: Optional[int] = None) -> None:
+        if user_id is None:
+            user_id = self._add_user(data["user"])
+        if self.members is None:
+            return
+        key = (guild_id, user_id)
+        role_ids = self._role_ids
+        roles = tuple(role_ids.get(role) or role_ids.setdefault(role, int(role)) for role in data.get("roles", ()))
+        member = self.members.get(key)
+        if member is None:
+            self._guild_members.setdefault(guild_id, set()).add(user_id)
+            self.members[key] = MemberRecord(guild_id, user_id, data.get("nick"), roles)
+        else:
+            member.nick = data.get("nick")
+            member.roles = roles
+            self.members[key] = member
+
+    def _unindex_channel(self, channel_id: Any, channel: ChannelRecord) -> None:
+        if channel.guild_id is None:
+            return
+        channel_ids = self._guild_channels.get(channel.guild_id)
+        if channel_ids is not None:
+            channel_ids.discard(channel_id)
+            if not channel_ids:
+                del self._guild_channels[channel.guild_id]
+
+    def _unindex_member(self, key: Any, _: Any = None) -> None:
+        guild_id, user_id = key
+        user_ids = self._guild_members.get(guild_id)
+        if user_ids is not None:
+            user_ids.discard(user_id)
+            if not user_ids:
+                del self._guild_members[guild_id]
+
+    # Handlers
+    def _handle_guild_create(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if data.get("unavailable"):
+            return
+        guild_id = int(data["id"])
+        if self.guilds is not None:
+            self.guilds[guild_id] = GuildRecord(
+                guild_id, data["name"], int(data["owner_id"]), data.get("icon"), data.get("member_count", 0)
+            )
+        for channel in data.get("channels", ()):
+            self._add_channel(channel, guild_id)
+        for member in data.get("members", ()):
+            self._add_member(member, guild_id)
+
+    def _handle_guild_update(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.guilds is None:
+            return
+        guild = self.guilds.get(int(data["id"]))
+        if guild is None:
+            return
+        guild.name = data["name"]
+        guild.owner_id = int(data["owner_id"])
+        guild.icon = data.get("icon")
+        self.guilds[guild.id] = guild
+
+    def _handle_guild_delete(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if data.get("unavailable"):
+            # An outage, the guild comes back with a GUILD_CREATE
+            return
+        guild_id = int(data["id"])
+        if self.guilds is not None:
+            self.guilds.pop(guild_id, None)
+        channel_ids = self._guild_channels.pop(guild_id, ())
+        if self.channels is not None:
+            for channel_id in channel_ids:
+                self.channels.pop(channel_id, None)
+        user_ids = self._guild_members.pop(guild_id, ())
+        if self.members is not None:
+            for user_id in user_ids:
+                self.members.pop((guild_id, user_id), None)
+
+    def _handle_channel_update(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        self._add_channel(data, _snowflake(data.get("guild_id")))
+
+    def _handle_channel_delete(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.channels is None:
+            return
+        channel_id = int(data["id"])
+        channel = self.channels.pop(channel_id, None)
+        if channel is not None:
+            self._unindex_channel(channel_id, channel)
+
+    def _handle_member_update(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        self._add_member(data, int(data["guild_id"]))
+
+    def _handle_member_remove(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.members is not None:
+            key = (int(data["guild_id"]), int(data["user"]["id"]))
+            self.members.pop(key, None)
+            self._unindex_member(key)
+
+    def _handle_members_chunk(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        guild_id = int(data["guild_id"])
+        for member in data["members"]:
+            self._add_member(member, guild_id)
+
+    def _handle_message_create(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        guild_id = _snowflake(data.get("guild_id"))
+        author_id = self._add_user(data["author"])
+        if guild_id is not None and "member" in data:
+            self._add_member(data["member"], guild_id, author_id)
+        if self.messages is not None:
+            message_id = int(data["id"])
+            self.messages[message_id] = MessageRecord(
+                message_id, int(data["channel_id"]), guild_id, author_id, data.get("content", "")
+            )
+
+    def _handle_message_update(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.messages is None or "content" not in data:
+            return
+        message = self.messages.get(int(data["id"]))
+        if message is not None:
+            message.content = data["content"]
+            self.messages[message.id] = message
+
+    def _handle_message_delete(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.messages is not None:
+            self.messages.pop(int(data["id"]), None)
+
+    def _handle_message_delete_bulk(self, _: ShardProtocol, data: dict[str, Any]) -> None:
+        if self.messages is not None:
+            for message_id in data["ids"]:
+                self.messages.pop(int(message_id), None)
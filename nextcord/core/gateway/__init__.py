@@ -19,7 +19,8 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+from .cluster import Cluster
 from .gateway import Gateway
 from .shard import Shard
 
-__all__ = ("Gateway", "Shard")
+__all__ = ("Cluster", "Gateway", "Shard")
@@ -0,0 +1,351 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+import multiprocessing
+from asyncio import (
+    get_event_loop,
+    iscoroutinefunction,
+    new_event_loop,
+    set_event_loop,
+    sleep,
+)
+from collections import defaultdict
+from logging import getLogger
+from threading import Thread
+from typing import TYPE_CHECKING
+
+from attr import evolve
+
+from ...client.client import Client
+from ...dispatcher import Dispatcher
+from ...type_sheet import TypeSheet
+from ..ratelimiter import TimesPer
+from .gateway import Gateway
+
+if TYPE_CHECKING:
+    from asyncio import AbstractEventLoop, Future
+    from multiprocessing.context import SpawnProcess
+    from multiprocessing.queues import Queue
+    from typing import Any, Callable, Optional
+
+    from ...client.state import State
+    from ...flags import Intents
+    from .protocols.shard import ShardProtocol
+
+__all__ = ("Cluster", "ClusterWorkerGateway")
+
+logger = getLogger(__name__)
+
+
+class Cluster:
+    """Runs the shards of a bot split over multiple worker processes.
+
+    Every worker runs its own event loop and :class:`Gateway`. Identifies are coordinated by this process so
+    the ``max_concurrency`` buckets are shared between workers, and every event is forwarded back here.
+
+    .. note::
+        Events are pickled to be sent between processes.
+
+    Parameters
+    ----------
+    token: :class:`str`
+        The bot token to connect with.
+    intents: :class:`Intents`
+        The intents to connect with.
+    processes: :class:`int`
+        How many worker processes to split the shards over
+    shard_count: :class:`Optional[int]`
+        How many shards to connect with. If it is None it will be fetched from discord
+    sink: :class:`Optional[Callable[[int, str, Any], Any]]`
+        Called with the shard id, event name and data of every event. Coroutine functions are scheduled as tasks.
+        If this is None events are dispatched through :attr:`Cluster.event_dispatcher`.
+    type_sheet: :class:`Optional[TypeSheet]`
+        What components the workers use. The gateway is replaced with :class:`ClusterWorkerGateway`
+    client_options: :class:`Optional[dict[str, Any]]`
+        Extra keyword arguments to create the worker :class:`Client` with.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        intents: Intents,
+        *,
+        processes: int,
+        shard_count: Optional[int] = None,
+        sink: Optional[Callable[[int, str, Any], Any]] = None,
+        type_sheet: Optional[TypeSheet] = None,
+        client_options: Optional[dict[str, Any]] = None,
+    ) -> None:
+        self.token: str = token
+        self.intents: Intents = intents
+        self.processes: int = processes
+        self.shard_count: Optional[int] = shard_count
+        self.sink: Optional[Callable[[int, str, Any], Any]] = sink
+        self.type_sheet: TypeSheet = type_sheet or TypeSheet.default()
+        self.client_options: dict[str, Any] = client_options or {}
+
+        self.event_dispatcher: Dispatcher = Dispatcher(inline=self.client_options.get("inline_dispatch", False))
+        """Dispatches events from every worker as ``(event_name, shard_id, data)`` if no sink is set"""
+
+        self._context = multiprocessing.get_context("spawn")
+        self._requests: Queue[Any] = self._context.Queue()
+        self._events: Queue[Any] = self._context.Queue()
+        self._workers: dict[int, _WorkerHandle] = {}
+        self._identify_ratelimits: defaultdict[int, TimesPer] = defaultdict(lambda: TimesPer(1, 5))
+        self._max_concurrency: int = 1
+        self._loop: Optional[AbstractEventLoop] = None
+        self._closing: bool = False
+
+    @property
+    def shard_assignments(self) -> dict[int, list[int]]:
+        """Which shard ids every worker runs"""
+        return {worker_id: worker.shard_ids for worker_id, worker in self._workers.items()}
+
+    async def start(self) -> None:
+        """Fetch the gateway info and start every worker"""
+        self._loop = get_event_loop()
+
+        client = Client(self.token, self.intents, type_sheet=self.type_sheet)
+        try:
+            r = await client.state.http.get_gateway_bot()
+            gateway_info = await r.json()
+        finally:
+            await client.state.http.close()
+
+        if self.shard_count is None:
+            self.shard_count = gateway_info["shards"]
+        self._max_concurrency = gateway_info["session_start_limit"]["max_concurrency"]
+
+        _start_reader(self._requests, self._loop, self._handle_request)
+        _start_reader(self._events, self._loop, self._handle_event)
+
+        processes = min(self.processes, self.shard_count)
+        for worker_id in range(processes):
+            # Strided so every worker gets shards from every identify bucket
+            shard_ids = list(range(worker_id, self.shard_count, processes))
+            worker = _WorkerHandle(worker_id, shard_ids)
+            self._workers[worker_id] = worker
+            self._spawn(worker)
+
+        self._loop.create_task(self._supervise())
+
+    async def close(self) -> None:
+        """Close every worker and wait for them to exit"""
+        self._closing = True
+        for worker in self._workers.values():
+            if worker.responses is not None:
+                worker.responses.put(("close",))
+        for worker in self._workers.values():
+            if worker.process is not None:
+                await get_event_loop().run_in_executor(None, worker.process.join, 10)
+        self._requests.put(None)
+        self._events.put(None)
+
+    def run(self) -> None:
+        """Start the cluster and run until interrupted"""
+        loop = new_event_loop()
+        set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.start())
+            loop.run_forever()
+        except KeyboardInterrupt:
+            loop.run_until_complete(self.close())
+
+    def _spawn(self, worker: _WorkerHandle) -> None:
+        assert self.shard_count is not None
+        # A new queue and generation so responses meant for a dead worker never reach its replacement
+        worker.generation += 1
+        worker.responses = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_run_worker,
+            args=(
+                worker.worker_id,
+                worker.generation,
+                self.token,
+                self.intents,
+                worker.shard_ids,
+                self.shard_count,
+                evolve(self.type_sheet, gateway=ClusterWorkerGateway),
+                self.client_options,
+                self._requests,
+                worker.responses,
+                self._events,
+            ),
+            name=f"nextcord-cluster-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        logger.info("Started worker %s with shards %s", worker.worker_id, worker.shard_ids)
+
+    async def _supervise(self) -> None:
+        """Restart workers which died"""
+        while not self._closing:
+            await sleep(1)
+            for worker in self._workers.values():
+                if self._closing:
+                    return
+                if worker.process is not None and not worker.process.is_alive():
+                    logger.warning("Worker %s exited with %s, restarting", worker.worker_id, worker.process.exitcode)
+                    self._spawn(worker)
+
+    def _handle_request(self, request: Any) -> None:
+        action, worker_id, generation, request_id, shard_id = request
+        if action == "identify":
+            assert self._loop is not None
+            self._loop.create_task(self._grant_identify(worker_id, generation, request_id, shard_id))
+
+    async def _grant_identify(self, worker_id: int, generation: int, request_id: int, shard_id: int) -> None:
+        worker = self._workers[worker_id]
+        if worker.generation != generation:
+            return
+        await self._identify_ratelimits[shard_id % self._max_concurrency].acquire()
+        if worker.generation != generation:
+            # The worker was restarted while waiting. Its request ids start over, so this could release another request
+            logger.debug("Dropping identify for shard %s of a restarted worker", shard_id)
+            return
+        assert worker.responses is not None
+        worker.responses.put(("identify", request_id))
+
+    def _handle_event(self, event: Any) -> None:
+        shard_id, event_name, data = event
+        if self.sink is None:
+            self.event_dispatcher.dispatch(event_name, shard_id, data)
+        elif iscoroutinefunction(self.sink):
+            assert self._loop is not None
+            self._loop.create_task(self.sink(shard_id, event_name, data))
+        else:
+            self.sink(shard_id, event_name, data)
+
+
+class _WorkerHandle:
+    def __init__(self, worker_id: int, shard_ids: list[int]) -> None:
+        self.worker_id: int = worker_id
+        self.shard_ids: list[int] = shard_ids
+        self.generation: int = 0
+        """How many times the worker was started"""
+        self.responses: Optional[Queue[Any]] = None
+        self.process: Optional[SpawnProcess] = None
+
+
+def _start_reader(queue: Queue[Any], loop: AbstractEventLoop, handler: Callable[[Any], None]) -> None:
+    """Read a multiprocessing queue from a thread and run the handler on the loop. Stops when None is received"""
+
+    def read() -> None:
+        while (item := queue.get()) is not None:
+            loop.call_soon_threadsafe(handler, item)
+
+    Thread(target=read, daemon=True).start()
+
+
+class ClusterWorkerGateway(Gateway):
+    """A :class:`Gateway` running a part of the shards of a :class:`Cluster`.
+
+    Identifies are coordinated by the cluster instead of being ratelimited locally.
+    """
+
+    def __init__(self, state: State, shard_count: Optional[int] = None) -> None:
+        super().__init__(state, shard_count)
+        self._coordinator: Optional[_Coordinator] = None
+
+    def get_identify_ratelimiter(self, shard_id: int) -> Any:
+        if self._coordinator is None:
+            return super().get_identify_ratelimiter(shard_id)
+        return _CoordinatedIdentify(self._coordinator, shard_id)
+
+
+class _Coordinator:
+    """The worker side of the connection to the cluster"""
+
+    def __init__(
+        self,
+        worker_id: int,
+        generation: int,
+        requests: Queue[Any],
+        responses: Queue[Any],
+        loop: AbstractEventLoop,
+        client: Client,
+    ) -> None:
+        self.worker_id: int = worker_id
+        self.generation: int = generation
+        self._requests: Queue[Any] = requests
+        self._loop: AbstractEventLoop = loop
+        self._client: Client = client
+        self._pending: dict[int, Future[None]] = {}
+        self._next_id: int = 0
+        _start_reader(responses, loop, self._handle_response)
+
+    async def identify(self, shard_id: int) -> None:
+        request_id = self._next_id
+        self._next_id += 1
+        future: Future[None] = self._loop.create_future()
+        self._pending[request_id] = future
+        self._requests.put(("identify", self.worker_id, self.generation, request_id, shard_id))
+        await future
+
+    def _handle_response(self, response: Any) -> None:
+        if response[0] == "identify":
+            future = self._pending.pop(response[1], None)
+            if future is not None and not future.done():
+                future.set_result(None)
+        elif response[0] == "close":
+            self._loop.create_task(self._client.close())
+
+
+class _CoordinatedIdentify:
+    def __init__(self, coordinator: _Coordinator, shard_id: int) -> None:
+        self._coordinator: _Coordinator = coordinator
+        self._shard_id: int = shard_id
+
+    async def __aenter__(self) -> _CoordinatedIdentify:
+        await self._coordinator.identify(self._shard_id)
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        ...
+
+
+def _run_worker(
+    worker_id: int,
+    generation: int,
+    token: str,
+    intents: Intents,
+    shard_ids: list[int],
+    shard_count: int,
+    type_sheet: TypeSheet,
+    client_options: dict[str, Any],
+    requests: Queue[Any],
+    responses: Queue[Any],
+    events: Queue[Any],
+) -> None:
+    loop = new_event_loop()
+    set_event_loop(loop)
+
+    client = Client(token, intents, type_sheet=type_sheet, shard_count=shard_count, **client_options)
+    gateway = client.state.gateway
+    assert isinstance(gateway, ClusterWorkerGateway)
+    gateway.shard_ids = shard_ids
+    gateway._coordinator = _Coordinator(worker_id, generation, requests, responses, loop, client)
+
+    def forward(event_name: str, shard: ShardProtocol, data: Any) -> None:
+        # Plain function so the dispatcher calls it directly instead of creating a task per event
+        events.put((shard.shard_id, event_name, data))
+
+    gateway.event_dispatcher.add_listener(forward)
+    loop.run_until_complete(client.connect())
@@ -0,0 +1,227 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+import zlib
+from typing import TYPE_CHECKING
+
+from .exceptions import BadDataException, PartialDataException
+
+if TYPE_CHECKING:
+    from typing import Literal, Optional, Union
+
+try:
+    import zstandard  # type: ignore
+except ModuleNotFoundError:
+    zstandard = None  # type: ignore
+
+__all__ = ("ZLIB_SUFFIX", "ZlibStreamInflater", "ZstdStreamInflater", "create_inflater")
+
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+# The most a byte of zstd data can inflate to, a 4 byte RLE block decompresses to at most 128 KiB
+ZSTD_MAX_RATIO = 128 * 1024 // 4
+
+
+class ZlibStreamInflater:
+    """Decompresses the ``zlib-stream`` transport compression.
+
+    Frames are fed to zlib as they arrive, so compressed data is never buffered.
+    Messages which fit in a single frame are returned directly, messages spanning multiple frames
+    are inflated into a buffer which is reused for every message.
+
+    Parameters
+    ----------
+    max_size: :class:`int`
+        The largest a decompressed message is allowed to be.
+    buffer_size: :class:`int`
+        How big the reused buffer is. It can temporarily grow above this for bigger messages.
+    """
+
+    def __init__(self, *, max_size: int = 128 * 1024 * 1024, buffer_size: int = 64 * 1024) -> None:
+        self.max_size: int = max_size
+        self.buffer_size: int = buffer_size
+
+        self._zlib = zlib.decompressobj()
+        self._buffer: bytearray = bytearray(buffer_size)
+        self._length: int = 0
+        self._tail: bytes = b""
+        self._view: Optional[memoryview] = None
+
+    def reset(self) -> None:
+        """Start a new stream. This has to be called when reconnecting"""
+        self._release_view()
+        self._zlib = zlib.decompressobj()
+        self._length = 0
+        self._tail = b""
+        del self._buffer[self.buffer_size :]
+
+    def decompress(self, data: Union[bytes, bytearray, memoryview]) -> Union[bytes, memoryview]:
+        """Feed a frame to the inflater
+
+        .. note::
+            A returned :class:`memoryview` is only valid until the next call.
+
+        Parameters
+        ----------
+        data:
+            A frame received from the gateway
+
+        Raises
+        ------
+        PartialDataException
+            The message continues in the next frame
+        BadDataException
+            The data was corrupted or too big. The stream has to be :meth:`reset`.
+        """
+        self._release_view()
+        view = memoryview(data)
+        complete = self._is_complete(view)
+
+        budget = self.max_size - self._length
+        if budget <= 0:
+            # A max_length of 0 would mean unlimited
+            raise BadDataException(f"Message is bigger than the max size of {self.max_size} bytes")
+        try:
+            chunk = self._zlib.decompress(view, budget)
+        except zlib.error:
+            raise BadDataException("Received corrupted zlib data")
+        if self._zlib.unconsumed_tail:
+            raise BadDataException(f"Message is bigger than the max size of {self.max_size} bytes")
+
+        if complete and self._length == 0:
+            # The message fit in a single frame, no need to copy it into the buffer
+            return chunk
+
+        self._write(chunk)
+        if not complete:
+            raise PartialDataException
+
+        self._view = memoryview(self._buffer)[: self._length]
+        self._length = 0
+        return self._view
+
+    def _is_complete(self, view: memoryview) -> bool:
+        """Check if the stream ends with the flush suffix. The suffix might be split between frames"""
+        if len(view) >= 4:
+            tail = view[-4:]
+        else:
+            tail = memoryview((self._tail + view.tobytes())[-4:])
+        complete = tail == ZLIB_SUFFIX
+        self._tail = b"" if complete else tail.tobytes()
+        return complete
+
+    def _write(self, chunk: bytes) -> None:
+        end = self._length + len(chunk)
+        if end <= len(self._buffer):
+            self._buffer[self._length : end] = chunk
+        else:
+            self._buffer[self._length :] = chunk  # Grows the buffer
+        self._length = end
+
+    def _release_view(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if len(self._buffer) > self.buffer_size and self._length == 0:
+            # Don't hold on to the memory of a huge message
+            del self._buffer[self.buffer_size :]
+
+
+class ZstdStreamInflater:
+    """Decompresses the ``zstd-stream`` transport compression.
+
+    .. note::
+        This requires `zstandard <https://pypi.org/project/zstandard/>`_ to be installed.
+
+    Parameters
+    ----------
+    max_size: :class:`int`
+        The largest a decompressed message is allowed to be.
+    """
+
+    def __init__(self, *, max_size: int = 128 * 1024 * 1024) -> None:
+        if zstandard is None:
+            raise RuntimeError("zstandard has to be installed to use zstd-stream compression")
+        self.max_size: int = max_size
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._zstd = self._decompressor.decompressobj()
+
+    def reset(self) -> None:
+        """Start a new stream. This has to be called when reconnecting"""
+        self._zstd = self._decompressor.decompressobj()
+
+    def decompress(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
+        """Feed a message to the inflater
+
+        Parameters
+        ----------
+        data:
+            A message received from the gateway
+
+        Raises
+        ------
+        BadDataException
+            The data was corrupted or too big. The stream has to be :meth:`reset`.
+        """
+        view = memoryview(data)
+        try:
+            if len(view) * ZSTD_MAX_RATIO <= self.max_size:
+                # Can't inflate past the max size, which is the case for nearly every message
+                decompressed: bytes = self._zstd.decompress(view)
+                return decompressed
+            return self._decompress_bounded(view)
+        except zstandard.ZstdError:
+            raise BadDataException("Received corrupted zstd data")
+
+    def _decompress_bounded(self, view: memoryview) -> bytes:
+        """Feed the message in slices which can't inflate past what is left of the max size.
+
+        zstandard has no way to limit the output of a streaming decompress call.
+        """
+        chunks: list[bytes] = []
+        size = 0
+        offset = 0
+        while offset < len(view):
+            step = max((self.max_size - size) // ZSTD_MAX_RATIO, 1)
+            chunk: bytes = self._zstd.decompress(view[offset : offset + step])
+            offset += step
+            size += len(chunk)
+            if size > self.max_size:
+                raise BadDataException(f"Message is bigger than the max size of {self.max_size} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+def create_inflater(
+    compression: Literal["zlib-stream", "zstd-stream"], *, max_size: int = 128 * 1024 * 1024
+) -> Union[ZlibStreamInflater, ZstdStreamInflater]:
+    """Create the inflater for a transport compression
+
+    Parameters
+    ----------
+    compression: :class:`str`
+        The ``compress`` query parameter sent to discord
+    max_size: :class:`int`
+        The largest a decompressed message is allowed to be.
+    """
+    if compression == "zlib-stream":
+        return ZlibStreamInflater(max_size=max_size)
+    if compression == "zstd-stream":
+        return ZstdStreamInflater(max_size=max_size)
+    raise ValueError(f"Unknown gateway compression {compression}")
@@ -0,0 +1,283 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""A encoder and decoder for the `Erlang external term format <https://www.erlang.org/doc/apps/erts/erl_ext_dist.html>`_
+
+This is the ``encoding=etf`` gateway encoding. If `erlpack <https://github.com/discord/erlpack>`_ is installed it will be used instead of the pure python implementation.
+Both decode to the same types: binaries and atoms become :class:`str`.
+"""
+from __future__ import annotations
+
+import zlib
+from struct import Struct
+from struct import error as StructError
+from typing import TYPE_CHECKING
+
+from .exceptions import BadDataException
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Union
+
+try:
+    import erlpack  # type: ignore
+except ModuleNotFoundError:
+    erlpack = None
+
+__all__ = ("loads", "dumps", "py_loads", "py_dumps")
+
+VERSION = 131
+
+NEW_FLOAT_EXT = 70
+COMPRESSED = 80
+SMALL_INTEGER_EXT = 97
+INTEGER_EXT = 98
+FLOAT_EXT = 99
+ATOM_EXT = 100
+SMALL_TUPLE_EXT = 104
+LARGE_TUPLE_EXT = 105
+NIL_EXT = 106
+STRING_EXT = 107
+LIST_EXT = 108
+BINARY_EXT = 109
+SMALL_BIG_EXT = 110
+LARGE_BIG_EXT = 111
+SMALL_ATOM_EXT = 115
+MAP_EXT = 116
+ATOM_UTF8_EXT = 118
+SMALL_ATOM_UTF8_EXT = 119
+
+_uint16 = Struct(">H")
+_uint32 = Struct(">I")
+_int32 = Struct(">i")
+_double = Struct(">d")
+
+_ATOMS: dict[str, Any] = {"nil": None, "null": None, "true": True, "false": False}
+
+
+class _Decoder:
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        self.data: memoryview = memoryview(data)
+        self.offset: int = 0
+
+    def _read_uint32(self) -> int:
+        value: int = _uint32.unpack_from(self.data, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def _read_text(self, length: int) -> str:
+        start = self.offset
+        self.offset += length
+        return str(self.data[start : self.offset], "utf-8")
+
+    def _read_atom(self, length: int) -> Any:
+        atom = self._read_text(length)
+        return _ATOMS.get(atom, atom)
+
+    def decode(self) -> Any:
+        data = self.data
+        tag = data[self.offset]
+        self.offset += 1
+
+        # Sorted by how common they are in gateway payloads
+        if tag == BINARY_EXT:
+            return self._read_text(self._read_uint32())
+        if tag == SMALL_INTEGER_EXT:
+            self.offset += 1
+            return data[self.offset - 1]
+        if tag == SMALL_ATOM_UTF8_EXT or tag == SMALL_ATOM_EXT:
+            self.offset += 1
+            return self._read_atom(data[self.offset - 1])
+        if tag == MAP_EXT:
+            arity = self._read_uint32()
+            decode = self.decode
+            return {decode(): decode() for _ in range(arity)}
+        if tag == LIST_EXT:
+            length = self._read_uint32()
+            items = [self.decode() for _ in range(length)]
+            tail = self.decode()
+            if tail != []:
+                items.append(tail)  # Improper list, should never be sent by discord
+            return items
+        if tag == NIL_EXT:
+            return []
+        if tag == INTEGER_EXT:
+            (value,) = _int32.unpack_from(data, self.offset)
+            self.offset += 4
+            return value
+        if tag == NEW_FLOAT_EXT:
+            (value,) = _double.unpack_from(data, self.offset)
+            self.offset += 8
+            return value
+        if tag == SMALL_BIG_EXT or tag == LARGE_BIG_EXT:
+            if tag == SMALL_BIG_EXT:
+                length = data[self.offset]
+                self.offset += 1
+            else:
+                length = self._read_uint32()
+            sign = data[self.offset]
+            start = self.offset + 1
+            self.offset = start + length
+            value = int.from_bytes(data[start : self.offset], "little")
+            return -value if sign else value
+        if tag == ATOM_EXT or tag == ATOM_UTF8_EXT:
+            (length,) = _uint16.unpack_from(data, self.offset)
+            self.offset += 2
+            return self._read_atom(length)
+        if tag == STRING_EXT:
+            # A list of small integers
+            (length,) = _uint16.unpack_from(data, self.offset)
+            start = self.offset + 2
+            self.offset = start + length
+            return list(data[start : self.offset])
+        if tag == SMALL_TUPLE_EXT or tag == LARGE_TUPLE_EXT:
+            if tag == SMALL_TUPLE_EXT:
+                arity = data[self.offset]
+                self.offset += 1
+            else:
+                arity = self._read_uint32()
+            return tuple(self.decode() for _ in range(arity))
+        if tag == FLOAT_EXT:
+            start = self.offset
+            self.offset += 31
+            return float(str(data[start : self.offset], "ascii").rstrip("\x00"))
+        if tag == COMPRESSED:
+            size = self._read_uint32()
+            inner = zlib.decompress(data[self.offset :], bufsize=size)
+            self.offset = len(data)
+            return _Decoder(inner).decode()
+        raise BadDataException(f"Unknown ETF tag {tag}")
+
+
+def py_loads(data: Union[bytes, bytearray, memoryview]) -> Any:
+    """Decode a ETF term using the pure python decoder
+
+    Parameters
+    ----------
+    data:
+        The encoded term including the version byte
+    """
+    if not data or data[0] != VERSION:
+        raise BadDataException("ETF data is missing the version byte")
+    decoder = _Decoder(data)
+    decoder.offset = 1
+    try:
+        value = decoder.decode()
+    except (IndexError, ValueError, StructError, zlib.error) as error:
+        # Truncated or malformed frames
+        raise BadDataException("Received corrupted ETF data") from error
+    if decoder.offset > len(data):
+        # Slices past the end are cut short instead of raising
+        raise BadDataException("Received truncated ETF data")
+    return value
+
+
+def _encode(value: Any, buffer: bytearray) -> None:
+    if value is None:
+        buffer += b"\x77\x03nil"
+    elif value is True:
+        buffer += b"\x77\x04true"
+    elif value is False:
+        buffer += b"\x77\x05false"
+    elif isinstance(value, int):
+        if 0 <= value <= 255:
+            buffer.append(SMALL_INTEGER_EXT)
+            buffer.append(value)
+        elif -(2**31) <= value < 2**31:
+            buffer.append(INTEGER_EXT)
+            buffer += _int32.pack(value)
+        else:
+            digits = abs(value).to_bytes((abs(value).bit_length() + 7) // 8, "little")
+            if len(digits) > 255:
+                raise ValueError("Integer is too big to encode")
+            buffer.append(SMALL_BIG_EXT)
+            buffer.append(len(digits))
+            buffer.append(value < 0)
+            buffer += digits
+    elif isinstance(value, float):
+        buffer.append(NEW_FLOAT_EXT)
+        buffer += _double.pack(value)
+    elif isinstance(value, str):
+        encoded = value.encode("utf-8")
+        buffer.append(BINARY_EXT)
+        buffer += _uint32.pack(len(encoded))
+        buffer += encoded
+    elif isinstance(value, (bytes, bytearray)):
+        buffer.append(BINARY_EXT)
+        buffer += _uint32.pack(len(value))
+        buffer += value
+    elif isinstance(value, dict):
+        buffer.append(MAP_EXT)
+        buffer += _uint32.pack(len(value))
+        for key, item in value.items():
+            _encode(key, buffer)
+            _encode(item, buffer)
+    elif isinstance(value, (list, tuple)):
+        if not value:
+            buffer.append(NIL_EXT)
+            return
+        buffer.append(LIST_EXT)
+        buffer += _uint32.pack(len(value))
+        for item in value:
+            _encode(item, buffer)
+        buffer.append(NIL_EXT)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} as ETF")
+
+
+def py_dumps(value: Any) -> bytes:
+    """Encode a value as a ETF term using the pure python encoder
+
+    Parameters
+    ----------
+    value:
+        The value to encode
+    """
+    buffer = bytearray((VERSION,))
+    _encode(value, buffer)
+    return bytes(buffer)
+
+
+def _normalise(value: Any) -> Any:
+    """Convert the types erlpack decodes to the ones the pure python decoder returns"""
+    if isinstance(value, dict):
+        return {_normalise(key): _normalise(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalise(item) for item in value]
+    if isinstance(value, bytes):
+        return str(value, "utf-8")
+    if isinstance(value, str) and type(value) is not str:
+        # erlpack.Atom
+        return str(value)
+    if isinstance(value, tuple):
+        return tuple(_normalise(item) for item in value)
+    return value
+
+
+def _erlpack_loads(data: Union[bytes, bytearray, memoryview]) -> Any:
+    try:
+        return _normalise(erlpack.unpack(bytes(data)))
+    except Exception as error:
+        raise BadDataException("Received corrupted ETF data") from error
+
+
+loads: Callable[[Union[bytes, bytearray, memoryview]], Any] = py_loads if erlpack is None else _erlpack_loads
+"""Decode a ETF term"""
+dumps: Callable[[Any], bytes] = py_dumps if erlpack is None else erlpack.pack
+"""Encode a value as a ETF term"""
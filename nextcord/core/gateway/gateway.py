@@ -20,24 +20,41 @@
 # DEALINGS IN THE SOFTWARE.
 from __future__ import annotations
 
-from collections import defaultdict
+from asyncio import TimeoutError, gather, wait_for
+from collections import deque
 from logging import getLogger
+from math import ceil
 from typing import TYPE_CHECKING
+from weakref import WeakSet
 
 from ...dispatcher import Dispatcher
-from ..ratelimiter import TimesPer
+from ...exceptions import NextcordException
+from ...utils import json
+from .enums import CloseCodeEnum
 from .exceptions import NotEnoughShardsException
+from .identify import IDENTIFY_WINDOW, IdentifyScheduler
 from .protocols.gateway import GatewayProtocol
 
 if TYPE_CHECKING:
-    from typing import Any, Optional
+    from typing import Any, AsyncContextManager, Callable, Optional
 
     from ...client.state import State
-    from ...exceptions import NextcordException
     from .protocols.shard import ShardProtocol
 
 logger = getLogger(__name__)
 
+# Events which are replays of state from connecting. The old shard set already sent these.
+CONNECTION_EVENTS = frozenset(("READY", "RESUMED", "GUILD_CREATE"))
+
+
+def _partition_by(field: str) -> Callable[[ShardProtocol, Any], Any]:
+    def partition(_: ShardProtocol, data: Any) -> Any:
+        if isinstance(data, dict):
+            return data.get(field)
+        return None
+
+    return partition
+
 
 class Gateway(GatewayProtocol):
     """A fast and simple :class:`GatewayProtocol` implementation
@@ -53,47 +70,89 @@ class Gateway(GatewayProtocol):
 
     def __init__(self, state: State, shard_count: Optional[int] = None) -> None:
         self.state: State = state
+        self.url: str = "wss://gateway.discord.gg"
+        """The url shards connect to. This is updated from discord when connecting"""
 
         # Ratelimiting
-        self._identify_ratelimits: defaultdict[int, TimesPer] = defaultdict(lambda: TimesPer(1, 5))
-        self._max_concurrency: Optional[int] = None
+        self.identify_scheduler: Optional[IdentifyScheduler] = None
+        """Connects shards under the identify ratelimits. Created when connecting. Use this to track startup progress"""
 
         # Shard count
         self.shard_count: Optional[int] = shard_count
         """The current shard count"""
         self._shard_count_locked: bool = self.shard_count is not None
+        self.shard_ids: Optional[list[int]] = None
+        """The shard ids this gateway runs. None runs every shard"""
 
         # Shard sets
         self.shards: list[ShardProtocol] = []
         """The currently active shards"""
         # When we get disconnected for too low shard count, we start creating a second set of inactive shards.
-        self._pending_shard_set: list[Any] = []
+        self._pending_shard_set: list[ShardProtocol] = []
         self._recreating_shards: bool = False
+        # Events received while both shard sets are running. Used to dedupe when swapping.
+        self.rescale_buffer_size: int = 10_000
+        """How many events from the new shard set are kept while rescaling, to replay ones the old set missed"""
+        self.rescale_timeout: float = 120
+        """How many seconds the new shard set gets to become ready, on top of the time identifying takes"""
+        self._pending_lookup: set[ShardProtocol] = set()
+        # Cleaned up once nothing references the shard anymore
+        self._retired_shards: WeakSet[ShardProtocol] = WeakSet()
+        self._overlap_buffer: deque[tuple[ShardProtocol, str, Any, int]] = deque()
+        self._overlap_seen: dict[int, None] = {}
 
         # Dispatchers
-        self.event_dispatcher: Dispatcher = Dispatcher()
-        self.raw_dispatcher: Dispatcher = Dispatcher()
+        self.event_dispatcher: Dispatcher = Dispatcher(
+            inline=state.inline_dispatch,
+            max_queue=state.event_queue_size,
+            overflow=state.event_overflow,
+            droppable_events=state.droppable_events,
+            partition=None if state.event_partition is None else _partition_by(state.event_partition),
+            metrics=state.metrics,
+            name="event",
+        )
+        self.raw_dispatcher: Dispatcher = Dispatcher(
+            inline=state.inline_dispatch,
+            max_queue=state.event_queue_size,
+            overflow=state.event_overflow,
+            droppable_events=state.droppable_events,
+            metrics=state.metrics,
+            name="raw",
+        )
 
     async def connect(self) -> None:
         """Connect to the gateway"""
         r = await self.state.http.get_gateway_bot()
         gateway_info = await r.json()
+        self.url = gateway_info["url"]
 
         if self.shard_count is None:
             self.shard_count = gateway_info["shards"]
 
-        session_start_limit = gateway_info["session_start_limit"]
-        self._max_concurrency = session_start_limit["max_concurrency"]
+        self.identify_scheduler = IdentifyScheduler(gateway_info["session_start_limit"])
+
+        shard_ids = range(self.shard_count) if self.shard_ids is None else self.shard_ids
+        shards = [self.state.type_sheet.shard(self.state, shard_id) for shard_id in shard_ids]
+        self.shards.extend(shards)
+        self.state.loop.create_task(self.identify_scheduler.connect(shards))
 
-        for shard_id in range(self.shard_count):
-            shard = self.state.type_sheet.shard(
-                self.state,
-                shard_id,
-            )
-            self.state.loop.create_task(shard.connect())
-            self.shards.append(shard)
+    async def send(self, data: dict[str, Any], *, shard_id: int = 0) -> None:
+        """Send a raw payload through one of the running shards
 
-    def get_identify_ratelimiter(self, shard_id: int) -> TimesPer:
+        Parameters
+        ----------
+        data: :class:`dict[str, Any]`
+            The payload to send
+        shard_id: :class:`int`
+            The shard to send it through
+        """
+        for shard in self.shards:
+            if shard.shard_id == shard_id:
+                await shard.send(data)
+                return
+        raise NextcordException(f"Shard {shard_id} is not running")
+
+    def get_identify_ratelimiter(self, shard_id: int) -> AsyncContextManager[Any]:
         """Get the ratelimiter the shard should use while connecting
 
         Parameters
@@ -103,9 +162,9 @@ class Gateway(GatewayProtocol):
 
         """
 
-        if self._max_concurrency is None:
+        if self.identify_scheduler is None:
             raise NextcordException("Cannot get identify ratelimit before max_concurrency is filled")
-        return self._identify_ratelimits[shard_id % self._max_concurrency]
+        return self.identify_scheduler.get_ratelimiter(shard_id)
 
     def should_reconnect(self, shard: ShardProtocol) -> bool:
         """Called on :class:`ShardProtocol` disconnect to check if it should auto reconnect.
@@ -116,27 +175,161 @@ class Gateway(GatewayProtocol):
         shard: :class:`ShardProtocol`
             The shard asking if it should reconnect
         """
-        if not self._recreating_shards:
-            return True
-        if shard in self.shards:
+        # Shards which were closed or replaced by a rescale are no longer in either set
+        if shard in self._retired_shards:
             return False
-
-        return True
+        return shard in self.shards or shard in self._pending_lookup
 
     async def close(self) -> None:
         """Close all connections and cleanup.
         This should only be called once
         """
-        for shard in self.shards + self._pending_shard_set:
+        shards = self.shards
+        pending = self._pending_shard_set
+        self.shards = []
+        self._pending_shard_set = []
+        self._pending_lookup = set()
+        for shard in pending:
             await shard.close()
 
+        store = self.state.session_store
+        if store is None:
+            for shard in shards:
+                await shard.close()
+            return
+        # Closing with 1000 invalidates the session, any other code keeps it resumable
+        for shard in shards:
+            await shard.close(CloseCodeEnum.UNKNOWN_ERROR.value)
+        await store.save({shard.shard_id: session for shard in shards if (session := shard.session) is not None})
+
+    async def rescale(self, shard_count: Optional[int] = None) -> None:
+        """Move to a new shard count without downtime.
+
+        A new set of shards is connected in the background under the identify ratelimits while the current set keeps
+        running. Once every new shard has received READY the sets are swapped and the old set is closed.
+        Events the new set received before the swap are replayed if the old set did not dispatch them.
+        If a new shard fails to connect or the set is not ready in time, the new set is closed, the current set
+        keeps running and :class:`NextcordException` is raised.
+
+        .. note::
+            :attr:`raw_dispatcher` receives payloads from both sets while rescaling.
+
+        Parameters
+        ----------
+        shard_count: :class:`Optional[int]`
+            The shard count to move to. If this is None the recommended shard count is fetched from discord.
+        """
+        if self._recreating_shards:
+            return
+        if self.shard_ids is not None:
+            raise NextcordException("Cannot rescale a gateway running a subset of the shards")
+        self._recreating_shards = True
+        try:
+            if shard_count is None:
+                r = await self.state.http.get_gateway_bot()
+                gateway_info = await r.json()
+                shard_count = gateway_info["shards"]
+            if shard_count == self.shard_count:
+                return
+            logger.info("Rescaling from %s to %s shards", self.shard_count, shard_count)
+
+            pending = [
+                self.state.type_sheet.shard(self.state, shard_id, shard_count=shard_count)
+                for shard_id in range(shard_count)
+            ]
+            self._pending_shard_set = pending
+            self._pending_lookup = set(pending)
+            self._overlap_buffer = deque(maxlen=self.rescale_buffer_size)
+            self._overlap_seen = {}
+
+            if self.identify_scheduler is None:
+                raise NextcordException("Cannot rescale before connecting")
+            # The first identify window starts right away
+            windows = ceil(shard_count / self.identify_scheduler.max_concurrency)
+            timeout = (windows - 1) * IDENTIFY_WINDOW + self.rescale_timeout
+            try:
+                await wait_for(self._connect_pending(self.identify_scheduler, pending), timeout)
+            except BaseException as e:
+                # Also on cancellation, the new set would otherwise keep running unused
+                self._retired_shards.update(pending)
+                self._pending_shard_set = []
+                self._pending_lookup = set()
+                self._overlap_buffer.clear()
+                self._overlap_seen = {}
+                for shard in pending:
+                    await shard.close()
+                if isinstance(e, TimeoutError):
+                    raise NextcordException(f"The new shard set was not ready within {timeout}s") from None
+                raise
+
+            # Swap. Nothing is awaited until the new set is dispatching so no events are lost in between.
+            old_shards = self.shards
+            self._retired_shards.update(old_shards)
+            self.shards = pending
+            self.shard_count = shard_count
+            self._pending_shard_set = []
+            self._pending_lookup = set()
+            for shard, event_name, data, fingerprint in self._overlap_buffer:
+                if fingerprint not in self._overlap_seen:
+                    self.event_dispatcher.dispatch(event_name, shard, data)
+            self._overlap_buffer.clear()
+            self._overlap_seen = {}
+            logger.info("Swapped to %s shards", shard_count)
+        finally:
+            self._recreating_shards = False
+
+        for shard in old_shards:
+            await shard.close()
+
+    async def _connect_pending(self, scheduler: IdentifyScheduler, pending: list[ShardProtocol]) -> None:
+        connecting = self.state.loop.create_task(scheduler.connect(pending))
+        try:
+            # Returns once every shard sent its identify or gave up
+            await connecting
+        finally:
+            connecting.cancel()
+        failed = [shard.shard_id for shard in pending if shard in scheduler.failed]
+        if failed:
+            raise NextcordException(f"Shards {failed} failed to connect while rescaling")
+        await gather(*(shard.ready.wait() for shard in pending))
+
     # Dispatcher handles
+    def handle_dispatch(self, shard: ShardProtocol, event_name: str, data: Any) -> None:
+        """Called by :class:`ShardProtocol` for every event it receives through the dispatch opcode
+
+        Parameters
+        ----------
+        shard: :class:`ShardProtocol`
+            The shard that received the event
+        event_name: :class:`str`
+            The name of the event
+        data:
+            The event data
+        """
+        if shard in self._retired_shards:
+            return  # Replaced by a rescale and closing
+        if not self._recreating_shards:
+            self.event_dispatcher.dispatch(event_name, shard, data)
+            return
+
+        if shard in self._pending_lookup:
+            if event_name not in CONNECTION_EVENTS:
+                self._overlap_buffer.append((shard, event_name, data, self._fingerprint(event_name, data)))
+        else:
+            self._overlap_seen[self._fingerprint(event_name, data)] = None
+            if len(self._overlap_seen) > self.rescale_buffer_size:
+                del self._overlap_seen[next(iter(self._overlap_seen))]
+            self.event_dispatcher.dispatch(event_name, shard, data)
+
+    def _fingerprint(self, event_name: str, data: Any) -> int:
+        return hash((event_name, json.dumps(data)))
+
     async def handle_rescale(self) -> None:
+        """Called when a shard gets disconnected for having too few shards"""
         if self._recreating_shards:
             # Possibly error here as this should never be dispatched?
             return
         if self._shard_count_locked:
             await self.state.client.close(NotEnoughShardsException())
             return
-        self._recreating_shards = True
-        # TODO: Rescale.
+        await self.rescale()
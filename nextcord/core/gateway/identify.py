@@ -0,0 +1,152 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+from asyncio import gather, get_event_loop, sleep
+from collections import deque
+from logging import getLogger
+from math import ceil
+from typing import TYPE_CHECKING
+
+from ..ratelimiter import TimesPer
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+    from .protocols.shard import ShardProtocol
+
+__all__ = ("IdentifyScheduler",)
+
+logger = getLogger(__name__)
+
+IDENTIFY_WINDOW = 5
+"""How many seconds an identify concurrency bucket is locked for after identifying"""
+CONNECT_ATTEMPTS = 3
+"""How many times a shard is tried before it is given up on"""
+
+
+class IdentifyScheduler:
+    """Connects shards as fast as discord allows.
+
+    Shards are grouped into their concurrency bucket (``shard_id % max_concurrency``) and every bucket connects its
+    shards one after another, so exactly ``max_concurrency`` identifies are started every 5 seconds.
+    Every identify is counted against the ``session_start_limit``. A shard which fails to connect is tried again
+    after the rest of its bucket.
+
+    Parameters
+    ----------
+    session_start_limit: :class:`dict[str, int]`
+        The session_start_limit object from `get gateway bot <https://discord.dev/topics/gateway#get-gateway-bot>`_
+    """
+
+    def __init__(self, session_start_limit: dict[str, int]) -> None:
+        self.max_concurrency: int = session_start_limit["max_concurrency"]
+        """How many shards can identify at the same time"""
+        self.session_starts_remaining: int = session_start_limit["remaining"]
+        """How many identifies are left before the session start limit resets"""
+        self.session_starts_total: int = session_start_limit["total"]
+        """How many identifies are allowed per reset"""
+
+        self._loop = get_event_loop()
+        self._session_reset_at: float = self._loop.time() + session_start_limit["reset_after"] / 1000
+        self._buckets: list[TimesPer] = [TimesPer(1, IDENTIFY_WINDOW) for _ in range(self.max_concurrency)]
+
+        self.identified: int = 0
+        """How many shards the scheduler has connected"""
+        self.total: int = 0
+        """How many shards the scheduler has been asked to connect"""
+        self.failed: list[ShardProtocol] = []
+        """Shards which failed to connect :data:`CONNECT_ATTEMPTS` times"""
+
+    @property
+    def eta(self) -> float:
+        """Seconds until every shard passed to :meth:`connect` is connected"""
+        windows = ceil((self.total - self.identified - len(self.failed)) / self.max_concurrency)
+        return max(windows - 1, 0) * IDENTIFY_WINDOW
+
+    def get_ratelimiter(self, shard_id: int) -> _IdentifyRatelimiter:
+        """Get the ratelimiter a shard has to identify under
+
+        Parameters
+        ----------
+        shard_id: :class:`int`
+            The shard id of the connecting shard.
+        """
+        return _IdentifyRatelimiter(self, self._buckets[shard_id % self.max_concurrency])
+
+    async def connect(self, shards: list[ShardProtocol]) -> None:
+        """Connect shards, ordered by concurrency bucket
+
+        Parameters
+        ----------
+        shards: :class:`list[ShardProtocol]`
+            The shards to connect
+        """
+        buckets: list[list[ShardProtocol]] = [[] for _ in range(self.max_concurrency)]
+        for shard in sorted(shards, key=lambda shard: shard.shard_id):
+            buckets[shard.shard_id % self.max_concurrency].append(shard)
+
+        self.total += len(shards)
+        await gather(*(self._connect_bucket(bucket) for bucket in buckets if bucket))
+
+    async def _connect_bucket(self, shards: list[ShardProtocol]) -> None:
+        queue = deque((shard, 1) for shard in shards)
+        while queue:
+            shard, attempt = queue.popleft()
+            try:
+                # Returns once the identify is sent, the bucket ratelimiter spaces out the next one.
+                await shard.connect()
+            except Exception:
+                # One shard failing should not keep the rest of the bucket from connecting
+                if attempt < CONNECT_ATTEMPTS:
+                    logger.exception("Shard %s failed to connect, trying again later", shard.shard_id)
+                    queue.append((shard, attempt + 1))
+                else:
+                    logger.exception("Shard %s failed to connect %s times, giving up", shard.shard_id, attempt)
+                    self.failed.append(shard)
+                continue
+            self.identified += 1
+            logger.info("Connected %s/%s shards. ETA %ss", self.identified, self.total, self.eta)
+
+    async def _take_session_start(self) -> None:
+        if self._loop.time() >= self._session_reset_at:
+            self.session_starts_remaining = self.session_starts_total
+            self._session_reset_at = self._loop.time() + 24 * 60 * 60
+        while self.session_starts_remaining <= 0:
+            wait = self._session_reset_at - self._loop.time()
+            logger.warning("Out of session starts, waiting %ss for the limit to reset", wait)
+            await sleep(wait)
+            if self._loop.time() >= self._session_reset_at:
+                self.session_starts_remaining = self.session_starts_total
+                self._session_reset_at = self._loop.time() + 24 * 60 * 60
+        self.session_starts_remaining -= 1
+
+
+class _IdentifyRatelimiter:
+    def __init__(self, scheduler: IdentifyScheduler, bucket: TimesPer) -> None:
+        self._scheduler: IdentifyScheduler = scheduler
+        self._bucket: TimesPer = bucket
+
+    async def __aenter__(self) -> _IdentifyRatelimiter:
+        await self._bucket.acquire()
+        await self._scheduler._take_session_start()
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        ...
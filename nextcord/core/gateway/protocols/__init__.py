@@ -21,6 +21,7 @@
 
 
 from .gateway import GatewayProtocol
+from .session_store import SessionStoreProtocol
 from .shard import ShardProtocol
 
-__all__ = ("GatewayProtocol", "ShardProtocol")
+__all__ = ("GatewayProtocol", "SessionStoreProtocol", "ShardProtocol")
@@ -22,10 +22,8 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Protocol
 
-from nextcord.core.ratelimiter import TimesPer
-
 if TYPE_CHECKING:
-    from typing import Any, Optional
+    from typing import Any, AsyncContextManager, Optional
 
     from ....client.state import State
     from ....dispatcher import Dispatcher
@@ -49,6 +47,8 @@ class GatewayProtocol(Protocol):
     """
 
     state: State
+    url: str
+    """The url shards should connect to"""
     shard_count: Optional[int]
     """The active shard count. None if not set yet."""
 
@@ -93,8 +93,28 @@ class GatewayProtocol(Protocol):
         """
         ...
 
-    def get_identify_ratelimiter(self, shard_id: int) -> TimesPer:
-        """Get the ratelimiter the shard should use while connecting
+    def handle_dispatch(self, shard: ShardProtocol, event_name: str, data: Any) -> None:
+        """Called by :class:`ShardProtocol` for every event it receives through the dispatch opcode.
+        This should dispatch it to :attr:`event_dispatcher`
+
+        Parameters
+        ----------
+        shard: :class:`ShardProtocol`
+            The shard that received the event
+        event_name: :class:`str`
+            The name of the event
+        data:
+            The event data
+        """
+        ...
+
+    async def handle_rescale(self) -> None:
+        """Called by :class:`ShardProtocol` when discord disconnects it for having too few shards."""
+        ...
+
+    def get_identify_ratelimiter(self, shard_id: int) -> AsyncContextManager[Any]:
+        """Get the ratelimiter the shard should use while identifying.
+        This should respect ``max_concurrency`` and the session start limit.
 
         Parameters
         ----------
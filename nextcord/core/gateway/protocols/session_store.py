@@ -0,0 +1,57 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+    from ..session_store import SessionInfo
+
+
+class SessionStoreProtocol(Protocol):
+    """Persists gateway sessions so shards can resume instead of identifying after a restart."""
+
+    async def load(self, shard_id: int) -> Optional[SessionInfo]:
+        """Get the stored session of a shard
+
+        Parameters
+        ----------
+        shard_id: :class:`int`
+            The shard to get the session for
+
+        Returns
+        -------
+        :class:`Optional[SessionInfo]`
+            The last stored session or None if there is none
+        """
+        ...
+
+    async def save(self, sessions: dict[int, SessionInfo]) -> None:
+        """Store the sessions of shards. This replaces the previously stored sessions of these shards.
+
+        Parameters
+        ----------
+        sessions: :class:`dict[int, SessionInfo]`
+            The sessions to store by shard id
+        """
+        ...
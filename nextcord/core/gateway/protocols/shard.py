@@ -27,7 +27,9 @@ from nextcord.dispatcher import Dispatcher
 
 if TYPE_CHECKING:
     from asyncio import Event
-    from typing import Any
+    from typing import Any, Optional
+
+    from ..session_store import SessionInfo
 
 
 class ShardProtocol(Protocol):
@@ -39,19 +41,27 @@ class ShardProtocol(Protocol):
         The current bot state
     shard_id: :class:`int`
         The shard_id you provide to discord in the `identify <https://discord.dev/topics/gateway#identifying>`_ payload when connecting.
+    shard_count: :class:`Optional[int]`
+        The shard count to identify with. If this is None use the gateway shard count.
+        This is set while rescaling as the new shards use a different shard count than the gateway.
     """
 
     shard_id: int
     """The shards ID. This is provided by :class:`GatewayProtocol`."""
     ready: Event
-    """A event set when the shard has identified or resumed"""
+    """A event set when the shard has received READY or RESUMED"""
 
     opcode_dispatcher: Dispatcher
     """A dispatcher that will dispatched everything that the gateway sends us."""
     event_dispatcher: Dispatcher
     """A dispatcher that gets all events dispatched via the dispatch opcode from the gateway. This should only dispatch the data"""
 
-    def __init__(self, state: State, shard_id: int) -> None:
+    @property
+    def session(self) -> Optional[SessionInfo]:
+        """The session to store on shutdown so it can be resumed on the next start. None if there is no session"""
+        ...
+
+    def __init__(self, state: State, shard_id: int, *, shard_count: Optional[int] = None) -> None:
         ...
 
     async def connect(self) -> None:
@@ -72,7 +82,7 @@ class ShardProtocol(Protocol):
         """
         ...
 
-    async def close(self) -> None:
+    async def close(self, code: int = 1000) -> None:
         """Closes the connection to the gateway
 
         .. note::
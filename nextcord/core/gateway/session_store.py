@@ -0,0 +1,175 @@
+# The MIT License (MIT)
+# Copyright (c) 2021-present vcokltfre & tag-epic
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""Stores which keep gateway sessions across restarts.
+
+Pass one to :class:`Client <nextcord.client.client.Client>` and shards will resume the sessions of the previous run
+instead of identifying, which skips the GUILD_CREATE replay and does not use up the session start limit.
+
+.. code-block:: python3
+
+    client = Client(token, intents, session_store=FileSessionStore("sessions.json"))
+
+.. note::
+    Sessions are only stored when the client is closed gracefully.
+    Discord only allows resuming for a short while after disconnecting.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from asyncio import get_event_loop
+from typing import TYPE_CHECKING
+
+from attr import dataclass
+
+from ...utils import json
+from .protocols.session_store import SessionStoreProtocol
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+__all__ = ("SessionInfo", "FileSessionStore", "SQLiteSessionStore")
+
+
+@dataclass(slots=True)
+class SessionInfo:
+    """What a shard needs to resume a session
+
+    Parameters
+    ----------
+    session_id: :class:`str`
+        The session id from READY
+    seq: :class:`Optional[int]`
+        The last sequence number received
+    resume_url: :class:`Optional[str]`
+        The url to resume on from READY
+    shard_count: :class:`Optional[int]`
+        The shard count the session was identified with. The session is not resumed if this changed
+    """
+
+    session_id: str
+    seq: Optional[int]
+    resume_url: Optional[str]
+    shard_count: Optional[int]
+
+
+class FileSessionStore(SessionStoreProtocol):
+    """Stores sessions in a JSON file
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The file to store the sessions in. It is created if it does not exist
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._sessions: Optional[dict[str, Any]] = None
+
+    async def load(self, shard_id: int) -> Optional[SessionInfo]:
+        if self._sessions is None:
+            self._sessions = await get_event_loop().run_in_executor(None, self._read)
+        session = self._sessions.get(str(shard_id))
+        if session is None:
+            return None
+        return SessionInfo(**session)
+
+    async def save(self, sessions: dict[int, SessionInfo]) -> None:
+        if self._sessions is None:
+            self._sessions = await get_event_loop().run_in_executor(None, self._read)
+        for shard_id, session in sessions.items():
+            self._sessions[str(shard_id)] = {
+                "session_id": session.session_id,
+                "seq": session.seq,
+                "resume_url": session.resume_url,
+                "shard_count": session.shard_count,
+            }
+        await get_event_loop().run_in_executor(None, self._write, self._sessions)
+
+    def _read(self) -> dict[str, Any]:
+        try:
+            with open(self.path, "rb") as f:
+                sessions: dict[str, Any] = json.loads(f.read())
+                return sessions
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, sessions: dict[str, Any]) -> None:
+        # Write to a temporary file first so a crash never leaves a half written file behind
+        temporary_path = f"{self.path}.tmp"
+        payload = json.dumps(sessions)
+        with open(temporary_path, "wb") as f:
+            f.write(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        os.replace(temporary_path, self.path)
+
+
+class SQLiteSessionStore(SessionStoreProtocol):
+    """Stores sessions in a SQLite database
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The database file. It is created if it does not exist
+    table: :class:`str`
+        The table to store the sessions in
+    """
+
+    def __init__(self, path: str, table: str = "nextcord_sessions") -> None:
+        self.path: str = path
+        self.table: str = table
+
+    async def load(self, shard_id: int) -> Optional[SessionInfo]:
+        return await get_event_loop().run_in_executor(None, self._load, shard_id)
+
+    async def save(self, sessions: dict[int, SessionInfo]) -> None:
+        await get_event_loop().run_in_executor(None, self._save, sessions)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(shard_id INTEGER PRIMARY KEY, session_id TEXT, seq INTEGER, resume_url TEXT, shard_count INTEGER)"
+        )
+        return connection
+
+    def _load(self, shard_id: int) -> Optional[SessionInfo]:
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                f"SELECT session_id, seq, resume_url, shard_count FROM {self.table} WHERE shard_id = ?", (shard_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return SessionInfo(*row)
+
+    def _save(self, sessions: dict[int, SessionInfo]) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (shard_id, session.session_id, session.seq, session.resume_url, session.shard_count)
+                        for shard_id, session in sessions.items()
+                    ],
+                )
+        finally:
+            connection.close()
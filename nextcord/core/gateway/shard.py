@@ -18,20 +18,23 @@
 # DEALINGS IN THE SOFTWARE.
 from __future__ import annotations
 
-import zlib
+import re
 from asyncio.locks import Event
 from asyncio.tasks import sleep
 from logging import getLogger
 from random import random
 from sys import platform
+from time import perf_counter
 from typing import TYPE_CHECKING, Any
 
 from aiohttp import WSMsgType
 
 from ...dispatcher import Dispatcher
 from ...exceptions import NextcordException
-from ...utils import json
+from ...utils import json, json_loads
 from ..ratelimiter import TimesPer
+from . import etf
+from .compression import create_inflater
 from .enums import CloseCodeEnum, OpcodeEnum
 from .exceptions import (
     BadDataException,
@@ -40,16 +43,20 @@ from .exceptions import (
     ShardClosedException,
 )
 from .protocols.shard import ShardProtocol
+from .session_store import SessionInfo
 
 if TYPE_CHECKING:
     from logging import Logger
-    from typing import Optional
+    from typing import Callable, Literal, Optional, Union
 
     from aiohttp import ClientWebSocketResponse
 
     from ...client.state import State
+    from ..protocols.metrics import MetricsProtocol
+    from .compression import ZlibStreamInflater, ZstdStreamInflater
 
-ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+# The start of a payload as discord serializes it. Used to read the header without parsing the event data.
+HEADER_PATTERN = re.compile(rb'{"t":(?:null|"([A-Z0-9_]+)"),"s":(null|\d+),"op":(\d+),"d":')
 
 
 class Shard(ShardProtocol):
@@ -57,45 +64,93 @@ class Shard(ShardProtocol):
         self,
         state: State,
         shard_id: int,
+        *,
+        shard_count: Optional[int] = None,
     ) -> None:
         self.shard_id: int = shard_id
+        self._shard_count: Optional[int] = shard_count
 
         # Events
         self.ready: Event = Event()
 
+        # Transport
+        self.encoding: Literal["json", "etf"] = state.gateway_encoding
+        """The encoding payloads are sent in"""
+        self.compression: Optional[Literal["zlib-stream", "zstd-stream"]] = state.gateway_compression
+        """The transport compression used. None if disabled"""
+        self._inflater: Optional[Union[ZlibStreamInflater, ZstdStreamInflater]] = (
+            None if self.compression is None else create_inflater(self.compression)
+        )
+        self._loads: Callable[[Union[bytes, memoryview]], Any] = json_loads if self.encoding == "json" else etf.loads
+        self.lazy_parsing: bool = state.lazy_parsing and self.encoding == "json"
+        """If events nobody listens to are skipped without being parsed. Only supported with JSON"""
+
         # Internal things
-        self._gateway_url = "wss://gateway.discord.gg?v=9&compress=zlib-stream"
         self._ws: Optional[ClientWebSocketResponse] = None
         self._state: State = state
         self._ratelimiter: TimesPer = TimesPer(120 - 3, 60)  # 3 margin for heartbeats
-        self._zlib = zlib.decompressobj()
-        self._buffer = bytearray()
         self._logger: Logger = getLogger(f"nextcord.shard.{self.shard_id}")
+        self._metrics: Optional[MetricsProtocol] = state.metrics if state.metrics.enabled else None
+        self._metric_tags: dict[str, str] = {"shard": str(shard_id)}
 
         # Discord info
         self._seq: Optional[int] = None
         self._session_id: Optional[str] = None
+        self._resume_url: Optional[str] = None
+        self._session_restored: bool = False
 
         # Heartbeating related
         self._has_acknowledged_heartbeat: bool = True
+        self._heartbeat_sent_at: float = 0
 
         # Dispatchers
-        self.opcode_dispatcher: Dispatcher = Dispatcher()
-        self.event_dispatcher: Dispatcher = Dispatcher()
-        self.disconnect_dispatcher: Dispatcher = Dispatcher()
+        self.opcode_dispatcher: Dispatcher = Dispatcher(inline=state.inline_dispatch)
+        self.event_dispatcher: Dispatcher = Dispatcher(inline=state.inline_dispatch)
+        self.disconnect_dispatcher: Dispatcher = Dispatcher(inline=state.inline_dispatch)
 
         # Register handles
         self.opcode_dispatcher.add_listener(self._handle_hello, OpcodeEnum.HELLO.value)
         self.opcode_dispatcher.add_listener(self._handle_heartbeat_ack, OpcodeEnum.HEARTBEAT_ACK.value)
+        self.opcode_dispatcher.add_listener(self._handle_invalid_session, OpcodeEnum.INVALID_SESSION.value)
         self.opcode_dispatcher.add_listener(self._handle_set_sequence)
         self.opcode_dispatcher.add_listener(self._handle_raw_dispatch)
         self.event_dispatcher.add_listener(self._handle_ready, "READY")
+        self.event_dispatcher.add_listener(self._handle_resumed, "RESUMED")
         self.event_dispatcher.add_listener(self._handle_dispatch)
         self.disconnect_dispatcher.add_listener(self._handle_disconnect)
 
+    @property
+    def shard_count(self) -> Optional[int]:
+        """The shard count this shard identifies with. Defaults to the gateway shard count"""
+        if self._shard_count is None:
+            return self._state.gateway.shard_count
+        return self._shard_count
+
+    @property
+    def session(self) -> Optional[SessionInfo]:
+        """The current session. None if the shard has not received READY"""
+        if self._session_id is None:
+            return None
+        return SessionInfo(self._session_id, self._seq, self._resume_url, self.shard_count)
+
+    @property
+    def _gateway_url(self) -> str:
+        base_url = self._state.gateway.url
+        if self._session_id is not None and self._resume_url is not None:
+            base_url = self._resume_url
+        url = f"{base_url}?v=9&encoding={self.encoding}"
+        if self.compression is not None:
+            url += f"&compress={self.compression}"
+        return url
+
     async def connect(self) -> None:
+        self.ready.clear()
+        if not self._session_restored:
+            self._session_restored = True
+            await self._restore_session()
         self._ws = await self._state.http.ws_connect(self._gateway_url)
-        self._zlib = zlib.decompressobj()
+        if self._inflater is not None:
+            self._inflater.reset()
         self._state.loop.create_task(self._receive_loop())
         if self._session_id is None:
             async with self._state.gateway.get_identify_ratelimiter(self.shard_id):
@@ -104,11 +159,25 @@ class Shard(ShardProtocol):
                 except ShardClosedException:
                     self._logger.debug("Ignoring identify as shard closed")
                     return
-            self._logger.info("Connected to the gateway")
-            self.ready.set()
+            self._logger.info("Identified with the gateway")
         else:
             await self.resume()
-            self._logger.info("Reconnected to the gateway")
+            self._logger.info("Resuming with the gateway")
+
+    async def _restore_session(self) -> None:
+        store = self._state.session_store
+        if store is None or self._session_id is not None:
+            return
+        session = await store.load(self.shard_id)
+        if session is None:
+            return
+        if session.shard_count != self.shard_count:
+            self._logger.debug("Not resuming stored session as the shard count changed")
+            return
+        self._session_id = session.session_id
+        self._seq = session.seq
+        self._resume_url = session.resume_url
+        self._logger.debug("Restored session from the session store")
 
     async def _send(self, data: dict[str, Any]) -> None:
         if self._ws is None:
@@ -116,22 +185,31 @@ class Shard(ShardProtocol):
         if self._ws.closed:
             raise NextcordException("Cannot send message to closed WS")
         self._logger.debug("> %s", data)
-        payload = json.dumps(data)
-        if isinstance(payload, str):
-            payload = payload.encode("utf-8")
+        if self.encoding == "etf":
+            payload = etf.dumps(data)
+        else:
+            payload = json.dumps(data)
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
         try:
             await self._ws.send_bytes(payload)
         except ConnectionResetError:
             raise ShardClosedException()
 
     async def send(self, data: dict[str, Any]) -> None:
+        if self._metrics is not None:
+            self._metrics.gauge("gateway.send.queue", self._ratelimiter.pending, self._metric_tags)
         async with self._ratelimiter:
             await self._send(data)
 
     async def _receive_loop(self) -> None:
         if self._ws is None:
             raise NextcordException("Receive loop got called before WS was created.")
+        metrics = self._metrics
+        started_at = 0.0
         async for message in self._ws:
+            if metrics is not None:
+                started_at = perf_counter()
             if message.type == WSMsgType.BINARY:
                 try:
                     raw_data = self._decompress(message.data)
@@ -140,14 +218,39 @@ class Shard(ShardProtocol):
                 except:
                     # Corruption/drop. Resetting is the only way as we are stateless
                     return await self.connect()
-                data = json.loads(raw_data.decode("utf-8"))
-                self._logger.debug("< %s", data)
-                self.opcode_dispatcher.dispatch(data["op"], data)
-
-                if data["op"] == OpcodeEnum.DISPATCH.value:
-                    self.event_dispatcher.dispatch(data["t"], data["d"])
+                if metrics is not None:
+                    decompressed_at = perf_counter()
+                    metrics.observe("gateway.decompress", decompressed_at - started_at, self._metric_tags)
+                    started_at = decompressed_at
+                if self.lazy_parsing and self._skip_unwanted(raw_data):
+                    continue
+                try:
+                    data = self._loads(raw_data)
+                except BadDataException:
+                    self._logger.warning("Received a corrupted payload, reconnecting", exc_info=True)
+                    return await self.connect()
+            elif message.type == WSMsgType.TEXT:
+                # Uncompressed JSON
+                if self.lazy_parsing and self._skip_unwanted(message.data.encode("utf-8")):
+                    continue
+                data = json.loads(message.data)
             else:
                 self._logger.debug("Unknown message type %s", message.type)
+                continue
+            if metrics is not None:
+                metrics.observe("gateway.parse", perf_counter() - started_at, self._metric_tags)
+            self._logger.debug("< %s", data)
+            self.opcode_dispatcher.dispatch(data["op"], data)
+
+            if data["op"] == OpcodeEnum.DISPATCH.value:
+                self.event_dispatcher.dispatch(data["t"], data["d"])
+
+            # Backpressure, stop reading until listeners catch up
+            gateway = self._state.gateway
+            if gateway.event_dispatcher.blocked:
+                await gateway.event_dispatcher.drain()
+            if gateway.raw_dispatcher.blocked:
+                await gateway.raw_dispatcher.drain()
         close_code = self._ws.close_code
         if close_code is None:
             return
@@ -159,7 +262,8 @@ class Shard(ShardProtocol):
             self._logger.info("Disconnected with code %s (%s)", close_code, close_code_enum)
         self.disconnect_dispatcher.dispatch(close_code)
 
-    async def _heartbeat_loop(self, heartbeat_interval: float) -> None:
+    async def _heartbeat_loop(self, heartbeat_interval: float, initial_wait_time: float) -> None:
+        await sleep(initial_wait_time)
         if self._ws is None:
             raise NextcordException("WS was None when HB loop started")
         while not self._ws.closed:
@@ -167,46 +271,91 @@ class Shard(ShardProtocol):
                 await self._ws.close(code=1008)
                 return
             self._has_acknowledged_heartbeat = False
+            self._heartbeat_sent_at = perf_counter()
             await self._send(
                 {"op": OpcodeEnum.HEARTBEAT.value, "d": self._seq},
             )
             await sleep(heartbeat_interval)
 
-    def _decompress(self, data: bytes) -> bytes:
-        self._buffer.extend(data)
-
-        if len(data) < 4 or data[-4:] != ZLIB_SUFFIX:
-            # This might happen with big payloads like member chunking? Not sure if discord uses it or not...
-            raise PartialDataException
-        try:
-            decompressed = self._zlib.decompress(self._buffer)
-        except:
-            # Most likely corrupted data. We are going to ignore it and pretend nothing happened..."
-            self._buffer = bytearray()
-            raise BadDataException
-        self._buffer = bytearray()  # reset buffer
-        return decompressed
+    def _skip_unwanted(self, raw_data: Union[bytes, memoryview]) -> bool:
+        """Read the header of a payload and check if it can be skipped without parsing it.
+
+        Returns
+        -------
+        :class:`bool`
+            If the payload is a event nobody listens to. The sequence number is updated if so.
+        """
+        header = HEADER_PATTERN.match(raw_data)
+        if header is None:
+            return False  # Not the order discord usually sends, parse it to be safe
+        event_name, seq, opcode = header.groups()
+        if int(opcode) != OpcodeEnum.DISPATCH.value or event_name is None:
+            return False
+
+        name = event_name.decode("ascii")
+        gateway = self._state.gateway
+        if (
+            self.event_dispatcher.listeners.get(name)
+            or self.opcode_dispatcher.listeners.get(OpcodeEnum.DISPATCH.value)
+            or gateway.event_dispatcher.has_listeners(name)
+            or gateway.raw_dispatcher.has_listeners(OpcodeEnum.DISPATCH.value)
+        ):
+            return False
+
+        if seq != b"null":
+            self._seq = int(seq)
+        return True
+
+    def _decompress(self, data: bytes) -> Union[bytes, memoryview]:
+        if self._inflater is None:
+            return data
+        # The inflater raises PartialDataException until the whole message is received
+        return self._inflater.decompress(data)
 
     async def close(self, code: int = 1000) -> None:
         if self._ws:
             await self._ws.close(code=code)
-        self._buffer.clear()
+        if self._inflater is not None:
+            self._inflater.reset()
 
     # Handles
-    async def _handle_hello(self, data: dict[str, Any]) -> None:
+    # Handles which do not need to wait are plain functions, so dispatching to them does not create a task
+    def _handle_hello(self, data: dict[str, Any]) -> None:
         heartbeat_interval = data["d"]["heartbeat_interval"] / 1000
 
         intitial_wait_time = heartbeat_interval * random()
-        await sleep(intitial_wait_time)
-        self._state.loop.create_task(self._heartbeat_loop(heartbeat_interval))
+        self._state.loop.create_task(self._heartbeat_loop(heartbeat_interval, intitial_wait_time))
 
-    async def _handle_set_sequence(self, _: int, data: dict[str, Any]) -> None:
+    def _handle_set_sequence(self, _: int, data: dict[str, Any]) -> None:
         if (seq := data["s"]) is not None:
             self._logger.debug("Updated sequence number to %s", seq)
             self._seq = seq
 
-    async def _handle_heartbeat_ack(self, _: dict[str, Any]) -> None:
+    def _handle_heartbeat_ack(self, _: dict[str, Any]) -> None:
         self._has_acknowledged_heartbeat = True
+        if self._metrics is not None and self._heartbeat_sent_at:
+            self._metrics.observe(
+                "gateway.heartbeat_latency", perf_counter() - self._heartbeat_sent_at, self._metric_tags
+            )
+
+    async def _handle_invalid_session(self, data: dict[str, Any]) -> None:
+        if not data["d"]:
+            # Cannot be resumed, identify with a new session
+            self._session_id = None
+            self._seq = None
+            self._resume_url = None
+        # Discord asks to wait a random amount of time between 1 and 5 seconds
+        await sleep(1 + random() * 4)
+        if self._session_id is None:
+            async with self._state.gateway.get_identify_ratelimiter(self.shard_id):
+                try:
+                    await self.identify()
+                except ShardClosedException:
+                    self._logger.debug("Ignoring identify as shard closed")
+                    return
+            self._logger.info("Identified with the gateway after the session was invalidated")
+        else:
+            await self.resume()
 
     async def _handle_disconnect(self, close_code: Optional[int]) -> None:
         if close_code == None:
@@ -215,7 +364,10 @@ class Shard(ShardProtocol):
         if not self._state.gateway.should_reconnect(self):
             # We shouldnt reconnect
             return
-        # TODO: Handle too few shards error if it exists??
+        if close_code == CloseCodeEnum.SHARDING_REQUIRED:
+            # We outgrew the shard count, the gateway brings up a new set of shards.
+            await self._state.gateway.handle_rescale()
+            return
         if close_code == CloseCodeEnum.AUTHENTICATION_FAILED:
             # TODO: Error
             ...
@@ -225,7 +377,6 @@ class Shard(ShardProtocol):
             return
         # Errors which should never happen
         if close_code in [
-            CloseCodeEnum.SHARDING_REQUIRED,
             CloseCodeEnum.INVALID_SHARD,
             CloseCodeEnum.INVALID_API_VERSION,
         ]:
@@ -244,15 +395,22 @@ class Shard(ShardProtocol):
         # Reconnect and hope it works
         await self.connect()
 
-    async def _handle_ready(self, data: dict[str, Any]) -> None:
+    def _handle_ready(self, data: dict[str, Any]) -> None:
         self._session_id = data["session_id"]
+        self._resume_url = data.get("resume_gateway_url")
         self._logger.debug("Session id set!")
+        self._logger.info("Connected to the gateway")
+        self.ready.set()
+
+    def _handle_resumed(self, _: Any) -> None:
+        self._logger.info("Reconnected to the gateway")
+        self.ready.set()
 
-    async def _handle_raw_dispatch(self, opcode: int, data: dict[str, Any]) -> None:
+    def _handle_raw_dispatch(self, opcode: int, data: dict[str, Any]) -> None:
         self._state.gateway.raw_dispatcher.dispatch(opcode, self, data)
 
-    async def _handle_dispatch(self, event_name: str, data: Any) -> None:
-        self._state.gateway.event_dispatcher.dispatch(event_name, self, data)
+    def _handle_dispatch(self, event_name: str, data: Any) -> None:
+        self._state.gateway.handle_dispatch(self, event_name, data)
 
     # Wrappers
     async def identify(self) -> None:
@@ -267,7 +425,7 @@ class Shard(ShardProtocol):
                         "$browser": "nextcord",
                         "$device": "nextcord",
                     },
-                    "shard": (self.shard_id, self._state.gateway.shard_count),
+                    "shard": (self.shard_id, self.shard_count),
                 },
             }
         )
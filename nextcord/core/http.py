@@ -21,30 +21,186 @@
 
 from __future__ import annotations
 
-from asyncio import Future, get_event_loop
-from collections import defaultdict
+import socket
+import sys
+from asyncio import CancelledError, Future, Task, gather, get_event_loop, shield, sleep
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from functools import partial
 from logging import getLogger
-from time import time
+from operator import itemgetter
+from string import Formatter
+from time import perf_counter, time
 from typing import TYPE_CHECKING, Type
 
-from aiohttp import ClientSession
+from aiohttp import (
+    ClientError,
+    ClientSession,
+    ContentTypeError,
+    TCPConnector,
+    TraceConfig,
+)
+from attr import dataclass
 
 from .. import __version__
 from ..exceptions import CloudflareBanException, DiscordException, HTTPException
-from ..utils import json
+from ..utils import json_dumps
 from .protocols.http import BucketProtocol, HTTPClientProtocol, RouteProtocol
+from .ratelimiter import TimesPer, get_timer_wheel
 
 if TYPE_CHECKING:
-    from typing import Any, Literal, Optional
+    from typing import Any, Callable, Literal, Optional
 
     from aiohttp import ClientWebSocketResponse
     from aiohttp.client_reqrep import ClientResponse
 
     from ..client.state import State
+    from .protocols.metrics import MetricsProtocol
 
+try:
+    import aiodns  # type: ignore # noqa: F401
+    from aiohttp import AsyncResolver
+except ImportError:
+    AsyncResolver = None  # type: ignore
 
 logger = getLogger(__name__)
 
+# Which cached GET paths a gateway event makes stale
+INVALIDATING_EVENTS: dict[str, Callable[[dict[str, Any]], tuple[str, ...]]] = {
+    "CHANNEL_UPDATE": lambda data: (f"/channels/{data['id']}",),
+    "CHANNEL_DELETE": lambda data: (f"/channels/{data['id']}",),
+    "GUILD_UPDATE": lambda data: (f"/guilds/{data['id']}",),
+    "GUILD_DELETE": lambda data: (f"/guilds/{data['id']}", f"/guilds/{data['id']}/channels"),
+    "CHANNEL_CREATE": lambda data: (f"/guilds/{data.get('guild_id')}/channels",),
+    "GUILD_ROLE_CREATE": lambda data: (f"/guilds/{data['guild_id']}", f"/guilds/{data['guild_id']}/roles"),
+    "GUILD_ROLE_UPDATE": lambda data: (f"/guilds/{data['guild_id']}", f"/guilds/{data['guild_id']}/roles"),
+    "GUILD_ROLE_DELETE": lambda data: (f"/guilds/{data['guild_id']}", f"/guilds/{data['guild_id']}/roles"),
+    "GUILD_MEMBER_UPDATE": lambda data: (f"/guilds/{data['guild_id']}/members/{data['user']['id']}",),
+    "GUILD_MEMBER_REMOVE": lambda data: (f"/guilds/{data['guild_id']}/members/{data['user']['id']}",),
+    "MESSAGE_UPDATE": lambda data: (f"/channels/{data['channel_id']}/messages/{data['id']}",),
+    "MESSAGE_DELETE": lambda data: (f"/channels/{data['channel_id']}/messages/{data['id']}",),
+}
+
+
+def _keepalive_socket(addr_info: Any) -> socket.socket:
+    """Open sockets with TCP keep-alive, so dead idle connections are noticed before a request is sent on them"""
+    family, type_, proto, _, _ = addr_info
+    sock = socket.socket(family=family, type=type_, proto=proto)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    return sock
+
+
+@dataclass(slots=True)
+class ConnectionPoolStats:
+    """How the connection pool of :class:`HTTPClient` is used"""
+
+    limit: int
+    """How many connections can be open at the same time"""
+    in_flight: int = 0
+    """Requests waiting for a response"""
+    created: int = 0
+    """Connections opened"""
+    reused: int = 0
+    """Requests sent on a already open connection"""
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        """The share of requests which did not have to open a connection"""
+        total = self.created + self.reused
+        return self.reused / total if total else 0.0
+
+
+def _query_key(params: Any) -> Any:
+    """A hashable version of the query parameters of a request"""
+    if params is None or isinstance(params, str):
+        return params
+    if isinstance(params, dict):
+        params = params.items()
+    return tuple(sorted((str(key), str(value)) for key, value in params))
+
+
+class RouteTemplate:
+    """A unformatted route, compiled once and shared by every :class:`Route` using it.
+
+    Use :meth:`get` instead of creating these, templates are registered by method and path.
+    Only paths with ``{}`` placeholders are registered, so already formatted paths do not pile up.
+
+    Parameters
+    ----------
+    method: :class:`str`
+        The HTTP method
+    path: :class:`str`
+        The unformatted path
+    """
+
+    __slots__ = ("method", "path", "key", "parameters", "_printf_path", "_get_parameters")
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method: str = method
+        self.path: str = path
+        self.key: str = sys.intern(f"{method}:{path}")
+        """The key discord assigns a bucket hash to"""
+
+        # printf style formatting with a itemgetter is about twice as fast as str.format with keyword arguments
+        printf_path = ""
+        parameters = []
+        for literal, name, _, _ in Formatter().parse(path):
+            printf_path += literal.replace("%", "%%")
+            if name is not None:
+                printf_path += "%s"
+                parameters.append(name)
+        self.parameters: tuple[str, ...] = tuple(parameters)
+        """The parameters the path is formatted with"""
+        self._printf_path: str = printf_path
+        self._get_parameters: Optional[itemgetter[Any]] = itemgetter(*parameters) if len(parameters) > 1 else None
+
+    @classmethod
+    def get(cls, method: str, path: str) -> RouteTemplate:
+        """Get the template of a route, compiling it the first time. Paths without placeholders are compiled every time
+
+        Parameters
+        ----------
+        method: :class:`str`
+            The HTTP method
+        path: :class:`str`
+            The unformatted path
+        """
+        if "{" not in path:
+            # Most likely formatted by the caller, registering it would keep a template per id forever
+            return cls(method, path)
+        methods = _route_templates.get(path)
+        if methods is None:
+            methods = _route_templates[path] = {}
+        template = methods.get(method)
+        if template is None:
+            template = methods[method] = cls(method, path)
+        return template
+
+    def format(self, parameters: dict[str, Any]) -> str:
+        """Format the path
+
+        Parameters
+        ----------
+        parameters: :class:`dict[str, Any]`
+            The parameters to format the path with
+        """
+        if self._get_parameters is not None:
+            path: str = self._printf_path % self._get_parameters(parameters)
+            return path
+        if self.parameters:
+            return self._printf_path % (parameters[self.parameters[0]],)
+        return self.path
+
+
+# Path -> method -> template. Keyed by path first so lookups do not need to build a key. Bounded by the paths in code
+_route_templates: dict[str, dict[str, RouteTemplate]] = {}
+
 
 class Route(RouteProtocol):
     """Metadata about a Discord API route
@@ -61,6 +217,8 @@ class Route(RouteProtocol):
         Parameters to format path with. You can include guild_id, channel_id, webhook_id or webhook_token to specify ratelimit parameters.
     """
 
+    __slots__ = ("template", "method", "path", "key", "use_webhook_global", "major_parameters", "bucket")
+
     def __init__(
         self,
         method: Literal[
@@ -79,32 +237,58 @@ class Route(RouteProtocol):
         use_webhook_global: bool = False,
         **parameters: Any,
     ):
+        methods = _route_templates.get(path)
+        template = None if methods is None else methods.get(method)
+        if template is None:
+            template = RouteTemplate.get(method, path)
+        self.template: RouteTemplate = template
+        """The compiled unformatted route"""
         self.method = method
         """The HTTP method for this route"""
-        self.unformatted_path = path
-        """The unformatted path"""
-        self.path = path.format(**parameters)
+        self.path = template.format(parameters)
         """The route to be requested from discord"""
+        self.key = template.key
+        """The key discord assigns a bucket hash to. This is the method and the unformatted path"""
 
         self.use_webhook_global = use_webhook_global
         """If this route uses the webhook global LINK MISSING"""
 
-        self.guild_id: Optional[int] = parameters.get("guild_id")
-        self.channel_id: Optional[int] = parameters.get("channel_id")
-        self.webhook_id: Optional[int] = parameters.get("webhook_id")
-        self.webhook_token: Optional[str] = parameters.get("webhook_token")
+        get = parameters.get
+        self.major_parameters = (get("guild_id"), get("channel_id"), get("webhook_id"), get("webhook_token"))
+        """The major parameters of this route. Routes sharing a bucket hash are only grouped if these match"""
+        self.bucket = (self.key, self.major_parameters)
+        """The ratelimit bucket this is under until discord tells us the real bucket hash"""
+
+    @property
+    def unformatted_path(self) -> str:
+        """The unformatted path"""
+        return self.template.path
+
+    @property
+    def guild_id(self) -> Optional[int]:
+        return self.major_parameters[0]
+
+    @property
+    def channel_id(self) -> Optional[int]:
+        return self.major_parameters[1]
+
+    @property
+    def webhook_id(self) -> Optional[int]:
+        return self.major_parameters[2]
 
     @property
-    def bucket(self) -> str:  # type: ignore
-        """The ratelimit bucket this is under"""
-        return f"{self.method}:{self.unformatted_path}:{self.guild_id}:{self.channel_id}:{self.webhook_id}:{self.webhook_token}"
+    def webhook_token(self) -> Optional[str]:
+        return self.major_parameters[3]
 
 
 class Bucket(BucketProtocol):
     """A simple and fast ratelimiting implementation for HTTP
 
+    Requests are let through in the order they arrived. Until the first response tells us the limits, only one request
+    is let through at a time.
+
     .. warning::
-        This is not multiprocess safe.
+        This is not multiprocess safe. See :class:`SharedBucket <nextcord.core.ratelimit_store.SharedBucket>` for that.
     .. note::
         This is a async context manager.
     """
@@ -114,41 +298,58 @@ class Bucket(BucketProtocol):
         self.limit: Optional[int] = None
         """How many requests fit in a bucket"""
         self.reset_at: Optional[float] = None
-        """When the Bucket fills up again. (UTC time)"""
+        """When the Bucket fills up again, by the local clock (:func:`time.time`)"""
+        self.bucket_hash: Optional[str] = None
+        """The X-RateLimit-Bucket hash of this bucket, once discord sent it"""
         self._route: Route = route
-        self._pending: list[Future[None]] = []
+        self._pending: deque[Future[None]] = deque()
         self._reserved: int = 0
+        self._pending_reset: bool = False
         self._loop = get_event_loop()
 
-    @property  # type: ignore
-    def remaining(self) -> Optional[int]:  # type: ignore
+    @property
+    def pending(self) -> int:
+        """How many requests are waiting for room"""
+        return len(self._pending)
+
+    @property
+    def remaining(self) -> Optional[int]:
         """How many requests are remaining."""
         return self._remaining
 
     @remaining.setter
-    def remaining(self, new_value: int) -> None:
+    def remaining(self, new_value: Optional[int]) -> None:
         self._remaining = new_value
         if new_value == 0:
-            self._pending_reset = True
-            sleep_time = self.reset_at - time()
-            self._loop.call_later(sleep_time, self._reset)
+            if not self._pending_reset and self.reset_at is not None:
+                self._pending_reset = True
+                sleep_time = self.reset_at - time()
+                get_timer_wheel(self._loop).schedule(sleep_time, self._reset)
+        else:
+            self._release()
 
     def _reset(self) -> None:
         """Reset the bucket usage to the top and then start attempting to release the pending requests"""
+        self._pending_reset = False
         self._remaining = self.limit
-
-        for _ in range(self._calculated_remaining):
-            try:
-                future = self._pending.pop(0)
-            except IndexError:
-                break  # No more pendings, ignore
+        self._release()
+
+    def _release(self) -> None:
+        """Release as many pending requests as there is room for in the bucket"""
+        while self._pending and self._calculated_remaining > 0:
+            future = self._pending.popleft()
+            if future.done():
+                continue  # Cancelled while waiting
+            # Reserve for the request here so nothing can take its spot before it gets to run.
+            self._reserved += 1
             future.set_result(None)
 
     @property
     def _calculated_remaining(self) -> int:
         # TODO: Replace this with the getter of remaining
         if self.remaining is None:
-            return 1  # We have no data, let's just assume we have one request so we can fetch the info.
+            # We have no data, let's just assume we have one request so we can fetch the info.
+            return 1 - self._reserved
         return self.remaining - self._reserved
 
     async def __aenter__(self) -> "Bucket":
@@ -156,15 +357,21 @@ class Bucket(BucketProtocol):
         If all are taken, it will add it to a queue.
         """
         # TODO: This should return same type as itself. Not sure what's wrong when I try
-        if self.remaining is None:
-            self._reserved += 1
-            return self  # We have no ratelimiting info, let's just try
-        if self._calculated_remaining <= 0:
+        if self._pending or self._calculated_remaining <= 0:
             # Ratelimit pending, let's wait
-            future: Future[None] = Future()
+            future: Future[None] = self._loop.create_future()
             self._pending.append(future)
             logger.debug("Waiting for %s to clear up. %s pending", str(self), len(self._pending))
-            await future
+            try:
+                await future
+            except CancelledError:
+                if future.done() and not future.cancelled():
+                    # We were given a spot but got cancelled before using it, give it to the next one.
+                    self._reserved -= 1
+                self._release()
+                raise
+            # The spot was reserved for us when we got released
+            return self
         self._reserved += 1
         return self
 
@@ -173,8 +380,7 @@ class Bucket(BucketProtocol):
         Request finished
         """
         self._reserved -= 1
-        if self.remaining is not None:
-            self.remaining -= 1
+        self._release()
 
 
 class HTTPClient(HTTPClientProtocol):
@@ -186,7 +392,22 @@ class HTTPClient(HTTPClientProtocol):
         The current state of the bot
     max_retries: :class:`int`
         How many times we will attempt to retry after a unexpected failure (server error or ratelimit issue)
-
+    cache_ttls: :class:`Optional[dict[str, float]]`
+        How many seconds to cache GET responses for by route key (method and unformatted path),
+        for example ``{"GET:/channels/{channel_id}": 30}``. Defaults to :attr:`State.http_cache_ttls`.
+        Cached responses are dropped early when a gateway event changes them, see :meth:`invalidate`.
+    max_cached_responses: :class:`int`
+        How many responses to cache at most. The oldest are dropped first.
+    connection_limit: :class:`Optional[int]`
+        How many connections to discord can be open at the same time. Defaults to :attr:`State.http_connection_limit`.
+        The global ratelimit allows 50 requests per second, so more connections are rarely useful.
+    prewarm_connections: :class:`Optional[int]`
+        How many connections :meth:`prewarm` opens. Defaults to :attr:`State.http_prewarm_connections`.
+    keepalive_timeout: :class:`float`
+        How many seconds a idle connection is kept open for reuse
+    dns_cache_ttl: :class:`Optional[int]`
+        How many seconds DNS lookups are cached for. None caches forever.
+        `aiodns <https://pypi.org/project/aiodns/>`_ is used to resolve if installed.
     """
 
     def __init__(
@@ -194,6 +415,12 @@ class HTTPClient(HTTPClientProtocol):
         state: State,
         *,
         max_retries: int = 5,
+        cache_ttls: Optional[dict[str, float]] = None,
+        max_cached_responses: int = 1000,
+        connection_limit: Optional[int] = None,
+        prewarm_connections: Optional[int] = None,
+        keepalive_timeout: float = 60,
+        dns_cache_ttl: Optional[int] = 300,
     ):
         self.version = 9
         self.api_base = f"https://discord.com/api/v{self.version}"
@@ -201,21 +428,110 @@ class HTTPClient(HTTPClientProtocol):
         self.state = state
 
         self.max_retries = max_retries
-        self._global_lock = self.state.type_sheet.http_bucket(Route("POST", "/global"))
-        self._webhook_global_lock = self.state.type_sheet.http_bucket(Route("POST", "/global/webhook"))
-        self._session = ClientSession(json_serialize=json.dumps)
-        self._buckets: dict[str, BucketProtocol] = {}
+        # The global ratelimits only hand out tokens, they are not held while a request is in flight.
+        self._global_ratelimiter = TimesPer(50, 1)
+        self._webhook_global_ratelimiter = TimesPer(50, 1)
+        # Loop time until which a global 429 told us to stop sending
+        self._global_paused_until: float = 0
+        self._webhook_global_paused_until: float = 0
+        self.ratelimited: int = 0
+        """How many 429 responses we got"""
+        self.clock_offset: float = 0
+        """How many seconds the clock of discord is ahead of ours, estimated from the Date header"""
+        self._clock_samples: int = 0
+        self._metrics: Optional[MetricsProtocol] = state.metrics if state.metrics.enabled else None
+        self._last_date: Optional[str] = None
+        self.prewarm_connections: int = (
+            state.http_prewarm_connections if prewarm_connections is None else prewarm_connections
+        )
+        self.pool_stats: ConnectionPoolStats = ConnectionPoolStats(
+            state.http_connection_limit if connection_limit is None else connection_limit
+        )
+        self._session = ClientSession(
+            connector=self._create_connector(keepalive_timeout, dns_cache_ttl),
+            json_serialize=json_dumps,
+            trace_configs=[self._create_trace_config()],
+        )
+        self._buckets: dict[tuple[str, tuple[Any, ...]], BucketProtocol] = {}
+        # Discord groups multiple routes into one bucket. We learn which through the X-RateLimit-Bucket header.
+        self._bucket_hashes: dict[str, str] = {}
         self._http_errors: defaultdict[int, Type[HTTPException]] = defaultdict((lambda: HTTPException), {})
 
+        # Identical GETs share one request while it is in flight, keyed by path and query
+        self._in_flight: dict[tuple[str, Any], Task[ClientResponse]] = {}
+        self.cache_ttls: dict[str, float] = state.http_cache_ttls if cache_ttls is None else cache_ttls
+        self.max_cached_responses: int = max_cached_responses
+        # path -> query -> (expires at, response). Grouped by path so invalidating drops every query of it
+        self._response_cache: dict[str, dict[Any, tuple[float, ClientResponse]]] = {}
+        self._cached_responses: int = 0
+        self._listening_for_invalidations: bool = False
+
         self._headers = {"User-Agent": "DiscordBot (https://github.com/nextcord/nextcord, {})".format(__version__)}
         if self.state.token:
             self._headers["Authorization"] = f"Bot {self.state.token}"
 
+    def _create_connector(self, keepalive_timeout: float, dns_cache_ttl: Optional[int]) -> TCPConnector:
+        # Every request goes to the same host, so the per host limit is the limit
+        options: dict[str, Any] = {
+            "limit": self.pool_stats.limit,
+            "limit_per_host": self.pool_stats.limit,
+            "keepalive_timeout": keepalive_timeout,
+            "use_dns_cache": True,
+            "ttl_dns_cache": dns_cache_ttl,
+        }
+        if AsyncResolver is not None:
+            options["resolver"] = AsyncResolver()
+        try:
+            return TCPConnector(socket_factory=_keepalive_socket, **options)
+        except TypeError:
+            # socket_factory was added in aiohttp 3.11
+            return TCPConnector(**options)
+
+    def _create_trace_config(self) -> TraceConfig:
+        stats = self.pool_stats
+
+        async def on_connection_create_end(*_: Any) -> None:
+            stats.created += 1
+
+        async def on_connection_reuseconn(*_: Any) -> None:
+            stats.reused += 1
+
+        async def on_dns_cache_hit(*_: Any) -> None:
+            stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(*_: Any) -> None:
+            stats.dns_cache_misses += 1
+
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    async def prewarm(self) -> None:
+        """Open connections to discord before they are needed, so the first requests skip DNS, TCP and TLS setup.
+
+        The connections are kept open for ``keepalive_timeout`` seconds. This never raises, connecting goes on cold.
+        """
+
+        async def open_connection() -> None:
+            await self._global_ratelimiter.acquire()
+            try:
+                # Unauthenticated and small, the connection is put back into the pool after it
+                async with self._session.head(self.api_base + "/gateway") as r:
+                    await r.read()
+            except Exception as e:  # Timeouts are not ClientErrors, none of these should stop the client connecting
+                logger.debug("Could not prewarm a connection: %r", e)
+
+        await gather(*(open_connection() for _ in range(min(self.prewarm_connections, self.pool_stats.limit))))
+
     async def request(
         self,
         route: RouteProtocol,
         *,
         headers: Optional[dict[str, str]] = None,
+        stream: bool = False,
         **kwargs: Any,
     ) -> ClientResponse:
         """Send a request to discord.
@@ -229,56 +545,276 @@ class HTTPClient(HTTPClientProtocol):
             Metadata about the route you are executing
         headers: :class:`Optional[dict[str, str]]`
             Request headers. This will add a bot token if availible
+        stream: :class:`bool`
+            Leave the body unread so it can be read incrementally from ``response.content``.
+            The request is not coalesced or cached. Release the response when done with it.
         kwargs:
             Keyword only arguments passed to `ClientSession.request <https://docs.aiohttp.org/en/stable/client_reference.html#aiohttp.ClientSession.trace_config>`_
+
+        .. note::
+            GET requests without a body or custom headers are shared with identical requests in flight and may be
+            served from the response cache. Their body is already read.
         """
-        global_lock = self._webhook_global_lock if route.use_webhook_global else self._global_lock
+        if self._metrics is None:
+            return await self._route_request(route, headers, stream, kwargs)
+        with self._metrics.span("http.request", {"route": route.key}):
+            return await self._route_request(route, headers, stream, kwargs)
+
+    async def _route_request(
+        self, route: RouteProtocol, headers: Optional[dict[str, str]], stream: bool, kwargs: dict[str, Any]
+    ) -> ClientResponse:
+        if not stream and route.method == "GET" and headers is None and "json" not in kwargs and "data" not in kwargs:
+            return await self._coalesced_get(route, kwargs)
+        return await self._request(route, headers=headers, **kwargs)
+
+    async def _coalesced_get(self, route: RouteProtocol, kwargs: dict[str, Any]) -> ClientResponse:
+        query = _query_key(kwargs.get("params"))
+        cached = self._get_cached_response(route.path, query)
+        if cached is not None:
+            return cached
+
+        key = (route.path, query)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = get_event_loop().create_task(self._fetch(route, query, kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logger.debug("Joining in flight request GET %s", route.path)
+        # Shielded so one caller cancelling does not fail the request for the others
+        return await shield(task)
+
+    async def _fetch(self, route: RouteProtocol, query: Any, kwargs: dict[str, Any]) -> ClientResponse:
+        response = await self._request(route, **kwargs)
+        # Every caller gets the same response, read it once so they do not race on the connection
+        await response.read()
+
+        ttl = self.cache_ttls.get(route.key)
+        if ttl is not None:
+            self._cache_response(route.path, query, response, ttl)
+        return response
+
+    def _get_cached_response(self, path: str, query: Any) -> Optional[ClientResponse]:
+        cached = self._response_cache.get(path)
+        if cached is None or (entry := cached.get(query)) is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= get_event_loop().time():
+            del cached[query]
+            self._cached_responses -= 1
+            if not cached:
+                del self._response_cache[path]
+            return None
+        return response
+
+    def _cache_response(self, path: str, query: Any, response: ClientResponse, ttl: float) -> None:
+        if not self._listening_for_invalidations:
+            # The gateway does not exist yet when we are created
+            self._listening_for_invalidations = True
+            for event_name in INVALIDATING_EVENTS:
+                self.state.gateway.event_dispatcher.add_listener(
+                    partial(self._handle_invalidating_event, event_name), event_name
+                )
+
+        cached = self._response_cache.setdefault(path, {})
+        if query not in cached:
+            self._cached_responses += 1
+        cached[query] = (get_event_loop().time() + ttl, response)
+
+        while self._cached_responses > self.max_cached_responses:
+            oldest_path = next(iter(self._response_cache))
+            self.invalidate(oldest_path)
+
+    def invalidate(self, path: str) -> None:
+        """Drop the cached responses of a path, with any query
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The formatted path, for example ``/channels/1234``
+        """
+        cached = self._response_cache.pop(path, None)
+        if cached is not None:
+            logger.debug("Invalidated %s cached responses of %s", len(cached), path)
+            self._cached_responses -= len(cached)
+
+    def _handle_invalidating_event(self, event_name: str, _: Any, data: dict[str, Any]) -> None:
+        for path in INVALIDATING_EVENTS[event_name](data):
+            self.invalidate(path)
+
+    async def _request(
+        self,
+        route: RouteProtocol,
+        *,
+        headers: Optional[dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> ClientResponse:
+        global_ratelimiter = self._webhook_global_ratelimiter if route.use_webhook_global else self._global_ratelimiter
 
         if headers is None:
             headers = {}
         headers |= self._headers
 
-        for _ in range(self.max_retries):
-            async with global_lock:
-                bucket_str = route.bucket
-                bucket = self._buckets.get(bucket_str)
-
-                if bucket is None:
-                    bucket = self.state.type_sheet.http_bucket(route)
-                    self._buckets[bucket_str] = bucket
+        metrics = self._metrics
+        metric_tags = None if metrics is None else {"bucket": route.key}
+        waiting_since = 0.0
 
-                async with bucket:
+        for _ in range(self.max_retries):
+            bucket = self._get_bucket(route)
+            if metrics is not None:
+                metrics.gauge("http.bucket.queue", bucket.pending, metric_tags)
+                waiting_since = perf_counter()
+
+            async with bucket:
+                if metrics is not None:
+                    metrics.observe("http.bucket.wait", perf_counter() - waiting_since, metric_tags)
+                    metrics.gauge("http.global.queue", global_ratelimiter.pending)
+                await self._wait_for_global(route.use_webhook_global)
+                await global_ratelimiter.acquire()
+                self.pool_stats.in_flight += 1
+                try:
                     r = await self._session.request(
                         route.method,
                         self.api_base + route.path,
                         headers=headers,
                         **kwargs,
                     )
+                finally:
+                    self.pool_stats.in_flight -= 1
                 logger.debug("%s %s", route.method, route.path)
+                response_headers = r.headers
+                self._update_clock_offset(response_headers.get("Date"))
 
+                # Update the bucket before leaving it so the next requests in the queue see the new limits
                 try:
-                    bucket.reset_at = float(r.headers["X-RateLimit-Reset"])
-                    bucket.limit = int(r.headers["X-RateLimit-Limit"])
-                    bucket.remaining = int(r.headers["X-RateLimit-Remaining"])
+                    bucket.reset_at = self._get_reset_at(response_headers)
+                    bucket.limit = int(response_headers["X-RateLimit-Limit"])
+                    bucket.remaining = int(response_headers["X-RateLimit-Remaining"])
                 except KeyError:
                     # Ratelimiting info is not sent on some routes and on error
-                    pass
-
-                if (status := r.status) >= 300:
-                    if status == 429:
-                        if "via" not in r.headers.keys():
-                            raise
-                        logger.debug("Ratelimit exceeded")
-                        continue
-                    error = await r.json()
-                    raise self._http_errors[status](r.status, error["code"], error["message"])
-
-                return r
+                    if bucket.remaining is not None:
+                        bucket.remaining = max(bucket.remaining - 1, 0)
+
+                if (bucket_hash := response_headers.get("X-RateLimit-Bucket")) is not None:
+                    self._set_bucket_hash(route, bucket, bucket_hash)
+
+                if r.status == 429:
+                    if "via" not in response_headers:
+                        # Cloudflare answers without a via header when it has banned us for too many invalid requests
+                        raise CloudflareBanException()
+                    self.ratelimited += 1
+                    try:
+                        error = await r.json()
+                    except (ContentTypeError, ValueError):
+                        error = {}
+                    retry_after = float(error.get("retry_after", response_headers.get("Retry-After", 1)))
+                    is_global = error.get("global") or response_headers.get("X-RateLimit-Global") == "true"
+                    if metrics is not None:
+                        scope = "global" if is_global else response_headers.get("X-RateLimit-Scope", "user")
+                        metrics.increment("http.ratelimited", 1, {"bucket": route.key, "scope": scope})
+                    if is_global:
+                        logger.warning("Hit the global ratelimit, retrying in %ss", retry_after)
+                        self._pause_global(route.use_webhook_global, retry_after)
+                    else:
+                        logger.warning("Hit the ratelimit of %s, retrying in %ss", route.key, retry_after)
+                        # Block the requests queued behind us too, the retry waits for the reset in the bucket
+                        bucket.reset_at = time() + retry_after
+                        bucket.remaining = 0
+                    continue
+
+            if (status := r.status) >= 300:
+                error = await r.json()
+                raise self._http_errors[status](r.status, error["code"], error["message"])
+
+            return r
 
         raise DiscordException(
             f"Ratelimiting failed {self.max_retries} times. This should only happen if you are running multiple bots with the same IP."
         )
 
+    def _get_reset_at(self, headers: Any) -> float:
+        """When the bucket resets by the local clock.
+
+        Reset-After is relative so it does not depend on the clocks agreeing. Reset is the server time.
+        """
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if reset_after is not None:
+            return time() + float(reset_after)
+        return float(headers["X-RateLimit-Reset"]) - self.clock_offset
+
+    def _update_clock_offset(self, date: Optional[str]) -> None:
+        # The Date header only has second precision, so only a new second tells us something new
+        if date is None or date == self._last_date:
+            return
+        self._last_date = date
+        try:
+            server_time = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return
+        # The first response of a second is on average sent half a second into it
+        sample = server_time + 0.5 - time()
+        if self._clock_samples == 0:
+            self.clock_offset = sample
+        else:
+            self.clock_offset += (sample - self.clock_offset) / min(self._clock_samples + 1, 16)
+        self._clock_samples += 1
+
+    async def _wait_for_global(self, webhook: bool) -> None:
+        paused_until = self._webhook_global_paused_until if webhook else self._global_paused_until
+        if paused_until:
+            delay = paused_until - get_event_loop().time()
+            if delay > 0:
+                await sleep(delay)
+
+    def _pause_global(self, webhook: bool, seconds: float) -> None:
+        paused_until = get_event_loop().time() + seconds
+        if webhook:
+            self._webhook_global_paused_until = max(self._webhook_global_paused_until, paused_until)
+        else:
+            self._global_paused_until = max(self._global_paused_until, paused_until)
+
+    def _get_bucket(self, route: RouteProtocol) -> BucketProtocol:
+        """Get the bucket a route is under, creating it if it doesn't exist yet
+
+        Parameters
+        ----------
+        route: :class:`RouteProtocol`
+            The route to get the bucket for
+        """
+        bucket_hash = self._bucket_hashes.get(route.key)
+        if bucket_hash is None:
+            bucket_key = route.bucket
+        else:
+            bucket_key = (bucket_hash, route.major_parameters)
+
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.state.type_sheet.http_bucket(route)
+            bucket.bucket_hash = bucket_hash
+            self._buckets[bucket_key] = bucket
+        return bucket
+
+    def _set_bucket_hash(self, route: RouteProtocol, bucket: BucketProtocol, bucket_hash: str) -> None:
+        """Move a bucket over to the bucket hash discord told us it is under
+
+        Parameters
+        ----------
+        route: :class:`RouteProtocol`
+            The route the response was for
+        bucket: :class:`BucketProtocol`
+            The bucket the request was made with
+        bucket_hash: :class:`str`
+            The X-RateLimit-Bucket header
+        """
+        if self._bucket_hashes.get(route.key) == bucket_hash:
+            return
+        logger.debug("Route %s is under bucket %s", route.key, bucket_hash)
+        self._bucket_hashes[route.key] = bucket_hash
+
+        # If another route already discovered this bucket we use theirs, the temporary one is dropped.
+        self._buckets.setdefault((bucket_hash, route.major_parameters), bucket).bucket_hash = bucket_hash
+        self._buckets.pop(route.bucket, None)
+
     async def ws_connect(self, url: str) -> ClientWebSocketResponse:
         return await self._session.ws_connect(url, max_msg_size=0, autoclose=False, headers=self._headers)
 
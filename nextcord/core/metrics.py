@@ -0,0 +1,314 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""Metrics and tracing sinks. Pass one as ``metrics`` to :class:`Client <nextcord.client.client.Client>`.
+
+What is measured:
+
+============================== ========= ==============================================================
+Name                           Kind      Tags
+============================== ========= ==============================================================
+``http.request``               span      ``route``
+``http.bucket.wait``           observe   ``bucket``. Time spent waiting for room in the bucket
+``http.bucket.queue``          gauge     ``bucket``. Requests waiting for room in the bucket
+``http.global.queue``          gauge     Requests waiting for the global ratelimit
+``http.ratelimited``           increment ``bucket``, ``scope``. 429 responses
+``gateway.decompress``         observe   ``shard``
+``gateway.parse``              observe   ``shard``
+``gateway.heartbeat_latency``  observe   ``shard``. Time from sending a heartbeat to its ACK
+``gateway.send.queue``         gauge     ``shard``. Payloads waiting for the send ratelimit
+``dispatcher.listener``        observe   ``dispatcher``, ``event``, ``listener``
+``dispatcher.queue``           gauge     ``dispatcher``. Listener calls waiting in inline mode
+``dispatcher.dropped``         increment ``dispatcher``, ``event``
+============================== ========= ==============================================================
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from itertools import count
+from time import perf_counter, time_ns
+from typing import TYPE_CHECKING
+
+from .protocols.metrics import MetricsProtocol
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Iterable, Optional
+
+__all__ = ("NoMetrics", "CallbackMetrics", "PrometheusMetrics", "Span", "SpanMetrics")
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_: Any) -> None:
+        return None
+
+
+_null_span = _NullSpan()
+
+
+class NoMetrics(MetricsProtocol):
+    """Discards everything. The default"""
+
+    enabled = False
+
+    def increment(self, name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+        return None
+
+    def gauge(self, name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+        return None
+
+    def observe(self, name: str, seconds: float, tags: Optional[dict[str, str]] = None) -> None:
+        return None
+
+    def span(self, name: str, tags: Optional[dict[str, str]] = None) -> _NullSpan:
+        return _null_span
+
+
+class _TimedSpan:
+    __slots__ = ("metrics", "name", "tags", "start")
+
+    def __init__(self, metrics: MetricsProtocol, name: str, tags: Optional[dict[str, str]]) -> None:
+        self.metrics: MetricsProtocol = metrics
+        self.name: str = name
+        self.tags: Optional[dict[str, str]] = tags
+        self.start: float = 0
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *_: Any) -> None:
+        self.metrics.observe(self.name, perf_counter() - self.start, self.tags)
+
+
+class CallbackMetrics(MetricsProtocol):
+    """Calls a function with every measurement. Spans are reported as observations of their duration
+
+    Parameters
+    ----------
+    callback: :class:`Callable[[str, str, float, Optional[dict[str, str]]], Any]`
+        Gets the kind (``increment``, ``gauge`` or ``observe``), the name, the value and the tags
+    """
+
+    enabled = True
+
+    def __init__(self, callback: Callable[[str, str, float, Optional[dict[str, str]]], Any]) -> None:
+        self.callback: Callable[[str, str, float, Optional[dict[str, str]]], Any] = callback
+
+    def increment(self, name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+        self.callback("increment", name, value, tags)
+
+    def gauge(self, name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+        self.callback("gauge", name, value, tags)
+
+    def observe(self, name: str, seconds: float, tags: Optional[dict[str, str]] = None) -> None:
+        self.callback("observe", name, seconds, tags)
+
+    def span(self, name: str, tags: Optional[dict[str, str]] = None) -> _TimedSpan:
+        return _TimedSpan(self, name, tags)
+
+
+def _tags_key(tags: Optional[dict[str, str]]) -> tuple[tuple[str, str], ...]:
+    return () if not tags else tuple(sorted(tags.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+class PrometheusMetrics(MetricsProtocol):
+    """Aggregates measurements in memory and renders them in the Prometheus text format.
+
+    Serve the output of :meth:`render` from a ``/metrics`` endpoint. Observations and spans become histograms.
+
+    Parameters
+    ----------
+    prefix: :class:`str`
+        Put in front of every metric name
+    buckets: :class:`Iterable[float]`
+        The upper bounds of the histogram buckets in seconds
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        prefix: str = "nextcord_",
+        buckets: Iterable[float] = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+    ) -> None:
+        self.prefix: str = prefix
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self._counters: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+        self._gauges: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+        # Name -> labels -> (count per bucket, sum, count)
+        self._histograms: dict[str, dict[tuple[tuple[str, str], ...], list[Any]]] = {}
+
+    def increment(self, name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _tags_key(tags)
+        series[key] = series.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+        self._gauges.setdefault(name, {})[_tags_key(tags)] = value
+
+    def observe(self, name: str, seconds: float, tags: Optional[dict[str, str]] = None) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _tags_key(tags)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def span(self, name: str, tags: Optional[dict[str, str]] = None) -> _TimedSpan:
+        return _TimedSpan(self, name, tags)
+
+    def _metric_name(self, name: str) -> str:
+        return self.prefix + name.replace(".", "_")
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for name, counter_series in self._counters.items():
+            metric = self._metric_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_format_labels(labels)} {value}" for labels, value in counter_series.items())
+        for name, gauge_series in self._gauges.items():
+            metric = self._metric_name(name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f"{metric}{_format_labels(labels)} {value}" for labels, value in gauge_series.items())
+        for name, histogram_series in self._histograms.items():
+            metric = self._metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, (bucket_counts, total, observations) in histogram_series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {observations}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {observations}")
+        return "\n".join(lines) + "\n"
+
+
+_span_ids = count(1)
+_current_span: ContextVar[Optional[Span]] = ContextVar("nextcord_current_span", default=None)
+
+
+class Span:
+    """A timed block of work, shaped like a OpenTelemetry span.
+
+    Measurements taken while it is the current span are added to :attr:`events`.
+    """
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "trace_id",
+        "attributes",
+        "events",
+        "start_ns",
+        "end_ns",
+        "_exporter",
+        "_token",
+    )
+
+    def __init__(self, name: str, attributes: Optional[dict[str, str]], exporter: Callable[[Span], Any]) -> None:
+        self.name: str = name
+        self.span_id: int = next(_span_ids)
+        parent = _current_span.get()
+        self.parent_id: Optional[int] = None if parent is None else parent.span_id
+        """The span this was started in"""
+        self.trace_id: int = self.span_id if parent is None else parent.trace_id
+        """The id of the outermost span"""
+        self.attributes: dict[str, str] = dict(attributes) if attributes else {}
+        self.events: list[tuple[str, str, float, Optional[dict[str, str]]]] = []
+        """Measurements as (kind, name, value, tags)"""
+        self.start_ns: int = 0
+        self.end_ns: int = 0
+        self._exporter: Callable[[Span], Any] = exporter
+        self._token: Any = None
+
+    @property
+    def duration(self) -> float:
+        """How long the span took in seconds"""
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def __enter__(self) -> Span:
+        self.start_ns = time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exception_type: Any, exception: Any, _: Any) -> None:
+        self.end_ns = time_ns()
+        _current_span.reset(self._token)
+        if exception is not None:
+            self.attributes["error"] = repr(exception)
+        self._exporter(self)
+
+
+class SpanMetrics(MetricsProtocol):
+    """Records spans and hands finished ones to a exporter, for example one which converts them to OpenTelemetry.
+
+    Measurements are attached to the current span as events. Ones taken outside of a span are dropped.
+    Spans follow the asyncio task they were started in, so tasks created inside a span are its children.
+
+    Parameters
+    ----------
+    exporter: :class:`Callable[[Span], Any]`
+        Called with every finished span
+    """
+
+    enabled = True
+
+    def __init__(self, exporter: Callable[[Span], Any]) -> None:
+        self.exporter: Callable[[Span], Any] = exporter
+
+    def _record(self, kind: str, name: str, value: float, tags: Optional[dict[str, str]]) -> None:
+        span = _current_span.get()
+        if span is not None:
+            span.events.append((kind, name, value, tags))
+
+    def increment(self, name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+        self._record("increment", name, value, tags)
+
+    def gauge(self, name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+        self._record("gauge", name, value, tags)
+
+    def observe(self, name: str, seconds: float, tags: Optional[dict[str, str]] = None) -> None:
+        self._record("observe", name, seconds, tags)
+
+    def span(self, name: str, tags: Optional[dict[str, str]] = None) -> Span:
+        return Span(name, tags, self.exporter)
@@ -0,0 +1,342 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""Iterate over paginated list endpoints.
+
+The next page is requested as soon as the current one is parsed, while the caller is still going through it.
+Pages are parsed entry by entry from the response stream, so at most about one page is held in memory.
+"""
+
+from __future__ import annotations
+
+from asyncio import CancelledError, Queue, get_event_loop
+from codecs import getincrementaldecoder
+from json import JSONDecodeError, JSONDecoder
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+from ..utils import json_loads
+from .http import Route
+
+if TYPE_CHECKING:
+    from typing import Any, AsyncIterator, Callable, Literal, Optional
+
+    from aiohttp import StreamReader
+    from aiohttp.client_reqrep import ClientResponse
+
+    from .protocols.http import HTTPClientProtocol, RouteProtocol
+
+__all__ = ("Paginator", "iter_json_array", "iter_messages", "iter_members", "iter_bans", "iter_audit_log")
+
+logger = getLogger(__name__)
+
+_decoder = JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# Marks the end of the pages in the queue
+_END = object()
+
+
+async def iter_json_array(content: StreamReader, chunk_size: int = 65536) -> AsyncIterator[Any]:
+    """Parse a JSON array from a stream, yielding each entry as soon as it has arrived.
+
+    Parameters
+    ----------
+    content: :class:`aiohttp.StreamReader`
+        The stream to read, for example :attr:`ClientResponse.content <aiohttp.ClientResponse.content>`
+    chunk_size: :class:`int`
+        How many bytes to read at a time
+    """
+    text_decoder = getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    eof = False
+
+    async def fill() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = await content.read(chunk_size)
+        if not chunk:
+            eof = True
+        # Drop what was already parsed so the buffer stays around one entry long
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+        position = 0
+        return True
+
+    async def next_character() -> Optional[str]:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not await fill():
+                return None
+
+    if await next_character() != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+    first = True
+    while True:
+        character = await next_character()
+        if character == "]":
+            return
+        if character is None:
+            raise ValueError("Unterminated JSON array")
+        if not first:
+            if character != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {character!r}")
+            position += 1
+            await next_character()
+        first = False
+
+        while True:
+            try:
+                entry, end = _decoder.raw_decode(buffer, position)
+            except JSONDecodeError:
+                # The entry has not fully arrived yet
+                if not await fill():
+                    raise
+                continue
+            if end == len(buffer) and await fill():
+                # A number could continue in the next chunk
+                continue
+            break
+        position = end
+        yield entry
+
+
+class Paginator:
+    """Iterate over the entries of a paginated list endpoint.
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to request the pages with
+    route: :class:`RouteProtocol`
+        The list endpoint
+    page_size: :class:`int`
+        The most entries discord returns per page
+    direction: :class:`str`
+        ``before`` to go from newest to oldest, ``after`` to go from oldest to newest
+    cursor_of: :class:`Callable[[Any], Any]`
+        Gets the id to continue the next page from out of a entry
+    limit: :class:`Optional[int]`
+        How many entries to yield at most. None for every entry
+    start: :class:`Optional[Any]`
+        The id to start before or after. None starts at the newest or oldest
+    params: :class:`Optional[dict[str, Any]]`
+        Extra query parameters
+    key: :class:`Optional[str]`
+        If the page is a object, the key of the entries in it. Such pages are parsed whole
+    """
+
+    def __init__(
+        self,
+        http: HTTPClientProtocol,
+        route: RouteProtocol,
+        *,
+        page_size: int,
+        direction: Literal["before", "after"],
+        cursor_of: Callable[[Any], Any],
+        limit: Optional[int] = None,
+        start: Optional[Any] = None,
+        params: Optional[dict[str, Any]] = None,
+        key: Optional[str] = None,
+    ) -> None:
+        self.http: HTTPClientProtocol = http
+        self.route: RouteProtocol = route
+        self.page_size: int = page_size
+        self.direction: Literal["before", "after"] = direction
+        self.cursor_of: Callable[[Any], Any] = cursor_of
+        self.limit: Optional[int] = limit
+        self.start: Optional[Any] = start
+        self.params: dict[str, Any] = params or {}
+        self.key: Optional[str] = key
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        # Bounded to a page, so the next page is fetched and parsed while the caller goes through this one
+        queue: Queue[Any] = Queue(self.page_size)
+        producer = get_event_loop().create_task(self._produce(queue))
+        try:
+            while True:
+                entry = await queue.get()
+                if entry is _END:
+                    break
+                yield entry
+            # Raise errors from fetching the pages
+            await producer
+        finally:
+            producer.cancel()
+
+    async def _produce(self, queue: Queue[Any]) -> None:
+        cancelled = False
+        try:
+            remaining = self.limit
+            cursor = self.start
+            while remaining is None or remaining > 0:
+                page_size = self.page_size if remaining is None else min(self.page_size, remaining)
+                params = {**self.params, "limit": page_size}
+                if cursor is not None:
+                    params[self.direction] = cursor
+
+                count = 0
+                response = await self.http.request(self.route, params=params, stream=True)
+                async with response:
+                    async for entry in self._entries(response):
+                        count += 1
+                        cursor = self.cursor_of(entry)
+                        await queue.put(entry)
+                logger.debug("Got %s entries from %s", count, self.route.path)
+
+                if remaining is not None:
+                    remaining -= count
+                if count < page_size:
+                    # Nothing left
+                    break
+        except CancelledError:
+            # The consumer stopped early. Nobody takes from the queue anymore, so putting could wait forever
+            cancelled = True
+            raise
+        finally:
+            # Also on errors so the consumer stops waiting and gets the error
+            if not cancelled:
+                await queue.put(_END)
+
+    async def _entries(self, response: ClientResponse) -> AsyncIterator[Any]:
+        if self.key is None:
+            async for entry in iter_json_array(response.content):
+                yield entry
+        else:
+            for entry in json_loads(await response.read())[self.key]:
+                yield entry
+
+
+def _user_id(entry: dict[str, Any]) -> Any:
+    return entry["user"]["id"]
+
+
+def _id(entry: dict[str, Any]) -> Any:
+    return entry["id"]
+
+
+def iter_messages(
+    http: HTTPClientProtocol, channel_id: Any, *, limit: Optional[int] = None, before: Optional[Any] = None
+) -> Paginator:
+    """Iterate over the messages of a channel from newest to oldest
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to request with
+    channel_id:
+        The channel to get the messages of
+    limit: :class:`Optional[int]`
+        How many messages to get at most. None for every message
+    before:
+        Only get messages before this message id
+    """
+    route = Route("GET", "/channels/{channel_id}/messages", channel_id=channel_id)
+    return Paginator(http, route, page_size=100, direction="before", cursor_of=_id, limit=limit, start=before)
+
+
+def iter_members(
+    http: HTTPClientProtocol, guild_id: Any, *, limit: Optional[int] = None, after: Optional[Any] = None
+) -> Paginator:
+    """Iterate over the members of a guild by user id. This needs the members intent
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to request with
+    guild_id:
+        The guild to get the members of
+    limit: :class:`Optional[int]`
+        How many members to get at most. None for every member
+    after:
+        Only get members with a higher user id
+    """
+    route = Route("GET", "/guilds/{guild_id}/members", guild_id=guild_id)
+    return Paginator(http, route, page_size=1000, direction="after", cursor_of=_user_id, limit=limit, start=after)
+
+
+def iter_bans(
+    http: HTTPClientProtocol, guild_id: Any, *, limit: Optional[int] = None, after: Optional[Any] = None
+) -> Paginator:
+    """Iterate over the bans of a guild by user id
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to request with
+    guild_id:
+        The guild to get the bans of
+    limit: :class:`Optional[int]`
+        How many bans to get at most. None for every ban
+    after:
+        Only get bans of users with a higher user id
+    """
+    route = Route("GET", "/guilds/{guild_id}/bans", guild_id=guild_id)
+    return Paginator(http, route, page_size=1000, direction="after", cursor_of=_user_id, limit=limit, start=after)
+
+
+def iter_audit_log(
+    http: HTTPClientProtocol,
+    guild_id: Any,
+    *,
+    limit: Optional[int] = None,
+    before: Optional[Any] = None,
+    user_id: Optional[Any] = None,
+    action_type: Optional[int] = None,
+) -> Paginator:
+    """Iterate over the audit log entries of a guild from newest to oldest
+
+    Parameters
+    ----------
+    http: :class:`HTTPClientProtocol`
+        The client to request with
+    guild_id:
+        The guild to get the audit log of
+    limit: :class:`Optional[int]`
+        How many entries to get at most. None for every entry
+    before:
+        Only get entries before this entry id
+    user_id:
+        Only get entries made by this user
+    action_type: :class:`Optional[int]`
+        Only get entries of this action type
+    """
+    params = {}
+    if user_id is not None:
+        params["user_id"] = user_id
+    if action_type is not None:
+        params["action_type"] = action_type
+    route = Route("GET", "/guilds/{guild_id}/audit-logs", guild_id=guild_id)
+    return Paginator(
+        http,
+        route,
+        page_size=100,
+        direction="before",
+        cursor_of=_id,
+        limit=limit,
+        start=before,
+        params=params,
+        key="audit_log_entries",
+    )
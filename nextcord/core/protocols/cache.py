@@ -0,0 +1,93 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from typing import Any, Optional
+
+    from ...client.state import State
+
+
+class CacheProtocol(Protocol):
+    """Keeps discord entities from gateway events so they can be looked up without a REST call.
+
+    Parameters
+    ----------
+    state: :class:`State`
+        The current bot state. The cache should register its listeners on :attr:`State.gateway`
+    """
+
+    def __init__(self, state: State) -> None:
+        ...
+
+    def get_guild(self, guild_id: int) -> Optional[Any]:
+        """Get a cached guild
+
+        Parameters
+        ----------
+        guild_id: :class:`int`
+            The id of the guild
+        """
+        ...
+
+    def get_channel(self, channel_id: int) -> Optional[Any]:
+        """Get a cached channel
+
+        Parameters
+        ----------
+        channel_id: :class:`int`
+            The id of the channel
+        """
+        ...
+
+    def get_member(self, guild_id: int, user_id: int) -> Optional[Any]:
+        """Get a cached guild member
+
+        Parameters
+        ----------
+        guild_id: :class:`int`
+            The id of the guild the member is in
+        user_id: :class:`int`
+            The id of the user
+        """
+        ...
+
+    def get_user(self, user_id: int) -> Optional[Any]:
+        """Get a cached user
+
+        Parameters
+        ----------
+        user_id: :class:`int`
+            The id of the user
+        """
+        ...
+
+    def get_message(self, message_id: int) -> Optional[Any]:
+        """Get a cached message
+
+        Parameters
+        ----------
+        message_id: :class:`int`
+            The id of the message
+        """
+        ...
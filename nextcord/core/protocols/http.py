@@ -48,14 +48,26 @@ class RouteProtocol(Protocol):
     parameters:
         Parameters to format path with. You can include guild_id, channel_id, webhook_id or webhook_token to specify ratelimit parameters.
 
+    .. note::
+        The ratelimit parameters are only part of the protocol as :attr:`major_parameters`, in the order
+        ``(guild_id, channel_id, webhook_id, webhook_token)``. :class:`Route <nextcord.core.http.Route>` also has
+        them as properties, other implementations do not have to.
     """
 
+    # Lets implementations use __slots__
+    __slots__ = ()
+
     method: str
     """The HTTP method"""
     path: str
     """The route to be requested from discord"""
-    bucket: str
-    """The ratelimit bucket this is under"""
+    key: str
+    """The key discord assigns a bucket hash to. Routes with the same key share a bucket hash"""
+    major_parameters: tuple[Any, ...]
+    """The major parameters of this route as ``(guild_id, channel_id, webhook_id, webhook_token)``.
+    Routes sharing a bucket hash are only grouped if these match"""
+    bucket: tuple[str, tuple[Any, ...]]
+    """The ratelimit bucket this is under until discord tells us the bucket hash"""
     use_webhook_global: bool
     """If this route uses the webhook global LINK MISSING"""
 
@@ -100,7 +112,14 @@ class BucketProtocol(Protocol):
     remaining: Optional[int]
     """How many is remaining."""
     reset_at: Optional[float]
-    """When the bucket resets"""
+    """When the bucket resets, by the local clock (:func:`time.time`)"""
+    bucket_hash: Optional[str]
+    """The X-RateLimit-Bucket hash, set by HTTPClient once discord sent it. None until then"""
+
+    @property
+    def pending(self) -> int:
+        """How many requests are waiting for room"""
+        ...
 
     def __init__(self, route: RouteProtocol) -> None:
         ...
@@ -132,11 +151,28 @@ class HTTPClientProtocol(Protocol):
 
         route: :class:`RouteProtocol`
             The metadata for this API route
+        stream: :class:`bool`
+            A keyword argument. If True the body should be left unread and the response not shared or cached
         kwargs:
             Keyword only arguments passed to :attr:`ClientSession.request <aiohttp.ClientSession.trace_config>`
         """
         ...
 
+    def invalidate(self, path: str) -> None:
+        """Drop cached responses of a path. Called when something changes a resource without a request.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            The formatted path, for example ``/channels/1234``
+        """
+        ...
+
+    async def prewarm(self) -> None:
+        """Open connections to discord before the first requests need them. Called while the client connects.
+        This should not raise, failing to prewarm would stop the client from connecting."""
+        ...
+
     async def ws_connect(self, url: str) -> ClientWebSocketResponse:
         """Connect to a websocket!
 
@@ -0,0 +1,91 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from typing import Any, ContextManager, Optional
+
+
+class MetricsProtocol(Protocol):
+    """Receives measurements from the hot paths of the library.
+
+    Names are dotted, for example ``http.bucket.wait``. Tags are small dicts of strings, like the bucket or shard id.
+    See :mod:`nextcord.core.metrics` for what is measured.
+    """
+
+    enabled: bool
+    """If measurements should be taken at all. When False the library skips timing so it costs nothing"""
+
+    def increment(self, name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+        """Add to a counter
+
+        Parameters
+        ----------
+        name: :class:`str`
+            The counter
+        value: :class:`float`
+            How much to add
+        tags: :class:`Optional[dict[str, str]]`
+            What the count is for
+        """
+        ...
+
+    def gauge(self, name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+        """Set the current value of something, like a queue length
+
+        Parameters
+        ----------
+        name: :class:`str`
+            The gauge
+        value: :class:`float`
+            The current value
+        tags: :class:`Optional[dict[str, str]]`
+            What the value is for
+        """
+        ...
+
+    def observe(self, name: str, seconds: float, tags: Optional[dict[str, str]] = None) -> None:
+        """Record how long something took
+
+        Parameters
+        ----------
+        name: :class:`str`
+            What was timed
+        seconds: :class:`float`
+            How long it took
+        tags: :class:`Optional[dict[str, str]]`
+            What was timed
+        """
+        ...
+
+    def span(self, name: str, tags: Optional[dict[str, str]] = None) -> ContextManager[Any]:
+        """Time a block of code. Spans started inside it are its children
+
+        Parameters
+        ----------
+        name: :class:`str`
+            What the block does
+        tags: :class:`Optional[dict[str, str]]`
+            Attributes of the span
+        """
+        ...
@@ -0,0 +1,68 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from typing import Optional
+
+
+class RatelimitStoreProtocol(Protocol):
+    """Ratelimit state shared between multiple processes.
+
+    A key either has its limits set through :meth:`update` from ratelimit headers,
+    or is a fixed window of ``limit`` uses every ``per`` seconds given when acquiring.
+    """
+
+    async def acquire(self, key: str, *, limit: Optional[int] = None, per: Optional[float] = None) -> None:
+        """Take a use of a key, waiting until one is available
+
+        Parameters
+        ----------
+        key: :class:`str`
+            The ratelimit key
+        limit: :class:`Optional[int]`
+            How many uses the key has per window if it is a fixed window
+        per: :class:`Optional[float]`
+            How long the window of a fixed window key is in seconds
+        """
+        ...
+
+    def update(self, key: str, limit: int, remaining: int, reset_at: float) -> None:
+        """Set the limits of a key from ratelimit headers
+
+        Parameters
+        ----------
+        key: :class:`str`
+            The ratelimit key
+        limit: :class:`int`
+            How many uses the key has per window
+        remaining: :class:`int`
+            How many uses are remaining in the current window
+        reset_at: :class:`float`
+            When the current window ends. (UTC time)
+        """
+        ...
+
+    async def close(self) -> None:
+        """Clean up all resources the store created"""
+        ...
@@ -0,0 +1,450 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""Ratelimit stores shared between multiple processes running the same bot token.
+
+Use them by setting :attr:`TypeSheet.http_bucket <nextcord.type_sheet.TypeSheet.http_bucket>` to
+:meth:`SharedBucket.using`.
+
+.. code-block:: python3
+
+    store = MMapRatelimitStore("/dev/shm/nextcord-ratelimits")
+    type_sheet = TypeSheet.default()
+    type_sheet.http_bucket = SharedBucket.using(store)
+
+.. note::
+    These use unix only APIs.
+"""
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+from asyncio import (
+    Future,
+    Task,
+    get_event_loop,
+    open_unix_connection,
+    sleep,
+    start_unix_server,
+)
+from hashlib import blake2b
+from logging import getLogger
+from time import time
+from typing import TYPE_CHECKING
+
+from ..utils import json
+from .http import Bucket
+from .protocols.ratelimit_store import RatelimitStoreProtocol
+
+if TYPE_CHECKING:
+    from asyncio import AbstractServer, StreamReader, StreamWriter
+    from typing import Any, Optional, Type
+
+    from .protocols.http import RouteProtocol
+
+__all__ = ("MMapRatelimitStore", "BrokerRatelimitStore", "RatelimitBroker", "SharedBucket")
+
+logger = getLogger(__name__)
+
+# reset_at is local time plus Reset-After, so it differs a little between responses of the same window.
+# Resets this close together are the same window. Windows are at least a quarter second apart.
+WINDOW_TOLERANCE = 0.1
+
+
+class RatelimitState:
+    """The state of a single ratelimit key
+
+    Parameters
+    ----------
+    limit: :class:`int`
+        How many uses fit in a window. 0 if unknown
+    remaining: :class:`int`
+        How many uses are left in the current window
+    reset_at: :class:`float`
+        When the current window ends. 0 if there is no window yet. (UTC time)
+    per: :class:`float`
+        How long a fixed window is. 0 if the window is set through ratelimit headers
+    """
+
+    __slots__ = ("limit", "remaining", "reset_at", "per")
+
+    def __init__(self, limit: int = 0, remaining: int = 0, reset_at: float = 0, per: float = 0) -> None:
+        self.limit: int = limit
+        self.remaining: int = remaining
+        self.reset_at: float = reset_at
+        self.per: float = per
+
+    def take(self, now: float, limit: Optional[int] = None, per: Optional[float] = None) -> float:
+        """Take a use if one is available
+
+        Returns
+        -------
+        :class:`float`
+            How long to wait before trying again. 0 if a use was taken.
+        """
+        if limit is not None and per is not None and self.limit == 0:
+            # First use of a fixed window
+            self.limit = self.remaining = limit
+            self.per = per
+
+        if self.reset_at and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = 0
+
+        if self.limit == 0:
+            return 0  # We have no ratelimiting info, let's just try
+        if self.remaining > 0:
+            self.remaining -= 1
+            if self.per and not self.reset_at:
+                self.reset_at = now + self.per
+            return 0
+        if not self.reset_at:
+            # Out of uses without knowing when it resets. Try again once the headers are in.
+            return 0.1
+        return self.reset_at - now
+
+    def update(self, limit: int, remaining: int, reset_at: float) -> None:
+        """Apply ratelimit headers"""
+        if abs(reset_at - self.reset_at) < WINDOW_TOLERANCE:
+            # Same window, another process might have used more since this response was sent
+            remaining = min(remaining, self.remaining)
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+
+
+def _hash_key(key: str) -> int:
+    # hash() is randomized per process, so we need a stable hash. 0 marks a empty slot.
+    return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class MMapRatelimitStore(RatelimitStoreProtocol):
+    """A ratelimit store in a memory mapped file, shared by every process on the same host opening the same file.
+
+    The file is a open addressed hash table of fixed size slots, every access is done under a file lock.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The file to store the ratelimits in. Using a file in ``/dev/shm`` keeps it in memory.
+    slot_count: :class:`int`
+        How many keys fit in the store. Every process using the file should use the same slot count.
+    poll_interval: :class:`float`
+        The longest time to wait before checking a exhausted key again.
+    """
+
+    _slot = struct.Struct("<Qiidd")
+
+    def __init__(self, path: str, *, slot_count: int = 4096, poll_interval: float = 0.5) -> None:
+        self.path: str = path
+        self.slot_count: int = slot_count
+        self.poll_interval: float = poll_interval
+
+        size = self._slot.size * slot_count
+        self._fd: int = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map: mmap.mmap = mmap.mmap(self._fd, size)
+
+    def _locked(self) -> _FileLock:
+        return _FileLock(self._fd)
+
+    def _find(self, key_hash: int) -> Optional[int]:
+        """Find the offset of a key's slot, or a empty slot for it"""
+        index = key_hash % self.slot_count
+        for _ in range(self.slot_count):
+            offset = index * self._slot.size
+            (slot_hash,) = struct.unpack_from("<Q", self._map, offset)
+            if slot_hash in (key_hash, 0):
+                return offset
+            index = (index + 1) % self.slot_count
+        return None
+
+    def _modify(self, key: str, action: Any) -> Any:
+        key_hash = _hash_key(key)
+        with self._locked():
+            offset = self._find(key_hash)
+            if offset is None:
+                logger.warning("Ratelimit store %s is full, not ratelimiting %s", self.path, key)
+                return 0
+            _, limit, remaining, reset_at, per = self._slot.unpack_from(self._map, offset)
+            state = RatelimitState(limit, remaining, reset_at, per)
+            result = action(state)
+            self._slot.pack_into(self._map, offset, key_hash, state.limit, state.remaining, state.reset_at, state.per)
+            return result
+
+    async def acquire(self, key: str, *, limit: Optional[int] = None, per: Optional[float] = None) -> None:
+        while (wait := self._modify(key, lambda state: state.take(time(), limit, per))) > 0:
+            logger.debug("Waiting %ss for shared ratelimit %s", wait, key)
+            await sleep(min(wait, self.poll_interval))
+
+    def update(self, key: str, limit: int, remaining: int, reset_at: float) -> None:
+        self._modify(key, lambda state: state.update(limit, remaining, reset_at))
+
+    async def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class _FileLock:
+    def __init__(self, fd: int) -> None:
+        self._fd = fd
+
+    def __enter__(self) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *_: Any) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class RatelimitBroker:
+    """A process which many workers lease ratelimits from over a unix socket.
+
+    This can be run standalone with ``python -m nextcord.core.ratelimit_store <path>``.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The path of the unix socket to listen on
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._states: dict[str, RatelimitState] = {}
+        self._server: Optional[AbstractServer] = None
+        self._writers: set[StreamWriter] = set()
+
+    async def start(self) -> None:
+        """Start listening for workers"""
+        self._server = await start_unix_server(self._handle_connection, self.path)
+
+    async def serve_forever(self) -> None:
+        """Start listening for workers and run until closed"""
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening for workers"""
+        if self._server is not None:
+            self._server.close()
+            # Workers reconnect once a broker is listening again
+            for writer in self._writers:
+                writer.close()
+            await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle_connection(self, reader: StreamReader, writer: StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                state = self._states.get(message["key"])
+                if state is None:
+                    state = self._states[message["key"]] = RatelimitState()
+
+                if message["op"] == "acquire":
+                    wait = state.take(time(), message.get("limit"), message.get("per"))
+                    writer.write(_encode({"id": message["id"], "wait": wait}))
+                elif message["op"] == "update":
+                    state.update(message["limit"], message["remaining"], message["reset_at"])
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+class BrokerRatelimitStore(RatelimitStoreProtocol):
+    """A ratelimit store leasing ratelimits from a :class:`RatelimitBroker`
+
+    If the connection to the broker is lost, waiting acquires are sent again over a new connection.
+    They raise if the broker cannot be reached.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The path of the brokers unix socket
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._writer: Optional[StreamWriter] = None
+        self._reader_task: Optional[Task[None]] = None
+        self._connecting: Optional[Future[None]] = None
+        self._pending: dict[int, Future[float]] = {}
+        self._next_id: int = 0
+
+    async def _connect(self) -> StreamWriter:
+        if self._writer is not None:
+            return self._writer
+        if self._connecting is None:
+            connecting = self._connecting = get_event_loop().create_future()
+            try:
+                reader, writer = await open_unix_connection(self.path)
+            except BaseException as error:
+                self._connecting = None
+                connecting.set_exception(error)
+                connecting.exception()  # Nobody might be waiting on it
+                raise
+            self._reader_task = get_event_loop().create_task(self._read_loop(reader, writer))
+            self._writer = writer
+            connecting.set_result(None)
+        else:
+            await self._connecting
+        assert self._writer is not None
+        return self._writer
+
+    async def _read_loop(self, reader: StreamReader, writer: StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                future = self._pending.pop(message["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(message["wait"])
+        except ConnectionError:
+            pass
+        finally:
+            # The broker is gone. The next acquire connects again
+            if self._writer is writer:
+                self._writer = None
+                self._connecting = None
+            writer.close()
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionResetError("Lost the connection to the ratelimit broker"))
+
+    async def acquire(self, key: str, *, limit: Optional[int] = None, per: Optional[float] = None) -> None:
+        while True:
+            writer = await self._connect()
+            request_id = self._next_id
+            self._next_id += 1
+            future: Future[float] = get_event_loop().create_future()
+            self._pending[request_id] = future
+
+            writer.write(_encode({"op": "acquire", "id": request_id, "key": key, "limit": limit, "per": per}))
+            try:
+                wait = await future
+            except ConnectionResetError:
+                logger.warning("Lost the connection to the ratelimit broker at %s, reconnecting", self.path)
+                continue
+            if wait <= 0:
+                return
+            logger.debug("Waiting %ss for shared ratelimit %s", wait, key)
+            await sleep(wait)
+
+    def update(self, key: str, limit: int, remaining: int, reset_at: float) -> None:
+        if self._writer is None:
+            return  # Never acquired, nothing to share yet
+        self._writer.write(
+            _encode({"op": "update", "key": key, "limit": limit, "remaining": remaining, "reset_at": reset_at})
+        )
+
+    async def close(self) -> None:
+        for future in self._pending.values():
+            future.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    payload = json.dumps(message)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return payload + b"\n"
+
+
+class SharedBucket(Bucket):
+    """A :class:`Bucket <nextcord.core.http.Bucket>` which also shares its ratelimits and the global ratelimit through a store.
+
+    Use :meth:`SharedBucket.using` to create a bucket type for :class:`TypeSheet <nextcord.type_sheet.TypeSheet>`.
+    Ratelimits are shared by bucket hash and major parameters, or by route until the bucket hash is known.
+    """
+
+    store: RatelimitStoreProtocol
+    """The store ratelimits are shared through"""
+    global_limit: int = 50
+    """How many requests can be made per second across every process"""
+
+    def __init__(self, route: RouteProtocol) -> None:
+        # Keyed by the route until discord tells us the bucket hash, which other routes can share
+        self._key: str = ":".join((route.key, *map(str, route.major_parameters)))
+        super().__init__(route)  # type: ignore
+        self._global_key: str = "global:webhook" if route.use_webhook_global else "global"
+
+    @classmethod
+    def using(cls, store: RatelimitStoreProtocol) -> Type[SharedBucket]:
+        """Create a bucket type sharing ratelimits through a store
+
+        Parameters
+        ----------
+        store: :class:`RatelimitStoreProtocol`
+            The store to share ratelimits through
+        """
+        return type(cls.__name__, (cls,), {"store": store})
+
+    @property
+    def bucket_hash(self) -> Optional[str]:
+        """The X-RateLimit-Bucket hash of this bucket, once discord sent it"""
+        return self._bucket_hash
+
+    @bucket_hash.setter
+    def bucket_hash(self, bucket_hash: Optional[str]) -> None:
+        self._bucket_hash = bucket_hash
+        if bucket_hash is not None:
+            self._key = ":".join((bucket_hash, *map(str, self._route.major_parameters)))
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """How many requests are remaining."""
+        return self._remaining
+
+    @remaining.setter
+    def remaining(self, new_value: Optional[int]) -> None:
+        Bucket.remaining.fset(self, new_value)  # type: ignore
+        if new_value is not None and self.limit is not None and self.reset_at is not None:
+            self.store.update(self._key, self.limit, new_value, self.reset_at)
+
+    async def __aenter__(self) -> "SharedBucket":
+        await super().__aenter__()
+        try:
+            await self.store.acquire(self._key)
+            await self.store.acquire(self._global_key, limit=self.global_limit, per=1)
+        except BaseException:
+            await super().__aexit__()
+            raise
+        return self
+
+
+if __name__ == "__main__":
+    from asyncio import run
+    from sys import argv
+
+    if len(argv) != 2:
+        raise SystemExit("Usage: python -m nextcord.core.ratelimit_store <socket path>")
+    run(RatelimitBroker(argv[1]).serve_forever())
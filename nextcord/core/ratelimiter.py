@@ -21,42 +21,191 @@
 from __future__ import annotations
 
 import time
-from asyncio import Future
+from asyncio import CancelledError, Future
 from asyncio.events import AbstractEventLoop, get_event_loop
+from collections import deque
 from logging import getLogger
+from math import ceil, floor
 from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
 
 if TYPE_CHECKING:
-    from typing import Any
+    from asyncio import TimerHandle
+    from typing import Any, Callable, Optional
 
 logger = getLogger(__name__)
 
+_timer_wheels: WeakKeyDictionary[AbstractEventLoop, TimerWheel] = WeakKeyDictionary()
+
+
+def get_timer_wheel(loop: Optional[AbstractEventLoop] = None) -> TimerWheel:
+    """Get the timer wheel shared by every ratelimiter on a loop
+
+    Parameters
+    ----------
+    loop: :class:`Optional[AbstractEventLoop]`
+        The loop to get the timer wheel for. Defaults to the current loop
+    """
+    if loop is None:
+        loop = get_event_loop()
+    wheel = _timer_wheels.get(loop)
+    if wheel is None:
+        wheel = TimerWheel(loop)
+        _timer_wheels[loop] = wheel
+    return wheel
+
+
+class TimerWheel:
+    """A hashed timer wheel which runs callbacks after a delay using a single loop timer.
+
+    Callbacks are never run early, but can be run up to ``resolution`` seconds late.
+    The wheel only ticks while it has callbacks scheduled.
+
+    Parameters
+    ----------
+    loop: :class:`AbstractEventLoop`
+        The loop to run the callbacks on
+    resolution: :class:`float`
+        How long a tick is in seconds
+    slot_count: :class:`int`
+        How many slots the wheel has. Callbacks further away than ``resolution * slot_count`` wrap around.
+    """
+
+    def __init__(self, loop: AbstractEventLoop, resolution: float = 0.05, slot_count: int = 512) -> None:
+        self.loop: AbstractEventLoop = loop
+        self.resolution: float = resolution
+        self._slots: list[list[tuple[int, Callable[[], Any]]]] = [[] for _ in range(slot_count)]
+        self._start: float = loop.time()
+        self._current_tick: int = 0
+        self._scheduled: int = 0
+        self._handle: Optional[TimerHandle] = None
+        self._ticking: bool = False
+
+    def __len__(self) -> int:
+        return self._scheduled
+
+    def schedule(self, delay: float, callback: Callable[[], Any]) -> None:
+        """Run a callback after a delay
+
+        Parameters
+        ----------
+        delay: :class:`float`
+            How many seconds to wait before running the callback
+        callback: :class:`Callable[[], Any]`
+            The callback to run
+        """
+        idle = self._handle is None and not self._ticking
+        if idle:
+            self._catch_up()
+        tick = ceil((self.loop.time() + max(delay, 0) - self._start) / self.resolution)
+        tick = max(tick, self._current_tick + 1)
+        self._slots[tick % len(self._slots)].append((tick, callback))
+        self._scheduled += 1
+
+        if idle:
+            self._schedule_tick()
+
+    def _catch_up(self) -> None:
+        """Skip ahead to the current tick while nothing is scheduled"""
+        self._current_tick = floor((self.loop.time() - self._start) / self.resolution)
+
+    def _schedule_tick(self) -> None:
+        self._handle = self.loop.call_at(self._start + (self._current_tick + 1) * self.resolution, self._tick)
+
+    def _tick(self) -> None:
+        self._handle = None
+        self._ticking = True
+        now_tick = floor((self.loop.time() - self._start) / self.resolution)
+
+        while self._current_tick < now_tick and self._scheduled:
+            self._current_tick += 1
+            slot = self._slots[self._current_tick % len(self._slots)]
+            if not slot:
+                continue
+            due = [callback for tick, callback in slot if tick <= self._current_tick]
+            if not due:
+                continue  # Only entries for a later round
+            slot[:] = [entry for entry in slot if entry[0] > self._current_tick]
+            self._scheduled -= len(due)
+
+            for callback in due:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Exception in timer wheel callback %s", callback)
+
+        self._ticking = False
+        if self._scheduled:
+            self._current_tick = max(self._current_tick, now_tick)
+            self._schedule_tick()
+
 
 class TimesPer:
+    """A ratelimiter which lets ``limit`` uses through every ``per`` seconds.
+
+    Waiters are released in the order they started waiting.
+
+    Parameters
+    ----------
+    limit: :class:`int`
+        How many uses are allowed per window
+    per: :class:`float`
+        How long a window is in seconds
+    """
+
     def __init__(self, limit: int, per: float) -> None:
         self.limit: int = limit
         self.per: float = per
         self.current: int = self.limit
 
-        self._reserved: list[Future[None]] = []
+        self._reserved: deque[Future[None]] = deque()
         self.loop: AbstractEventLoop = get_event_loop()
         self.pending_reset: bool = False
 
+    @property
+    def pending(self) -> int:
+        """How many are waiting for a token"""
+        return len(self._reserved)
+
     async def __aenter__(self) -> "TimesPer":
-        if self.current == 0:
-            future: Future[None] = Future()
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        ...
+
+    async def acquire(self) -> None:
+        """Take a token, waiting for the next reset if there are none left"""
+        if self.current <= 0 or self._reserved:
+            future: Future[None] = self.loop.create_future()
             self._reserved.append(future)
-            await future
-        self.current -= 1
+            try:
+                await future
+            except CancelledError:
+                if future.done() and not future.cancelled():
+                    # We got a token but never used it, give it back.
+                    self.current += 1
+                self._release()
+                raise
+            # The token was taken for us when we got released
+        else:
+            self.current -= 1
 
         if not self.pending_reset:
-            self.pending_reset = True
-            self.loop.call_later(self.per, self.reset)
+            self._schedule_reset()
 
-        return self
+    def _schedule_reset(self) -> None:
+        self.pending_reset = True
+        get_timer_wheel(self.loop).schedule(self.per, self.reset)
 
-    async def __aexit__(self, *_: Any) -> None:
-        ...
+    def _release(self) -> None:
+        """Release as many waiters as there are tokens left"""
+        while self._reserved and self.current > 0:
+            future = self._reserved.popleft()
+            if future.done():
+                continue  # Cancelled while waiting
+            self.current -= 1
+            future.set_result(None)
 
     def reset(self) -> None:
         logger.debug("Ratelimiter reset!")
@@ -65,14 +214,10 @@ class TimesPer:
         self.current = self.limit
 
         # Release pending
-        for _ in range(self.limit):
-            try:
-                self._reserved.pop().set_result(None)
-            except IndexError:
-                break
+        self._release()
 
-        if len(self._reserved):
-            self.pending_reset = True
-            self.loop.call_later(self.per, self.reset)
+        if self.current < self.limit:
+            # Tokens of the new window are already used
+            self._schedule_reset()
         else:
             self.pending_reset = False
@@ -0,0 +1,378 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2021-present vcokltfre & tag-epic
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+"""A cache store in memory mapped files, shared by every process on the same host.
+
+When shards are spread over processes with :class:`Cluster <nextcord.core.gateway.cluster.Cluster>`, every process
+would otherwise keep its own copy of the cache. With :class:`Shared` as the policy every process opens the same
+files and reads one copy. Records are fixed size binary structs, so reading one only unpacks a struct.
+
+.. code-block:: python3
+
+    shared = Shared("/dev/shm/my-bot")
+    client = Client(token, intents, cache_policies={"guilds": shared, "channels": shared, "members": shared})
+
+.. note::
+    These use unix only APIs.
+
+.. note::
+    Strings longer than their field are cut off and members with more roles than ``max_roles`` are not cached.
+    Changing a returned record does not change the cache.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+import attr
+
+from .cache import ChannelRecord, GuildRecord, MemberRecord, UserRecord
+from .ratelimit_store import _FileLock
+
+if TYPE_CHECKING:
+    from typing import Any, Hashable, Iterator, Optional, Type
+
+__all__ = ("Shared", "MMapStore")
+
+logger = getLogger(__name__)
+
+# Slot states
+EMPTY = 0
+USED = 1
+DELETED = 2
+
+# Field kinds
+SNOWFLAKE = "snowflake"
+"""A optional snowflake. Stored as 0 if None"""
+INT = "int"
+"""A optional int"""
+BOOL = "bool"
+STR = "str"
+"""A optional string, the size is how many utf-8 bytes fit"""
+SNOWFLAKES = "snowflakes"
+"""A tuple of snowflakes, the size is how many fit"""
+
+_NONE_INT = -(2**63)
+# How often a reader checks a slot which is being written before treating it as left behind by a dead writer
+READ_ATTEMPTS = 1000
+# Misses probe until a empty slot. Once this share of the slots is deleted, the table is rehashed without them
+COMPACT_RATIO = 0.25
+
+
+class _Codec:
+    """Packs a record type into a fixed size struct"""
+
+    def __init__(self, record_type: Type[Any], fields: list[tuple[str, int]]) -> None:
+        self.record_type: Type[Any] = record_type
+        self.fields: list[tuple[str, int]] = fields
+        self.names: list[str] = [field.name for field in attr.fields(record_type)]
+        layout = "<"
+        for kind, size in fields:
+            if kind == SNOWFLAKE:
+                layout += "Q"
+            elif kind == INT:
+                layout += "q"
+            elif kind == BOOL:
+                layout += "?"
+            elif kind == STR:
+                layout += f"h{size}s"
+            elif kind == SNOWFLAKES:
+                layout += f"H{size}Q"
+        self.struct: struct.Struct = struct.Struct(layout)
+
+    def pack(self, record: Any) -> Optional[list[Any]]:
+        values: list[Any] = []
+        for (kind, size), name in zip(self.fields, self.names):
+            value = getattr(record, name)
+            if kind == SNOWFLAKE:
+                values.append(value or 0)
+            elif kind == INT:
+                values.append(_NONE_INT if value is None else value)
+            elif kind == BOOL:
+                values.append(value)
+            elif kind == STR:
+                if value is None:
+                    values += (-1, b"")
+                else:
+                    encoded = value.encode("utf-8")
+                    if len(encoded) > size:
+                        # Cut on a character boundary
+                        encoded = encoded[:size].decode("utf-8", "ignore").encode("utf-8")
+                    values += (len(encoded), encoded)
+            elif kind == SNOWFLAKES:
+                if len(value) > size:
+                    return None
+                values.append(len(value))
+                values += value
+                values += (0,) * (size - len(value))
+        return values
+
+    def unpack_from(self, buffer: mmap.mmap, offset: int) -> Any:
+        values = self.struct.unpack_from(buffer, offset)
+        record_values: list[Any] = []
+        index = 0
+        for kind, size in self.fields:
+            value = values[index]
+            if kind == SNOWFLAKE:
+                record_values.append(value or None)
+                index += 1
+            elif kind == INT:
+                record_values.append(None if value == _NONE_INT else value)
+                index += 1
+            elif kind == BOOL:
+                record_values.append(value)
+                index += 1
+            elif kind == STR:
+                record_values.append(None if value == -1 else values[index + 1][:value].decode("utf-8"))
+                index += 2
+            elif kind == SNOWFLAKES:
+                record_values.append(values[index + 1 : index + 1 + value])
+                index += 1 + size
+        return self.record_type(*record_values)
+
+
+def _codec_for(entity: str, max_roles: int) -> _Codec:
+    if entity == "guilds":
+        return _Codec(GuildRecord, [(SNOWFLAKE, 0), (STR, 200), (SNOWFLAKE, 0), (STR, 40), (INT, 0)])
+    if entity == "channels":
+        return _Codec(ChannelRecord, [(SNOWFLAKE, 0), (SNOWFLAKE, 0), (INT, 0), (STR, 200), (INT, 0), (SNOWFLAKE, 0)])
+    if entity == "members":
+        return _Codec(MemberRecord, [(SNOWFLAKE, 0), (SNOWFLAKE, 0), (STR, 128), (SNOWFLAKES, max_roles)])
+    if entity == "users":
+        return _Codec(UserRecord, [(SNOWFLAKE, 0), (STR, 128), (STR, 4), (STR, 40), (BOOL, 0)])
+    raise ValueError(f"{entity} cannot be stored in a shared cache")
+
+
+class MMapStore:
+    """A open addressed hash table of fixed size records in a memory mapped file.
+
+    Writes are done under a file lock. Reads take no lock, every slot has a version which is odd while it is being
+    written and reads retry if it changed while reading. A slot which stays odd, because its writer died, reads as a
+    miss until the next write to it.
+
+    Removed records leave deleted slots behind, which inserts reuse. Once :data:`COMPACT_RATIO` of the slots are
+    deleted the table is rehashed, reads at the same time can miss.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        The file to store the entities in. Using a file in ``/dev/shm`` keeps it in memory.
+    entity: :class:`str`
+        The entity type to store. One of ``guilds``, ``channels``, ``members`` or ``users``
+    slot_count: :class:`int`
+        How many entities fit in the store. Every process using the file should use the same slot count.
+    max_roles: :class:`int`
+        How many roles fit in a member record
+    """
+
+    # version, state, key, key (second part of member keys)
+    _header = struct.Struct("<IBxxxQQ")
+    # How many slots are deleted. After the slots
+    _deleted = struct.Struct("<Q")
+
+    def __init__(self, path: str, entity: str, *, slot_count: int = 1 << 16, max_roles: int = 16) -> None:
+        self.path: str = path
+        self.slot_count: int = slot_count
+        self._codec: _Codec = _codec_for(entity, max_roles)
+        self._slot_size: int = self._header.size + self._codec.struct.size
+
+        self._deleted_offset: int = self._slot_size * slot_count
+        size = self._deleted_offset + self._deleted.size
+        self._fd: int = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with _FileLock(self._fd):
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map: mmap.mmap = mmap.mmap(self._fd, size)
+
+    def _probe(self, key: tuple[int, int]) -> Iterator[int]:
+        # Multiplicative hashing, snowflakes share their low bits too often to use them directly
+        index = ((key[0] ^ key[1]) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) % self.slot_count
+        for _ in range(self.slot_count):
+            yield index * self._slot_size
+            index = (index + 1) % self.slot_count
+
+    def _read_header(self, offset: int) -> Optional[tuple[int, int, int, int]]:
+        """Read the header of a slot which is not being written. None if it stays that way, see :data:`READ_ATTEMPTS`"""
+        for _ in range(READ_ATTEMPTS):
+            header = self._header.unpack_from(self._map, offset)
+            if not header[0] & 1:
+                return header
+            # A other process is writing this slot
+        return None
+
+    def _read(self, offset: int, key: tuple[int, int]) -> tuple[int, Optional[Any]]:
+        """Read the record in a slot if it has the key. Returns the slot state and the record"""
+        for _ in range(READ_ATTEMPTS):
+            header = self._read_header(offset)
+            if header is None:
+                logger.warning("Slot at %s in shared cache %s is stuck being written", offset, self.path)
+                return DELETED, None
+            version, state, *slot_key = header
+            if state != USED or tuple(slot_key) != key:
+                return state, None
+            record = self._codec.unpack_from(self._map, offset + self._header.size)
+            if self._header.unpack_from(self._map, offset)[0] == version:
+                return state, record
+            # Changed while reading, read it again
+        return DELETED, None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        packed_key = _pack_key(key)
+        for offset in self._probe(packed_key):
+            state, record = self._read(offset, packed_key)
+            if record is not None:
+                return record
+            if state == EMPTY:
+                return None
+        return None
+
+    def __setitem__(self, key: Hashable, record: Any) -> None:
+        values = self._codec.pack(record)
+        if values is None:
+            logger.debug("Not caching %s as it does not fit in a record", key)
+            self.pop(key)
+            return
+        packed_key = _pack_key(key)
+        with _FileLock(self._fd):
+            offset = self._find_for_write(packed_key)
+            if offset is None:
+                logger.warning("Shared cache %s is full, not caching %s", self.path, key)
+                return
+            version, state, *_ = self._header.unpack_from(self._map, offset)
+            version = _settled_version(version)
+            if state == DELETED:
+                self._add_deleted(-1)
+            self._header.pack_into(self._map, offset, version + 1, USED, *packed_key)
+            self._codec.struct.pack_into(self._map, offset + self._header.size, *values)
+            self._header.pack_into(self._map, offset, version + 2, USED, *packed_key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        packed_key = _pack_key(key)
+        with _FileLock(self._fd):
+            for offset in self._probe(packed_key):
+                version, state, *slot_key = self._header.unpack_from(self._map, offset)
+                if state == EMPTY:
+                    return default
+                if state == USED and tuple(slot_key) == packed_key:
+                    record = self._codec.unpack_from(self._map, offset + self._header.size)
+                    self._header.pack_into(self._map, offset, _settled_version(version) + 2, DELETED, *packed_key)
+                    if self._add_deleted(1) >= self.slot_count * COMPACT_RATIO:
+                        self._compact()
+                    return record
+        return default
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        for index in range(self.slot_count):
+            offset = index * self._slot_size
+            header = self._read_header(offset)
+            if header is None:
+                continue
+            _, state, first, second = header
+            if state == USED:
+                yield (first if second == 0 else (first, second)), self._codec.unpack_from(
+                    self._map, offset + self._header.size
+                )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+
+    def _find_for_write(self, key: tuple[int, int]) -> Optional[int]:
+        free = None
+        for offset in self._probe(key):
+            _, state, *slot_key = self._header.unpack_from(self._map, offset)
+            if state == USED and tuple(slot_key) == key:
+                return offset
+            if state != USED and free is None:
+                free = offset
+            if state == EMPTY:
+                break
+        return free
+
+    def _add_deleted(self, change: int) -> int:
+        deleted: int = max(self._deleted.unpack_from(self._map, self._deleted_offset)[0] + change, 0)
+        self._deleted.pack_into(self._map, self._deleted_offset, deleted)
+        return deleted
+
+    def _compact(self) -> None:
+        """Rehash every record, dropping the deleted slots. Called under the file lock"""
+        logger.debug("Compacting shared cache %s", self.path)
+        records = []
+        for offset in range(0, self._deleted_offset, self._slot_size):
+            version, state, first, second = self._header.unpack_from(self._map, offset)
+            if state == USED:
+                records.append(((first, second), self._map[offset + self._header.size : offset + self._slot_size]))
+            if state != EMPTY:
+                self._header.pack_into(self._map, offset, _settled_version(version) + 2, EMPTY, 0, 0)
+        for key, data in records:
+            free = self._find_for_write(key)
+            assert free is not None, "Fewer records than slots"
+            version = _settled_version(self._header.unpack_from(self._map, free)[0])
+            self._header.pack_into(self._map, free, version + 1, USED, *key)
+            self._map[free + self._header.size : free + self._slot_size] = data
+            self._header.pack_into(self._map, free, version + 2, USED, *key)
+        self._deleted.pack_into(self._map, self._deleted_offset, 0)
+
+    def close(self) -> None:
+        """Unmap the file. Other processes can keep using it"""
+        self._map.close()
+        os.close(self._fd)
+
+
+def _settled_version(version: int) -> int:
+    # Odd under the write lock means a writer died in the middle of the slot. Writing it again repairs it
+    return version + (version & 1)
+
+
+def _pack_key(key: Hashable) -> tuple[int, int]:
+    if isinstance(key, tuple):
+        return key
+    return key, 0  # type: ignore
+
+
+class Shared:
+    """Cache entities in memory mapped files shared by every process opening the same directory
+
+    Parameters
+    ----------
+    directory: :class:`str`
+        Where to create the files. Using a directory in ``/dev/shm`` keeps them in memory
+    slot_count: :class:`int`
+        How many entities fit per entity type. This should be well above the entity count, lookups slow down as the
+        store fills up.
+    max_roles: :class:`int`
+        How many roles fit in a member record. Members with more roles are not cached
+    """
+
+    def __init__(self, directory: str, *, slot_count: int = 1 << 16, max_roles: int = 16) -> None:
+        self.directory: str = directory
+        self.slot_count: int = slot_count
+        self.max_roles: int = max_roles
+
+    def create_store(self, entity: str) -> MMapStore:
+        os.makedirs(self.directory, exist_ok=True)
+        return MMapStore(
+            os.path.join(self.directory, f"{entity}.cache"),
+            entity,
+            slot_count=self.slot_count,
+            max_roles=self.max_roles,
+        )
@@ -19,46 +19,351 @@
 
 from __future__ import annotations
 
+from asyncio import gather
 from asyncio.events import get_event_loop
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from functools import partial
+from inspect import iscoroutine
+from itertools import count
 from logging import getLogger
+from time import perf_counter
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from typing import Any, Awaitable, Callable
+    from asyncio import Future
+    from concurrent.futures import Executor
+    from typing import (
+        Any,
+        Awaitable,
+        Callable,
+        Coroutine,
+        Hashable,
+        Iterable,
+        Literal,
+        Optional,
+    )
+
+    from .core.protocols.metrics import MetricsProtocol
 
 logger = getLogger(__name__)
 
 
+def _listener_name(listener: Any) -> str:
+    """A name for metrics which is the same for every call, unlike a repr with a address in it"""
+    while isinstance(listener, partial):
+        listener = listener.func
+    name: Optional[str] = getattr(listener, "__qualname__", None)
+    if name is None:
+        # Instances of callable classes
+        return type(listener).__qualname__
+    return name
+
+
+def run_in_executor(
+    func: Callable[..., Any],
+    executor: Optional[Executor] = None,
+    *,
+    arguments: Optional[Callable[..., tuple[Any, ...]]] = None,
+) -> Callable[..., Awaitable[Any]]:
+    """Wrap a plain function into a listener which runs it in a executor.
+
+    Use a :class:`~concurrent.futures.ProcessPoolExecutor` for CPU heavy listeners.
+    The listener waits for the function, so partitioned dispatchers keep running it in order.
+
+    Parameters
+    ----------
+    func:
+        The function to run. This has to be picklable for process pools
+    executor: :class:`Optional[Executor]`
+        The executor to run it in. None uses the default executor of the loop
+    arguments:
+        Gets the dispatch arguments and returns the arguments to call ``func`` with.
+        Use this to leave out arguments which cannot be sent to another process, like the shard.
+
+    Returns
+    -------
+    A coroutine function which can be passed to :meth:`Dispatcher.add_listener`
+    """
+
+    async def listener(*args: Any) -> Any:
+        if arguments is not None:
+            args = arguments(*args)
+        return await get_event_loop().run_in_executor(executor, func, *args)
+
+    return listener
+
+
 class Dispatcher:
-    def __init__(self) -> None:
+    """Calls listeners when events are dispatched.
+
+    Listeners can be plain functions or coroutine functions. Plain functions are called directly.
+
+    Parameters
+    ----------
+    inline: :class:`bool`
+        Await coroutines in a pool of worker tasks instead of creating a task per listener call.
+        One worker runs calls which do not wait one after another, more are started while calls wait.
+        A slow listener delays the calls queued behind it once every worker is busy.
+    concurrency: :class:`int`
+        How many coroutines run at the same time in inline mode.
+    max_queue: :class:`Optional[int]`
+        How many listener calls can wait for a worker before ``overflow`` kicks in. None for unbounded.
+        Setting this turns on inline mode.
+    overflow: :class:`str`
+        What to do when the queue is full
+
+        - ``block``: Keep queueing, :attr:`blocked` is set until the queue has room. See :meth:`drain`
+        - ``drop_oldest``: Drop the listener call which has waited the longest
+        - ``drop_events``: Drop new calls for ``droppable_events``, block for every other event
+    droppable_events: :class:`Iterable[Any]`
+        The events which can be dropped with the ``drop_events`` overflow policy
+    partition: :class:`Optional[Callable[..., Hashable]]`
+        Gets the dispatch arguments and returns a partition key, for example a guild id.
+        Listener calls in the same partition run one at a time in dispatch order, different partitions run
+        concurrently. Calls with a None key are not ordered. Predicates are checked outside of the partitions, so a
+        listener can wait for a later event of its own partition. Setting this turns on inline mode.
+    metrics: :class:`Optional[MetricsProtocol]`
+        Where to report listener run time, queue depth and dropped calls
+    name: :class:`str`
+        What to tag the measurements of this dispatcher with
+    """
+
+    def __init__(
+        self,
+        *,
+        inline: bool = False,
+        concurrency: int = 256,
+        max_queue: Optional[int] = None,
+        overflow: Literal["block", "drop_oldest", "drop_events"] = "block",
+        droppable_events: Iterable[Any] = (),
+        partition: Optional[Callable[..., Hashable]] = None,
+        metrics: Optional[MetricsProtocol] = None,
+        name: str = "",
+    ) -> None:
+        self.inline: bool = inline or max_queue is not None or partition is not None
+        self.concurrency: int = concurrency
+        self.max_queue: Optional[int] = max_queue
+        self.overflow: Literal["block", "drop_oldest", "drop_events"] = overflow
+        self.droppable_events: frozenset[Any] = frozenset(droppable_events)
+        self.partition: Optional[Callable[..., Hashable]] = partition
         self.listeners: defaultdict[Any, list[Any]] = defaultdict(list)
-        self.predicates: defaultdict[Any, list[tuple[Any, Any]]] = defaultdict(list)
+        # Predicates are one-shot, keyed by the id add_predicate returned so they can be removed in O(1)
+        self.predicates: defaultdict[Any, dict[int, tuple[Any, Any]]] = defaultdict(dict)
         self.global_listeners: list[Any] = []
+        self.name: str = name
+        # None when disabled, so the hot path only has to check this
+        self._metrics: Optional[MetricsProtocol] = metrics if metrics is not None and metrics.enabled else None
         self._loop = get_event_loop()
+        self._predicate_ids = count()
+
+        # Inline mode
+        self._queue: deque[tuple[Any, Hashable, Coroutine[Any, Any, Any]]] = deque()
+        self._workers: int = 0
+        # Workers which are not running a call. A new worker is only started if there is none
+        self._idle_workers: int = 0
+        self._spawn_scheduled: bool = False
+        # Partitions with a running call, and the calls waiting for it in order
+        self._partitions: dict[Hashable, deque[tuple[Any, Coroutine[Any, Any, Any]]]] = {}
+        self._partitioned: int = 0
+        self._drain_waiter: Optional[Future[None]] = None
+
+        # Metrics
+        self.max_queue_depth: int = 0
+        """The deepest the queue has been"""
+        self.dropped: Counter[Any] = Counter()
+        """How many listener calls were dropped by event name"""
+
+    @property
+    def queue_depth(self) -> int:
+        """How many listener calls are waiting for a worker or for their partition"""
+        return len(self._queue) + self._partitioned
+
+    @property
+    def blocked(self) -> bool:
+        """If the queue is full and event producers should wait for :meth:`drain`"""
+        return self.max_queue is not None and self.overflow != "drop_oldest" and self.queue_depth >= self.max_queue
+
+    async def drain(self) -> None:
+        """Wait until the queue has room again"""
+        while self.blocked:
+            if self._drain_waiter is None:
+                self._drain_waiter = self._loop.create_future()
+            await self._drain_waiter
 
     def dispatch(self, event_name: Any, *args: Any) -> None:
         logger.debug("Dispatching event %s", event_name)
+        key = None if self.partition is None else self.partition(*args)
         # Normal listeners
-        for listener in self.listeners[event_name]:
-            self._loop.create_task(listener(*args))
+        for listener in self.listeners.get(event_name, ()):
+            self._call(event_name, key, listener, *args)
 
-        # Predicates
-        for predicate_info in self.predicates:
-            self._loop.create_task(self._dispatch_predicate(predicate_info, event_name, *args))
+        # Predicates. Not partitioned, a listener waiting for one would otherwise hold up its own partition forever
+        predicates = self.predicates.get(event_name)
+        if predicates:
+            self._call(event_name, None, self._dispatch_predicates, event_name, list(predicates.items()), *args)
 
         for listener in self.global_listeners:
-            self._loop.create_task(listener(event_name, *args))
+            self._call(event_name, key, listener, event_name, *args)
 
-    async def _dispatch_predicate(self, predicate_info: Any, event_name: Any, *args: Any) -> None:
-        predicate = predicate_info[0]
-        listener = predicate_info[1]
-        result = await predicate(*args)
+    def _call(self, event_name: Any, key: Hashable, listener: Callable[..., Any], *args: Any) -> None:
+        metrics = self._metrics
+        try:
+            if metrics is None:
+                result = listener(*args)
+            else:
+                started_at = perf_counter()
+                result = listener(*args)
+                if not iscoroutine(result):
+                    self._observe(event_name, _listener_name(listener), started_at)
+        except Exception:
+            # A plain function failed, this should not take down whatever dispatched the event
+            logger.exception("Ignoring exception in listener")
+            return
+        if not iscoroutine(result):
+            # Plain function, already done
+            return
+        if not self.inline:
+            self._loop.create_task(result if metrics is None else self._run(event_name, result))
+            return
 
-        if result:
+        queue = self._queue
+        if self.max_queue is not None and self.queue_depth >= self.max_queue:
+            if self.overflow == "drop_oldest":
+                if not queue:
+                    # Everything waiting is held by a partition, which cannot be reordered
+                    self._drop(event_name, result)
+                    return
+                dropped_event_name, _, dropped = queue.popleft()
+                self._drop(dropped_event_name, dropped)
+            elif self.overflow == "drop_events" and event_name in self.droppable_events:
+                self._drop(event_name, result)
+                return
+        queue.append((event_name, key, result))
+        depth = len(queue) + self._partitioned
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        if metrics is not None:
+            metrics.gauge("dispatcher.queue", depth, {"dispatcher": self.name})
+        if not self._idle_workers and self._workers < self.concurrency:
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        self._workers += 1
+        self._idle_workers += 1
+        self._loop.create_task(self._worker())
+
+    def _spawn_if_busy(self) -> None:
+        # Runs once the worker which scheduled it yields. If its call finished without waiting it already went on
+        # with the queue, so only calls which actually wait get another worker
+        self._spawn_scheduled = False
+        if self._queue and not self._idle_workers and self._workers < self.concurrency:
+            self._start_worker()
+
+    def _drop(self, event_name: Any, coro: Coroutine[Any, Any, Any]) -> None:
+        coro.close()
+        self.dropped[event_name] += 1
+        if self._metrics is not None:
+            self._metrics.increment("dispatcher.dropped", 1, {"dispatcher": self.name, "event": str(event_name)})
+        logger.debug("Dropped a %s listener call as the queue is full", event_name)
+
+    async def _worker(self) -> None:
+        # Workers exit once the queue is empty, so a idle dispatcher holds no tasks
+        queue = self._queue
+        partitions = self._partitions
+        try:
+            while queue:
+                event_name, key, coro = queue.popleft()
+                if key is not None:
+                    waiting = partitions.get(key)
+                    if waiting is not None:
+                        # Another worker is running this partition, it will run this call after its current one
+                        waiting.append((event_name, coro))
+                        self._partitioned += 1
+                        continue
+                    waiting = partitions[key] = deque()
+
+                self._idle_workers -= 1
+                try:
+                    if queue and not self._spawn_scheduled:
+                        self._spawn_scheduled = True
+                        self._loop.call_soon(self._spawn_if_busy)
+                    if self._drain_waiter is not None:
+                        self._wake_drain()
+                    await self._run(event_name, coro)
+
+                    if key is not None:
+                        while waiting:
+                            event_name, coro = waiting.popleft()
+                            self._partitioned -= 1
+                            if self._drain_waiter is not None:
+                                self._wake_drain()
+                            await self._run(event_name, coro)
+                        del partitions[key]
+                finally:
+                    self._idle_workers += 1
+        finally:
+            self._workers -= 1
+            self._idle_workers -= 1
+
+    async def _run(self, event_name: Any, coro: Coroutine[Any, Any, Any]) -> None:
+        started_at = 0.0 if self._metrics is None else perf_counter()
+        try:
+            await coro
+        except Exception:
+            logger.exception("Ignoring exception in listener")
+        if self._metrics is not None:
+            self._observe(event_name, _listener_name(coro), started_at)
+
+    def _observe(self, event_name: Any, listener_name: str, started_at: float) -> None:
+        tags = {"dispatcher": self.name, "event": str(event_name), "listener": listener_name}
+        self._metrics.observe("dispatcher.listener", perf_counter() - started_at, tags)  # type: ignore
+
+    def _wake_drain(self) -> None:
+        if self._drain_waiter is not None and not self.blocked:
+            if not self._drain_waiter.done():
+                self._drain_waiter.set_result(None)
+            self._drain_waiter = None
+
+    async def _dispatch_predicates(
+        self, event_name: Any, predicates: list[tuple[int, tuple[Any, Any]]], *args: Any
+    ) -> None:
+        if len(predicates) == 1:
+            predicate_id, (predicate, listener) = predicates[0]
+            await self._check_predicate(event_name, predicate_id, predicate, listener, *args)
+            return
+        # Checked concurrently so a slow predicate does not hold up the others
+        await gather(
+            *(
+                self._check_predicate(event_name, predicate_id, predicate, listener, *args)
+                for predicate_id, (predicate, listener) in predicates
+            )
+        )
+
+    async def _check_predicate(
+        self, event_name: Any, predicate_id: int, predicate: Any, listener: Any, *args: Any
+    ) -> None:
+        if predicate_id not in self.predicates.get(event_name, ()):
+            # Removed or already succeeded on an earlier event
+            return
+        try:
+            result = await predicate(*args)
+        except Exception:
+            logger.exception("Ignoring exception in predicate")
+            return
+
+        if result and self.remove_predicate(event_name, predicate_id):
             logger.debug("Predicate succeeded, calling listener")
-            self.predicates[event_name].remove(predicate_info)
-            self._loop.create_task(listener(*args))  # TODO: Should we just await here?
+            self._call(event_name, None, listener, *args)
+
+    def has_listeners(self, event_name: Any) -> bool:
+        """Check if dispatching a event would call anything
+
+        Parameters
+        ----------
+        event_name:
+            The event to check
+        """
+        return bool(self.global_listeners or self.listeners.get(event_name) or self.predicates.get(event_name))
 
     def listen(self, event_name: Any = None) -> Callable[[Any], Callable[..., Awaitable[Any]]]:
         # TODO: Fix type
@@ -71,8 +376,48 @@ class Dispatcher:
 
         return inner
 
-    def add_predicate(self, event_name: Any, predicate: Any, callback: Any) -> None:
-        self.predicates[event_name].append((predicate, callback))
+    def add_predicate(self, event_name: Any, predicate: Any, callback: Any) -> int:
+        """Call a callback once, the first time a event passes the predicate
+
+        Parameters
+        ----------
+        event_name:
+            The event to check
+        predicate:
+            A coroutine function which gets the event arguments and returns if the callback should be called
+        callback:
+            A coroutine function which gets the event arguments
+
+        Returns
+        -------
+        :class:`int`
+            A id which can be passed to :meth:`remove_predicate`
+        """
+        predicate_id = next(self._predicate_ids)
+        self.predicates[event_name][predicate_id] = (predicate, callback)
+        return predicate_id
+
+    def remove_predicate(self, event_name: Any, predicate_id: int) -> bool:
+        """Remove a predicate before it succeeded, for example when waiting for it timed out
+
+        Parameters
+        ----------
+        event_name:
+            The event the predicate was added to
+        predicate_id: :class:`int`
+            The id :meth:`add_predicate` returned
+
+        Returns
+        -------
+        :class:`bool`
+            If the predicate was removed. False if it already succeeded or was removed
+        """
+        predicates = self.predicates.get(event_name)
+        if predicates is None or predicates.pop(predicate_id, None) is None:
+            return False
+        if not predicates:
+            del self.predicates[event_name]
+        return True
 
     def add_listener(self, listener: Any, event_name: Any = None) -> None:
         if event_name is None:
@@ -21,7 +21,7 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from attr import dataclass
+from attr import Factory, dataclass
 
 if TYPE_CHECKING:
     from typing import Type, TypeVar
@@ -30,9 +30,16 @@ if TYPE_CHECKING:
 
     from .core.gateway.protocols.gateway import GatewayProtocol
     from .core.gateway.protocols.shard import ShardProtocol
+    from .core.protocols.cache import CacheProtocol
     from .core.protocols.http import BucketProtocol, HTTPClientProtocol
 
 
+def _default_cache() -> Type[CacheProtocol]:
+    from .core.cache import Cache
+
+    return Cache
+
+
 @dataclass
 class TypeSheet:
     """A place for the library to store which component types we use when creating things.
@@ -42,17 +49,21 @@ class TypeSheet:
     http_client:
         The HTTP Client
     http_bucket:
-        The bucket used when creating new HTTP buckets. Used for HTTP ratelimiting
+        The bucket used when creating new HTTP buckets. Used for HTTP ratelimiting.
+        Use :meth:`SharedBucket.using <nextcord.core.ratelimit_store.SharedBucket.using>` to share ratelimits between processes
     gateway:
         The shard manager
     shard:
         The connections to discord spawned by :class:`GatewayProtocol`
+    cache:
+        Where entities from gateway events are kept. Defaults to :class:`Cache <nextcord.core.cache.Cache>`
     """
 
     http_client: Type[HTTPClientProtocol]
     http_bucket: Type[BucketProtocol]
     gateway: Type[GatewayProtocol]
     shard: Type[ShardProtocol]
+    cache: Type[CacheProtocol] = Factory(_default_cache)
 
     @classmethod
     def default(cls: Type[T]) -> T:
@@ -63,6 +74,7 @@ class TypeSheet:
         TypeSheet
         """
         # TODO: Possibly make this cleaner?
+        from .core.cache import Cache
         from .core.gateway.gateway import Gateway
         from .core.gateway.shard import Shard
         from .core.http import Bucket as DefaultBucket
@@ -73,4 +85,5 @@ class TypeSheet:
             http_bucket=DefaultBucket,
             gateway=Gateway,
             shard=Shard,
+            cache=Cache,
         )
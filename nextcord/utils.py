@@ -18,9 +18,31 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
-__all__ = ("json",)
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+__all__ = ("json", "json_loads", "json_dumps")
 
 try:
     import orjson as json
 except ModuleNotFoundError:
     import json  # type: ignore
+
+if TYPE_CHECKING:
+    from typing import Any, Union
+
+
+def json_loads(data: Union[bytes, bytearray, memoryview]) -> Any:
+    """Parse JSON from a bytes-like object. orjson reads it directly, the standard library needs it decoded first."""
+    if json.__name__ == "orjson":
+        return json.loads(data)
+    return json.loads(str(data, "utf-8"))
+
+
+def json_dumps(obj: Any) -> str:
+    """Serialize JSON to a str. orjson returns bytes, which aiohttp cannot send as a JSON body."""
+    data = json.dumps(obj)
+    if isinstance(data, bytes):
+        return data.decode("utf-8")
+    return data
@@ -0,0 +1,121 @@
+from asyncio import run, sleep
+
+from nextcord import Client, Intents
+from nextcord.core.cache import LRU, TTL, Cache, NoCache, Unbounded
+from nextcord.type_sheet import TypeSheet
+
+
+def user(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0001", "avatar": None}
+
+
+def guild_create(guild_id, member_ids):
+    return {
+        "id": str(guild_id),
+        "name": "guild",
+        "owner_id": "1",
+        "icon": None,
+        "member_count": len(member_ids),
+        "channels": [{"id": str(guild_id + 1), "type": 0, "name": "general", "position": 0}],
+        "members": [{"user": user(member_id), "roles": ["10", "11"], "nick": None} for member_id in member_ids],
+    }
+
+
+def test_cache_follows_events():
+    async def inner():
+        client = Client("token", Intents(), cache_policies={"members": Unbounded(), "users": Unbounded()})
+        cache = client.state.cache
+        dispatch = client.state.gateway.event_dispatcher.dispatch
+
+        dispatch("GUILD_CREATE", None, guild_create(100, [1, 2]))
+        assert cache.get_guild(100).name == "guild"
+        assert cache.get_channel(101).guild_id == 100
+        assert cache.get_member(100, 2).roles == (10, 11)
+        assert cache.get_user(2).username == "user2"
+
+        dispatch("GUILD_MEMBER_UPDATE", None, {"guild_id": "100", "user": user(2), "roles": [], "nick": "two"})
+        assert cache.get_member(100, 2).nick == "two"
+        dispatch("GUILD_MEMBER_REMOVE", None, {"guild_id": "100", "user": user(1)})
+        assert cache.get_member(100, 1) is None
+
+        message = {"id": "500", "channel_id": "101", "guild_id": "100", "author": user(3), "content": "hi"}
+        dispatch("MESSAGE_CREATE", None, message)
+        dispatch("MESSAGE_UPDATE", None, {"id": "500", "channel_id": "101", "content": "edited"})
+        assert cache.get_message(500).content == "edited"
+        dispatch("MESSAGE_DELETE", None, {"id": "500", "channel_id": "101"})
+        assert cache.get_message(500) is None
+
+        dispatch("GUILD_DELETE", None, {"id": "100"})
+        assert cache.get_guild(100) is None
+        assert cache.get_channel(101) is None
+        assert cache.get_member(100, 2) is None, "Members should be removed with their guild"
+        assert not cache._guild_members and not cache._guild_channels, "The guild index should be cleaned up"
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_cache_policies():
+    async def inner():
+        policies = {"members": LRU(2), "users": NoCache(), "messages": TTL(0.01)}
+        client = Client("token", Intents(), cache_policies=policies)
+        cache = client.state.cache
+        dispatch = client.state.gateway.event_dispatcher.dispatch
+
+        dispatch("GUILD_CREATE", None, guild_create(100, [1, 2]))
+        cache.get_member(100, 1)  # Mark as recently used
+        dispatch("GUILD_MEMBER_ADD", None, {"guild_id": "100", "user": user(3), "roles": []})
+        assert cache.get_member(100, 2) is None, "The least recently used member should be evicted"
+        assert cache._guild_members[100] == {1, 3}, "Evicted members should be removed from the guild index"
+        assert cache.get_member(100, 1) is not None and cache.get_member(100, 3) is not None
+        assert cache.get_user(1) is None
+
+        dispatch("MESSAGE_CREATE", None, {"id": "500", "channel_id": "101", "author": user(3), "content": "hi"})
+        assert cache.get_message(500) is not None
+        await sleep(0.02)
+        assert cache.get_message(500) is None, "Messages should expire"
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_members_are_opt_in():
+    async def inner():
+        client = Client("token", Intents())
+        cache = client.state.cache
+
+        client.state.gateway.event_dispatcher.dispatch("GUILD_CREATE", None, guild_create(100, [1, 2]))
+        assert cache.get_guild(100) is not None
+        assert cache.get_member(100, 1) is None and cache.get_user(1) is None
+        assert not client.state.gateway.event_dispatcher.has_listeners("GUILD_MEMBER_ADD")
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_deleting_uncached_entities(caplog):
+    async def inner():
+        client = Client("token", Intents(), cache_policies={"members": Unbounded(), "messages": LRU(10)})
+        cache = client.state.cache
+        dispatch = client.state.gateway.event_dispatcher.dispatch
+
+        dispatch("GUILD_DELETE", None, {"id": "5"})
+        dispatch("CHANNEL_DELETE", None, {"id": "6", "type": 0})
+        dispatch("GUILD_MEMBER_REMOVE", None, {"guild_id": "5", "user": user(7)})
+        dispatch("MESSAGE_DELETE", None, {"id": "8", "channel_id": "6"})
+        dispatch("MESSAGE_DELETE_BULK", None, {"ids": ["8", "9"], "channel_id": "6"})
+
+        # The guild is gone from the cache, its channels and members still have to be cleaned up
+        dispatch("GUILD_CREATE", None, guild_create(100, [1]))
+        cache.guilds.pop(100)
+        dispatch("GUILD_DELETE", None, {"id": "100"})
+        assert cache.get_channel(101) is None and cache.get_member(100, 1) is None
+        assert not [record for record in caplog.records if record.exc_info], "Deletes should not raise"
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_type_sheet_defaults_to_cache():
+    default = TypeSheet.default()
+    assert TypeSheet(default.http_client, default.http_bucket, default.gateway, default.shard).cache is Cache
@@ -0,0 +1,83 @@
+import zlib
+
+from pytest import mark
+
+from nextcord.core.gateway.compression import ZlibStreamInflater, ZstdStreamInflater, zstandard
+from nextcord.core.gateway.exceptions import BadDataException, PartialDataException
+
+
+def compress_messages(*messages: bytes) -> list[bytes]:
+    compressor = zlib.compressobj()
+    return [compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH) for message in messages]
+
+
+def feed_split(inflater: ZlibStreamInflater, frame: bytes, split_at: int) -> bytes:
+    try:
+        inflater.decompress(frame[:split_at])
+    except PartialDataException:
+        ...
+    else:
+        assert False, "Partial frames should not return data"
+    return bytes(inflater.decompress(frame[split_at:]))
+
+
+def test_single_frame_messages():
+    inflater = ZlibStreamInflater()
+    messages = [b'{"op": 10}', b'{"op": 11}']
+    for message, frame in zip(messages, compress_messages(*messages)):
+        assert bytes(inflater.decompress(frame)) == message
+
+
+def test_message_split_over_frames():
+    inflater = ZlibStreamInflater(buffer_size=16)
+    messages = [b"a" * 1000 + b"b" * 1000, b'{"op": 11}']
+    frames = compress_messages(*messages)
+
+    assert feed_split(inflater, frames[0], 10) == messages[0]
+    # Suffix split between frames
+    assert feed_split(inflater, frames[1], len(frames[1]) - 2) == messages[1]
+    assert len(inflater._buffer) == 16, "The buffer should shrink back after a big message"
+
+
+def test_max_size():
+    inflater = ZlibStreamInflater(max_size=100)
+    try:
+        inflater.decompress(compress_messages(b"a" * 1000)[0])
+    except BadDataException:
+        ...
+    else:
+        assert False, "Messages over the max size should error"
+
+
+def test_max_size_reached_between_frames():
+    message = bytes(range(256)) * 16
+    frame = compress_messages(message)[0]
+    split_at = len(frame) // 2
+    # The first part of the message inflates to exactly the max size
+    inflater = ZlibStreamInflater(max_size=len(zlib.decompressobj().decompress(frame[:split_at])))
+    try:
+        feed_split(inflater, frame, split_at)
+    except BadDataException:
+        ...
+    else:
+        assert False, "The max size should still apply once it is reached"
+
+
+def compress_zstd_messages(*messages: bytes) -> list[bytes]:
+    compressor = zstandard.ZstdCompressor().compressobj()
+    return [compressor.compress(message) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) for message in messages]
+
+
+@mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_zstd_max_size():
+    inflater = ZstdStreamInflater(max_size=1000)
+    messages = [b'{"op": 10}' * 50, b"a" * 1_000_000]
+    frames = compress_zstd_messages(*messages)
+
+    assert inflater.decompress(frames[0]) == messages[0]
+    try:
+        inflater.decompress(frames[1])
+    except BadDataException:
+        ...
+    else:
+        assert False, "Messages over the max size should error"
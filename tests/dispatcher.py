@@ -0,0 +1,235 @@
+from asyncio import Event, get_running_loop, run, sleep, wait_for
+
+from nextcord.dispatcher import Dispatcher
+
+
+async def is_wanted(value):
+    return value == "wanted"
+
+
+def test_predicates_are_indexed_by_event():
+    async def inner():
+        dispatcher = Dispatcher()
+        called = []
+
+        async def callback(value):
+            called.append(value)
+
+        checked_other = []
+
+        async def never(value):
+            checked_other.append(value)
+
+        for _ in range(1000):
+            dispatcher.add_predicate("OTHER", never, callback)
+        dispatcher.add_predicate("EVENT", is_wanted, callback)
+        removed = dispatcher.add_predicate("EVENT", is_wanted, callback)
+        assert dispatcher.remove_predicate("EVENT", removed)
+
+        dispatcher.dispatch("EVENT", "unwanted")
+        dispatcher.dispatch("EVENT", "wanted")
+        dispatcher.dispatch("EVENT", "wanted")
+        await sleep(0.01)
+
+        assert called == ["wanted"], "Predicates should only succeed once"
+        assert "EVENT" not in dispatcher.predicates, "Empty predicate indexes should be cleaned up"
+        assert len(dispatcher.predicates["OTHER"]) == 1000
+        assert not checked_other, "Predicates of other events should not be checked"
+
+    run(inner())
+
+
+def test_predicates_are_isolated():
+    async def inner():
+        dispatcher = Dispatcher()
+        called = []
+
+        async def broken(_):
+            raise ValueError()
+
+        async def slow(_):
+            await sleep(1)
+            return True
+
+        dispatcher.add_predicate("EVENT", broken, called.append)
+        dispatcher.add_predicate("EVENT", slow, called.append)
+        dispatcher.add_predicate("EVENT", is_wanted, called.append)
+        dispatcher.dispatch("EVENT", "wanted")
+        await sleep(0.01)
+
+        assert called == ["wanted"], "A failing or slow predicate should not hold up the others"
+
+    run(inner())
+
+
+def test_inline_dispatch():
+    async def inner():
+        dispatcher = Dispatcher(inline=True, concurrency=2)
+        called = []
+        running = 0
+        max_running = 0
+
+        async def slow(value):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await sleep(0)
+            running -= 1
+            called.append(value)
+
+        async def broken(_):
+            raise ValueError()
+
+        def broken_sync(_):
+            raise ValueError()
+
+        dispatcher.add_listener(broken_sync, "SYNC")
+        dispatcher.add_listener(called.append, "SYNC")
+        dispatcher.add_listener(slow, "ASYNC")
+        dispatcher.add_listener(broken, "ASYNC")
+
+        dispatcher.dispatch("SYNC", 0)
+        assert called == [0], "Plain functions should be called without a task, after a failing one"
+
+        for value in range(1, 6):
+            dispatcher.dispatch("ASYNC", value)
+        await sleep(0.01)
+
+        assert sorted(called) == [0, 1, 2, 3, 4, 5]
+        assert max_running <= 2, "Inline dispatch should respect the concurrency limit"
+        assert dispatcher._workers == 0, "Workers should exit once the queue is empty"
+
+    run(inner())
+
+
+def test_inline_workers_start_when_calls_wait():
+    async def inner():
+        dispatcher = Dispatcher(inline=True, concurrency=4)
+        started = 0
+        start_worker = dispatcher._start_worker
+
+        def counting_start_worker():
+            nonlocal started
+            started += 1
+            start_worker()
+
+        dispatcher._start_worker = counting_start_worker
+        handled = []
+        release = Event()
+
+        async def fast(value):
+            handled.append(value)
+
+        async def slow(value):
+            await release.wait()
+            handled.append(value)
+
+        dispatcher.add_listener(fast, "FAST")
+        dispatcher.add_listener(slow, "SLOW")
+        for value in range(100):
+            dispatcher.dispatch("FAST", value)
+        await sleep(0.01)
+        assert len(handled) == 100 and started == 1, "Calls which never wait should share one worker"
+
+        for value in range(10):
+            dispatcher.dispatch("SLOW", value)
+        for _ in range(10):
+            await sleep(0)
+        assert dispatcher._workers == 4, "Waiting calls should get more workers up to the concurrency"
+        release.set()
+        await sleep(0.01)
+        assert len(handled) == 110 and dispatcher._workers == 0 and dispatcher._idle_workers == 0
+
+    run(inner())
+
+
+def test_bounded_queue_overflow():
+    async def inner():
+        handled = []
+
+        async def listener(event_name, value):
+            handled.append((event_name, value))
+
+        drop_oldest = Dispatcher(concurrency=1, max_queue=2, overflow="drop_oldest")
+        drop_oldest.add_listener(listener)
+        for value in range(5):
+            drop_oldest.dispatch("EVENT", value)
+        assert drop_oldest.queue_depth == 2
+        assert not drop_oldest.blocked, "drop_oldest should never block"
+        await sleep(0.01)
+        assert handled == [("EVENT", 3), ("EVENT", 4)]
+        assert drop_oldest.dropped["EVENT"] == 3
+
+        handled.clear()
+        drop_events = Dispatcher(concurrency=1, max_queue=1, overflow="drop_events", droppable_events={"TYPING_START"})
+        drop_events.add_listener(listener)
+        drop_events.dispatch("MESSAGE_CREATE", 0)
+        drop_events.dispatch("TYPING_START", 1)
+        drop_events.dispatch("MESSAGE_CREATE", 2)
+        assert drop_events.blocked, "Events which cannot be dropped should block"
+        assert drop_events.max_queue_depth == 2
+        await drop_events.drain()
+        await sleep(0.01)
+        assert handled == [("MESSAGE_CREATE", 0), ("MESSAGE_CREATE", 2)]
+        assert drop_events.dropped == {"TYPING_START": 1}
+
+    run(inner())
+
+
+def test_partitioned_dispatch():
+    async def inner():
+        dispatcher = Dispatcher(partition=lambda data: data["guild_id"])
+        handled = []
+        running = set()
+        overlapped = False
+
+        async def listener(data):
+            nonlocal overlapped
+            if running:
+                overlapped = True
+            running.add(data["guild_id"])
+            # Later events of the same guild finish faster, they would overtake without ordering
+            await sleep(0.005 / data["n"])
+            running.discard(data["guild_id"])
+            handled.append((data["guild_id"], data["n"]))
+
+        dispatcher.add_listener(listener, "MESSAGE_UPDATE")
+        for n in range(1, 4):
+            for guild_id in (1, 2):
+                dispatcher.dispatch("MESSAGE_UPDATE", {"guild_id": guild_id, "n": n})
+        await sleep(0.05)
+
+        for guild_id in (1, 2):
+            assert [n for guild, n in handled if guild == guild_id] == [1, 2, 3], "Partitions should run in order"
+        assert overlapped, "Different partitions should run concurrently"
+        assert dispatcher.queue_depth == 0 and not dispatcher._partitions
+
+    run(inner())
+
+
+def test_wait_for_inside_partition():
+    async def inner():
+        dispatcher = Dispatcher(partition=lambda data: data["guild_id"])
+        replies = []
+
+        async def listener(data):
+            if data["content"] != "ping":
+                return
+            reply = get_running_loop().create_future()
+
+            async def is_reply(data):
+                return data["content"] == "pong"
+
+            dispatcher.add_predicate("MESSAGE_CREATE", is_reply, reply.set_result)
+            # The reply is in the same partition, which is busy running this listener
+            replies.append(await wait_for(reply, 1))
+
+        dispatcher.add_listener(listener, "MESSAGE_CREATE")
+        dispatcher.dispatch("MESSAGE_CREATE", {"guild_id": 1, "content": "ping"})
+        await sleep(0)
+        dispatcher.dispatch("MESSAGE_CREATE", {"guild_id": 1, "content": "pong"})
+        await sleep(0.05)
+
+        assert replies == [{"guild_id": 1, "content": "pong"}], "Predicates should not wait for the partition"
+
+    run(inner())
@@ -0,0 +1,50 @@
+from nextcord.core.gateway import etf
+from nextcord.core.gateway.exceptions import BadDataException
+
+
+def test_decode_discord_payload():
+    # term_to_binary(#{op => 10, d => #{heartbeat_interval => 41250}})
+    data = b"\x83t\x00\x00\x00\x02w\x02opa\x0aw\x01dt\x00\x00\x00\x01" b"w\x12heartbeat_intervalb\x00\x00\xa1\x22"
+    assert etf.py_loads(data) == {"op": 10, "d": {"heartbeat_interval": 41250}}
+
+
+def test_round_trip():
+    payload = {
+        "op": 2,
+        "d": {
+            "token": "token",
+            "shard": [1, 2],
+            "presence": None,
+            "compress": False,
+            "large": 2**70,
+            "negative": -(2**40),
+            "small_negative": -5,
+            "float": 1.5,
+            "empty": [],
+            "unicode": "ünïcödé",
+        },
+    }
+    assert etf.py_loads(etf.py_dumps(payload)) == payload
+
+
+def test_corrupted_data():
+    data = etf.py_dumps({"op": 0, "d": {"content": "hello", "id": 2**40}})
+    for end in range(1, len(data)):
+        try:
+            etf.py_loads(data[:end])
+        except BadDataException:
+            pass
+        else:
+            raise AssertionError(f"Truncating at {end} should raise BadDataException")
+
+
+class Atom(str):
+    ...
+
+
+def test_erlpack_types_are_normalised():
+    # What erlpack.unpack returns for a dispatch payload
+    unpacked = {Atom("op"): 0, Atom("d"): {b"content": b"h\xc3\xa9llo", b"embeds": [], b"pair": (Atom("a"), 1)}}
+    normalised = etf._normalise(unpacked)
+    assert normalised == {"op": 0, "d": {"content": "héllo", "embeds": [], "pair": ("a", 1)}}
+    assert all(type(key) is str for key in normalised) and type(normalised["d"]["pair"][0]) is str
@@ -0,0 +1,260 @@
+from asyncio import Event, get_running_loop, run, sleep
+from collections import defaultdict
+from queue import SimpleQueue
+
+from aiohttp import WSMessage, WSMsgType
+
+from nextcord import Client, Intents, TypeSheet
+from nextcord.core.gateway import etf
+from nextcord.core.gateway.cluster import Cluster, _WorkerHandle
+from nextcord.core.gateway.identify import CONNECT_ATTEMPTS, IdentifyScheduler
+from nextcord.core.gateway.shard import Shard
+from nextcord.core.ratelimiter import TimesPer
+from nextcord.exceptions import NextcordException
+
+
+class FakeShard:
+    def __init__(self, state, shard_id, *, shard_count=None):
+        self.state = state
+        self.identifies = 0
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.ready = Event()
+        self.closed = False
+
+    async def connect(self):
+        async with self.state.gateway.get_identify_ratelimiter(self.shard_id):
+            self.identifies += 1
+        await sleep(0.01)
+        self.ready.set()
+
+    async def close(self):
+        self.closed = True
+
+    def receive(self, event_name, data):
+        self.state.gateway.handle_dispatch(self, event_name, data)
+
+
+def test_rescale_swaps_and_dedupes():
+    async def inner():
+        type_sheet = TypeSheet.default()
+        type_sheet.shard = FakeShard
+        client = Client("token", Intents(), type_sheet=type_sheet)
+        gateway = client.state.gateway
+        received = []
+        gateway.event_dispatcher.add_listener(lambda *args: received.append(args[1]) or sleep(0), "MESSAGE_CREATE")
+
+        gateway.shard_count = 1
+        gateway.identify_scheduler = IdentifyScheduler(
+            {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 2}
+        )
+        gateway.shards = [FakeShard(client.state, 0)]
+        old = gateway.shards[0]
+
+        rescale = client.state.loop.create_task(gateway.rescale(2))
+        await sleep(0)
+        new = gateway._pending_shard_set
+
+        # Seen by both sets
+        old.receive("MESSAGE_CREATE", {"id": "1"})
+        new[0].receive("MESSAGE_CREATE", {"id": "1"})
+        # Only seen by the new set before the swap
+        new[1].receive("MESSAGE_CREATE", {"id": "2"})
+
+        await rescale
+        old.receive("MESSAGE_CREATE", {"id": "3"})
+        await sleep(0)
+
+        assert gateway.shards == new, "New shards should be swapped in"
+        assert old.closed, "Old shards should be closed"
+        assert [data["id"] for data in received] == ["1", "2"], "Events should be deduped and replayed"
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_identify_scheduler_buckets():
+    async def inner():
+        type_sheet = TypeSheet.default()
+        type_sheet.shard = FakeShard
+        client = Client("token", Intents(), type_sheet=type_sheet)
+        gateway = client.state.gateway
+        scheduler = gateway.identify_scheduler = IdentifyScheduler(
+            {"total": 1000, "remaining": 10, "reset_after": 60_000, "max_concurrency": 4}
+        )
+        shards = [FakeShard(client.state, shard_id) for shard_id in range(4)]
+
+        await scheduler.connect(shards)
+
+        assert all(shard.identifies == 1 for shard in shards), "Every bucket should identify at once"
+        assert scheduler.identified == scheduler.total == 4
+        assert scheduler.session_starts_remaining == 6, "Identifies should count against the session start limit"
+        assert scheduler.eta == 0
+        await client.state.http.close()
+
+    run(inner())
+
+
+class BrokenShard(FakeShard):
+    async def connect(self):
+        self.identifies += 1
+        raise ConnectionResetError()
+
+
+def test_identify_scheduler_survives_failing_shards():
+    async def inner():
+        client = Client("token", Intents())
+        scheduler = IdentifyScheduler({"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 2})
+        broken = BrokenShard(client.state, 0)
+        shards = [broken, FakeShard(client.state, 1), FakeShard(client.state, 2)]
+        client.state.gateway.identify_scheduler = scheduler
+
+        await scheduler.connect(shards)
+
+        assert shards[2].identifies == 1, "A failing shard should not stop the rest of its bucket"
+        assert broken.identifies == CONNECT_ATTEMPTS, "Failing shards should be tried again"
+        assert scheduler.failed == [broken]
+        assert scheduler.identified == 2
+        await client.state.http.close()
+
+    run(inner())
+
+
+class NeverReadyShard(FakeShard):
+    async def connect(self):
+        async with self.state.gateway.get_identify_ratelimiter(self.shard_id):
+            self.identifies += 1
+
+
+def test_rescale_failures_keep_the_current_shards():
+    async def inner():
+        for shard_type in (BrokenShard, NeverReadyShard):
+            type_sheet = TypeSheet.default()
+            type_sheet.shard = shard_type
+            client = Client("token", Intents(), type_sheet=type_sheet)
+            gateway = client.state.gateway
+            gateway.rescale_timeout = 0.1
+            gateway.shard_count = 1
+            gateway.identify_scheduler = IdentifyScheduler(
+                {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 2}
+            )
+            gateway.shards = [FakeShard(client.state, 0)]
+            old = gateway.shards[0]
+
+            rescale = client.state.loop.create_task(gateway.rescale(2))
+            await sleep(0)
+            new = gateway._pending_shard_set
+            new[0].receive("MESSAGE_CREATE", {"id": "1"})
+            try:
+                await rescale
+            except NextcordException:
+                pass
+            else:
+                raise AssertionError("Rescaling should fail")
+
+            assert gateway.shards == [old] and not old.closed, "The current shards should keep running"
+            assert all(shard.closed for shard in new), "The new shards should be closed"
+            assert not gateway._recreating_shards and not gateway._pending_shard_set and not gateway._overlap_buffer
+            assert not gateway.should_reconnect(new[0])
+            await client.state.http.close()
+
+    run(inner())
+
+
+class FakeWebSocket:
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.close_code = None
+
+    async def __aiter__(self):
+        for payload in self.payloads:
+            yield WSMessage(WSMsgType.BINARY if isinstance(payload, bytes) else WSMsgType.TEXT, payload, None)
+
+
+def test_lazy_parsing_skips_unlistened_events():
+    async def inner():
+        client = Client("token", Intents(), lazy_parsing=True)
+        shard = Shard(client.state, 0)
+        parsed = []
+        received = []
+        # A global listener, which does not count as listening to dispatches
+        shard.opcode_dispatcher.add_listener(lambda _, data: parsed.append(data["s"]))
+        client.state.gateway.event_dispatcher.add_listener(lambda _, data: received.append(data), "MESSAGE_CREATE")
+
+        shard._ws = FakeWebSocket(
+            [
+                '{"t":"MESSAGE_CREATE","s":1,"op":0,"d":{"id":"1"}}',
+                # Not in the order discord sends, so the header cannot be read without parsing
+                '{"op":0,"d":{},"s":2,"t":"TYPING_START"}',
+                '{"t":"TYPING_START","s":3,"op":0,"d":{"channel_id":"1"}}',
+            ]
+        )
+        await shard._receive_loop()
+
+        assert received == [{"id": "1"}], "Listened events should be parsed and dispatched"
+        assert parsed == [1, 2], "Unlistened events should only be skipped if the header could be read"
+        assert shard._seq == 3, "Skipped events should still advance the sequence"
+        await client.state.http.close()
+
+    run(inner())
+
+
+def test_corrupted_etf_payloads_reconnect():
+    async def inner():
+        client = Client("token", Intents(), gateway_encoding="etf", gateway_compression=None)
+        shard = Shard(client.state, 0)
+        reconnects = []
+
+        async def connect():
+            reconnects.append(None)
+
+        shard.connect = connect
+        shard._ws = FakeWebSocket([etf.py_dumps({"op": 11, "d": None})[:-2]])
+        await shard._receive_loop()
+
+        assert reconnects == [None], "A corrupted payload should reconnect instead of stopping the shard"
+        await client.state.http.close()
+
+    run(inner())
+
+
+class FakeProcess:
+    def __init__(self, target, args, name, daemon):
+        self.args = args
+
+    def start(self):
+        pass
+
+
+class FakeContext:
+    Process = FakeProcess
+    Queue = SimpleQueue
+
+
+def test_cluster_drops_identifies_of_restarted_workers():
+    async def inner():
+        cluster = Cluster("token", Intents(), processes=1, shard_count=1)
+        cluster._loop = get_running_loop()
+        cluster._context = FakeContext()
+        cluster._identify_ratelimits = defaultdict(lambda: TimesPer(1, 0.5))
+        worker = cluster._workers[0] = _WorkerHandle(0, [0])
+
+        cluster._spawn(worker)
+        first_responses = worker.responses
+        cluster._handle_request(("identify", 0, worker.generation, 0, 0))
+        cluster._handle_request(("identify", 0, worker.generation, 1, 0))
+        await sleep(0.05)
+        assert first_responses.get_nowait() == ("identify", 0)
+
+        # The worker dies while its second identify waits, and its replacement starts counting requests from 0 again
+        cluster._spawn(worker)
+        assert worker.responses is not first_responses, "A restarted worker should get a new response queue"
+        cluster._handle_request(("identify", 0, worker.generation, 0, 0))
+
+        await sleep(0.7)
+        assert worker.responses.empty(), "The grant for the dead worker should not release the new one's request"
+        assert first_responses.empty()
+        await sleep(0.5)
+        assert worker.responses.get_nowait() == ("identify", 0)
+
+    run(inner())
@@ -0,0 +1,375 @@
+from asyncio import TimeoutError as AsyncioTimeoutError
+from asyncio import ensure_future, gather, run, sleep
+from email.utils import formatdate
+from time import time
+
+from aiohttp import web
+
+from nextcord.client.state import State
+from nextcord.core.bulk import BulkOperation, bulk_request
+from nextcord.core.http import Bucket, HTTPClient, Route, RouteTemplate
+from nextcord.type_sheet import TypeSheet
+
+
+class FakeClient:
+    ...
+
+
+def make_http() -> HTTPClient:
+    state = State(FakeClient(), TypeSheet.default(), "token", 0, None)  # type: ignore
+    return state.http  # type: ignore
+
+
+def test_routes_with_same_bucket_hash_share_bucket():
+    async def inner():
+        http = make_http()
+        send = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+        edit = Route("PATCH", "/channels/{channel_id}/messages/{message_id}", channel_id=1, message_id=2)
+
+        send_bucket = http._get_bucket(send)
+        assert http._get_bucket(edit) is not send_bucket, "Routes should be separate before the hash is known"
+
+        http._set_bucket_hash(send, send_bucket, "abcd")
+        http._set_bucket_hash(edit, http._get_bucket(edit), "abcd")
+        assert http._get_bucket(edit) is send_bucket, "Routes under the same hash should share a bucket"
+        await http.close()
+
+    run(inner())
+
+
+def test_major_parameters_split_buckets():
+    async def inner():
+        http = make_http()
+        first = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+        second = Route("POST", "/channels/{channel_id}/messages", channel_id=2)
+
+        http._set_bucket_hash(first, http._get_bucket(first), "abcd")
+        assert http._get_bucket(first) is not http._get_bucket(second), "Major parameters should split buckets"
+        await http.close()
+
+    run(inner())
+
+
+def test_bucket_releases_in_order():
+    async def inner():
+        bucket = Bucket(Route("GET", "/gateway"))
+        order = []
+
+        async def request(number: int):
+            async with bucket:
+                order.append(number)
+                await sleep(0)
+
+        await gather(*(request(number) for number in range(5)))
+        assert order == list(range(5)), "Requests should run in the order they were made"
+        assert bucket._reserved == 0, "All reservations should be given back"
+
+    run(inner())
+
+
+def test_bucket_waits_for_info():
+    async def inner():
+        bucket = Bucket(Route("GET", "/gateway"))
+        await bucket.__aenter__()
+
+        second = ensure_future(bucket.__aenter__())
+        await sleep(0)
+        assert not second.done(), "Only one request should be let through before we have ratelimit info"
+
+        bucket.reset_at = time() + 10
+        bucket.limit = 5
+        bucket.remaining = 4
+        await sleep(0)
+        assert second.done(), "Learning the limits should release pending requests"
+
+    run(inner())
+
+
+def start_server(handler):
+    async def inner():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        return runner, f"http://127.0.0.1:{port}"
+
+    return inner()
+
+
+def test_gets_are_coalesced_and_cached():
+    async def inner():
+        hits = []
+
+        async def handler(request):
+            hits.append(request.path_qs)
+            await sleep(0.01)
+            return web.json_response({"id": "1", "hit": len(hits)})
+
+        runner, url = await start_server(handler)
+        state = State(FakeClient(), TypeSheet.default(), "token", 0, None, http_cache_ttls={"GET:/channels/{channel_id}": 60})  # type: ignore
+        http = state.http
+        http.api_base = url
+
+        channel = Route("GET", "/channels/{channel_id}", channel_id=1)
+        responses = await gather(*(http.request(channel) for _ in range(5)))
+        assert len(hits) == 1, "Identical GETs in flight should share a request"
+        assert all([await response.json() == {"id": "1", "hit": 1} for response in responses])
+
+        await http.request(channel)
+        assert len(hits) == 1, "Cached responses should be reused"
+        await http.request(channel, params={"with_counts": "true"})
+        assert len(hits) == 2, "Different queries should not share a response"
+
+        state.gateway.event_dispatcher.dispatch("CHANNEL_UPDATE", None, {"id": "1"})
+        assert await (await http.request(channel)).json() == {"id": "1", "hit": 3}, "Events should invalidate"
+
+        await http.request(Route("GET", "/guilds/{guild_id}", guild_id=1))
+        await http.request(Route("GET", "/guilds/{guild_id}", guild_id=1))
+        assert len(hits) == 5, "Routes without a ttl should not be cached"
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_route_templates():
+    first = Route(
+        "PUT",
+        "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        channel_id=1,
+        message_id=2,
+        emoji="%F0%9F%91%8D",
+    )
+    second = Route(
+        "PUT",
+        "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        channel_id=3,
+        message_id=4,
+        emoji="a",
+    )
+    assert first.path == "/channels/1/messages/2/reactions/%F0%9F%91%8D/@me"
+    assert first.template is second.template, "Templates should be compiled once"
+    assert first.bucket == (
+        "PUT:/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        (None, 1, None, None),
+    )
+    assert Route("GET", "/guilds/{guild_id}", guild_id=(1,)).path == "/guilds/(1,)"
+    assert Route("GET", "/users/@me").path == "/users/@me"
+    assert RouteTemplate.get("GET", "/users/@me").parameters == ()
+    assert Route("GET", "/channels/5").template is not Route("GET", "/channels/5").template, "Formatted paths leak"
+
+
+def test_prewarm_failures_are_ignored():
+    async def inner():
+        http = make_http()
+
+        def head(*args, **kwargs):
+            raise AsyncioTimeoutError()
+
+        http._session.head = head  # type: ignore
+        await http.prewarm()
+        await http.close()
+
+    run(inner())
+
+
+def test_connection_pool_reuse():
+    async def inner():
+        async def handler(request):
+            return web.json_response({"url": "wss://gateway.discord.gg"})
+
+        runner, url = await start_server(handler)
+        state = State(FakeClient(), TypeSheet.default(), "token", 0, None, http_prewarm_connections=3)  # type: ignore
+        http = state.http
+        http.api_base = url
+
+        await http.prewarm()
+        assert http.pool_stats.created == 3, "Prewarming should open a connection each"
+        for _ in range(5):
+            await (await http.get_gateway_bot()).read()
+        assert http.pool_stats.created == 3, "Requests should reuse the prewarmed connections"
+        assert http.pool_stats.reused == 5
+        assert http.pool_stats.in_flight == 0
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_bulk_requests():
+    async def inner():
+        running = 0
+        most_running = 0
+        bodies = []
+
+        async def handler(request):
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await sleep(0.01)
+            running -= 1
+            if request.can_read_body:
+                bodies.append((request.path, await request.json()))
+            headers = {"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "4", "X-RateLimit-Reset": str(time() + 1)}
+            return web.Response(status=204, headers=headers)
+
+        runner, url = await start_server(handler)
+        http = make_http()
+        http.api_base = url
+
+        recent = int((time() * 1000 - 1420070400000)) << 22
+        deletes = [
+            BulkOperation(
+                Route("DELETE", "/channels/{channel_id}/messages/{message_id}", channel_id=1, message_id=recent + i)
+            )
+            for i in range(3)
+        ]
+        roles = [
+            BulkOperation(
+                Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=1, user_id=i, role_id=2)
+            )
+            for i in range(20)
+        ]
+        results = [result async for result in bulk_request(http, [*deletes, *roles], merge=True)]
+
+        assert len(results) == 23 and all(result.ok for result in results)
+        assert bodies == [("/channels/1/messages/bulk-delete", {"messages": [str(recent + i) for i in range(3)]})]
+        assert 1 < most_running <= 5, "The bucket limit should be saturated but not exceeded"
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_bulk_requests_share_discovered_buckets():
+    async def inner():
+        running = 0
+        most_running = 0
+
+        async def handler(request):
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await sleep(0.01)
+            running -= 1
+            headers = {
+                "X-RateLimit-Bucket": "roles",
+                "X-RateLimit-Limit": "3",
+                "X-RateLimit-Remaining": "100",
+                "X-RateLimit-Reset-After": "1",
+            }
+            return web.Response(status=204, headers=headers)
+
+        runner, url = await start_server(handler)
+        http = make_http()
+        http.api_base = url
+
+        operations = [
+            BulkOperation(
+                Route(method, "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=1, user_id=i, role_id=2)
+            )
+            for i in range(20)
+            for method in ("PUT", "DELETE")
+        ]
+        results = [result async for result in bulk_request(http, operations)]
+
+        assert len(results) == 40 and all(result.ok for result in results)
+        assert most_running <= 3, "Routes under the same bucket hash should share its limit"
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_bulk_request_partial_failures():
+    async def inner():
+        paths = []
+
+        async def handler(request):
+            paths.append(request.path)
+            if request.path.endswith("bulk-delete"):
+                return web.json_response({"code": 50013, "message": "Missing Permissions"}, status=403)
+            if request.path.endswith("bulk-ban"):
+                return web.json_response({"banned_users": ["1"], "failed_users": ["2"]})
+            return web.Response(status=204)
+
+        runner, url = await start_server(handler)
+        http = make_http()
+        http.api_base = url
+
+        recent = int((time() * 1000 - 1420070400000)) << 22
+        deletes = [
+            BulkOperation(
+                Route("DELETE", "/channels/{channel_id}/messages/{message_id}", channel_id=1, message_id=recent + i)
+            )
+            for i in range(2)
+        ]
+        bans = [BulkOperation(Route("PUT", "/guilds/{guild_id}/bans/{user_id}", guild_id=1, user_id=i)) for i in (1, 2)]
+        results = {
+            result.operation.route.path: result async for result in bulk_request(http, [*deletes, *bans], merge=True)
+        }
+
+        assert all(results[operation.route.path].ok for operation in deletes), "Forbidden merges should be retried"
+        assert paths.count("/channels/1/messages/bulk-delete") == 1
+        assert results["/guilds/1/bans/1"].ok and results["/guilds/1/bans/1"].merged
+        assert not results["/guilds/1/bans/2"].ok, "Users discord could not ban should be reported"
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_ratelimits_with_clock_skew():
+    async def inner():
+        # The server clock is 5 seconds behind, so X-RateLimit-Reset is in the past by our clock
+        skew = -5
+        limit, per = 5, 0.2
+        window = {"remaining": limit, "reset": 0.0}
+        statuses = []
+
+        async def handler(request):
+            now = time() + skew
+            headers = {"Date": formatdate(now, usegmt=True), "via": "1.1 google"}
+            if not statuses:
+                statuses.append(429)
+                return web.json_response(
+                    {"message": "", "retry_after": 0.05, "global": True}, status=429, headers=headers
+                )
+            if now >= window["reset"]:
+                window["remaining"], window["reset"] = limit, now + per
+            if window["remaining"] == 0:
+                statuses.append(429)
+                body = {"message": "", "retry_after": window["reset"] - now, "global": False}
+                return web.json_response(body, status=429, headers=headers)
+            window["remaining"] -= 1
+            statuses.append(200)
+            headers |= {
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(window["remaining"]),
+                "X-RateLimit-Reset": str(window["reset"]),
+                "X-RateLimit-Reset-After": str(round(window["reset"] - now, 3)),
+            }
+            return web.json_response({}, headers=headers)
+
+        runner, url = await start_server(handler)
+        http = make_http()
+        http.api_base = url
+
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+        await gather(*(http.request(route) for _ in range(12)))
+        assert statuses.count(200) == 12
+        assert http.ratelimited == 1, "Only the global 429 should be hit"
+        assert abs(http.clock_offset - skew) < 1.5
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
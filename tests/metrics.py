@@ -0,0 +1,107 @@
+from asyncio import run, sleep
+from functools import partial
+
+from benchmarks.fake_discord import FakeDiscord
+from nextcord.client.state import State
+from nextcord.core.http import Route
+from nextcord.core.metrics import CallbackMetrics, PrometheusMetrics, SpanMetrics
+from nextcord.dispatcher import Dispatcher
+from nextcord.type_sheet import TypeSheet
+
+
+class FakeClient:
+    ...
+
+
+def test_prometheus_render():
+    metrics = PrometheusMetrics(buckets=(0.1, 1))
+    metrics.increment("http.ratelimited", tags={"bucket": 'GET:/a"b'})
+    metrics.increment("http.ratelimited", tags={"bucket": 'GET:/a"b'})
+    metrics.gauge("dispatcher.queue", 3)
+    metrics.observe("gateway.parse", 0.05, {"shard": "0"})
+    metrics.observe("gateway.parse", 0.5, {"shard": "0"})
+    metrics.observe("gateway.parse", 5, {"shard": "0"})
+
+    lines = metrics.render().splitlines()
+    assert 'nextcord_http_ratelimited_total{bucket="GET:/a\\"b"} 2' in lines
+    assert "nextcord_dispatcher_queue 3" in lines
+    assert 'nextcord_gateway_parse_seconds_bucket{shard="0",le="0.1"} 1' in lines
+    assert 'nextcord_gateway_parse_seconds_bucket{shard="0",le="1"} 2' in lines
+    assert 'nextcord_gateway_parse_seconds_bucket{shard="0",le="+Inf"} 3' in lines
+    assert 'nextcord_gateway_parse_seconds_count{shard="0"} 3' in lines
+
+
+def test_dispatcher_listener_timing():
+    async def inner():
+        measurements = []
+        metrics = CallbackMetrics(lambda *measurement: measurements.append(measurement))
+
+        async def slow(_):
+            await sleep(0.02)
+
+        def fast(_):
+            ...
+
+        for inline in (False, True):
+            measurements.clear()
+            dispatcher = Dispatcher(inline=inline, metrics=metrics, name="event")
+            dispatcher.add_listener(slow, "TEST")
+            dispatcher.add_listener(fast, "TEST")
+            dispatcher.dispatch("TEST", None)
+            await sleep(0.05)
+
+            timings = {
+                tags["listener"]: value for kind, name, value, tags in measurements if name == "dispatcher.listener"
+            }
+            assert set(timings) == {slow.__qualname__, fast.__qualname__}
+            assert timings[slow.__qualname__] >= 0.02 > timings[fast.__qualname__]
+
+    run(inner())
+
+
+def test_dispatcher_listener_names_are_stable():
+    async def inner():
+        measurements = []
+        metrics = CallbackMetrics(lambda *measurement: measurements.append(measurement))
+
+        class Listener:
+            def __call__(self, *args):
+                ...
+
+        def handler(prefix, _):
+            ...
+
+        dispatcher = Dispatcher(inline=True, metrics=metrics, name="event")
+        for _ in range(2):
+            dispatcher.add_listener(Listener(), "TEST")
+            dispatcher.add_listener(partial(handler, "a"), "TEST")
+        dispatcher.dispatch("TEST", None)
+        await sleep(0)
+
+        names = {tags["listener"] for kind, name, value, tags in measurements if name == "dispatcher.listener"}
+        assert names == {Listener.__qualname__, handler.__qualname__}, "Labels should not grow with every listener"
+
+    run(inner())
+
+
+def test_request_spans():
+    async def inner():
+        spans = []
+        async with FakeDiscord() as discord:
+            state = State(FakeClient(), TypeSheet.default(), "token", 0, None, metrics=SpanMetrics(spans.append))  # type: ignore
+            http = state.http
+            http.api_base = discord.api_base
+
+            with state.metrics.span("export"):
+                await http.request(Route("POST", "/channels/{channel_id}/messages", channel_id=1))
+            await http.close()
+
+        request, export = spans
+        assert request.name == "http.request" and request.attributes == {
+            "route": "POST:/channels/{channel_id}/messages"
+        }
+        assert request.parent_id == export.span_id and request.trace_id == export.span_id
+        assert {name for _, name, _, _ in request.events} >= {"http.bucket.queue", "http.bucket.wait"}
+        assert export.duration >= request.duration
+
+    run(inner())
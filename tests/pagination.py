@@ -0,0 +1,118 @@
+from asyncio import all_tasks, run, sleep
+
+from aiohttp import web
+
+from nextcord.client.state import State
+from nextcord.core.pagination import iter_json_array, iter_messages
+from nextcord.type_sheet import TypeSheet
+from nextcord.utils import json
+
+
+class FakeClient:
+    ...
+
+
+class FakeContent:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    async def read(self, size: int) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def test_json_array_split_across_chunks():
+    async def inner():
+        data = '[ {"id": "1", "content": "héllo, [world]"} ,12345, "a\\"b" ,[1, {"c": null}]]'.encode()
+        expected = [{"id": "1", "content": "héllo, [world]"}, 12345, 'a"b', [1, {"c": None}]]
+        for chunk_size in (1, 2, 3, 7, 1000):
+            assert [entry async for entry in iter_json_array(FakeContent(data), chunk_size)] == expected  # type: ignore
+        assert [entry async for entry in iter_json_array(FakeContent(b" [ ] "))] == []  # type: ignore
+
+    run(inner())
+
+
+def test_messages_are_paginated_with_prefetch():
+    async def inner():
+        requests = []
+        consumed = 0
+
+        async def handler(request):
+            requests.append((dict(request.query), consumed))
+            before = int(request.query.get("before", 251))
+            limit = int(request.query["limit"])
+            messages = [{"id": str(i)} for i in range(before - 1, max(before - 1 - limit, 0), -1)]
+            return web.Response(body=json.dumps(messages), content_type="application/json")
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+
+        state = State(FakeClient(), TypeSheet.default(), "token", 0, None)  # type: ignore
+        http = state.http
+        http.api_base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"  # type: ignore
+
+        ids = []
+        async for message in iter_messages(http, 1):
+            ids.append(int(message["id"]))
+            consumed += 1
+            await sleep(0)
+        assert ids == list(range(250, 0, -1))
+        assert [query for query, _ in requests] == [
+            {"limit": "100"},
+            {"limit": "100", "before": "151"},
+            {"limit": "100", "before": "51"},
+        ]
+        assert requests[1][1] < 100, "The next page should be requested before the current one is consumed"
+
+        assert len([message async for message in iter_messages(http, 1, limit=120)]) == 120
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
+
+
+def test_stopping_early_ends_the_producer():
+    async def inner():
+        async def handler(request):
+            messages = [{"id": str(i)} for i in range(100, 0, -1)]
+            return web.Response(body=json.dumps(messages), content_type="application/json")
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+
+        state = State(FakeClient(), TypeSheet.default(), "token", 0, None)  # type: ignore
+        http = state.http
+        http.api_base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"  # type: ignore
+
+        async def producers():
+            return [task for task in all_tasks() if task.get_coro().__qualname__ == "Paginator._produce"]
+
+        messages = iter_messages(http, 1).__aiter__()
+        await messages.__anext__()
+        # Let the producer fill the queue so it is waiting to put
+        await sleep(0.1)
+        assert await producers()
+        await messages.aclose()
+        for _ in range(10):
+            await sleep(0)
+        assert not await producers(), "The producer should not wait for a consumer which stopped"
+
+        async for _ in iter_messages(http, 1):
+            break
+        for _ in range(10):
+            await sleep(0)
+        assert not await producers()
+
+        await http.close()
+        await runner.cleanup()
+
+    run(inner())
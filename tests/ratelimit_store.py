@@ -0,0 +1,189 @@
+import os
+from asyncio import get_running_loop, run, sleep, start_unix_server, wait_for
+from multiprocessing import get_context
+from time import time
+
+from nextcord.client.state import State
+from nextcord.core.http import Route
+from nextcord.core.ratelimit_store import (
+    BrokerRatelimitStore,
+    MMapRatelimitStore,
+    RatelimitBroker,
+    SharedBucket,
+)
+from nextcord.type_sheet import TypeSheet
+
+
+async def assert_shares_fixed_window(first, second):
+    await first.acquire("global", limit=2, per=0.3)
+    await second.acquire("global", limit=2, per=0.3)
+
+    waiter = get_running_loop().create_task(first.acquire("global", limit=2, per=0.3))
+    await sleep(0.1)
+    assert not waiter.done(), "Uses from both stores should count towards the same window"
+    await wait_for(waiter, 1)
+
+
+async def assert_shares_header_limits(first, second):
+    first.update("bucket", 5, 0, time() + 0.3)
+    await sleep(0)  # Updates are sent without waiting for the broker
+    waiter = get_running_loop().create_task(second.acquire("bucket"))
+    await sleep(0.1)
+    assert not waiter.done(), "Limits set from one store should apply to the other"
+    await wait_for(waiter, 1)
+
+
+async def assert_shares_header_windows(first, second):
+    # Every response computes the reset from its own Reset-After, so they never match exactly
+    reset_at = time() + 0.3
+    first.update("window", 5, 2, reset_at)
+    second.update("window", 5, 4, reset_at + 0.004)
+    first.update("window", 5, 3, reset_at - 0.002)
+    await sleep(0)
+
+    await second.acquire("window")
+    await first.acquire("window")
+    waiter = get_running_loop().create_task(second.acquire("window"))
+    await sleep(0.1)
+    assert not waiter.done(), "Responses of the same window should not give back uses taken by the other process"
+    await wait_for(waiter, 1)
+
+
+def test_mmap_store_is_shared(tmp_path):
+    async def inner():
+        path = str(tmp_path / "ratelimits")
+        first = MMapRatelimitStore(path, poll_interval=0.05)
+        second = MMapRatelimitStore(path, poll_interval=0.05)
+
+        await assert_shares_fixed_window(first, second)
+        await assert_shares_header_limits(first, second)
+        await assert_shares_header_windows(first, second)
+
+        await first.close()
+        await second.close()
+
+    run(inner())
+
+
+def update_window(path, reset_at):
+    store = MMapRatelimitStore(path)
+    store.update("window", 5, 4, reset_at)
+    run(store.close())
+
+
+def test_mmap_store_windows_across_processes(tmp_path):
+    async def inner():
+        path = str(tmp_path / "ratelimits")
+        store = MMapRatelimitStore(path, poll_interval=0.05)
+        reset_at = time() + 0.5
+        store.update("window", 5, 1, reset_at)
+
+        # A response of the same window from another process, sent before this process used up the window
+        process = get_context("fork").Process(target=update_window, args=(path, reset_at + 0.01))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+
+        await store.acquire("window")
+        waiter = get_running_loop().create_task(store.acquire("window"))
+        await sleep(0.1)
+        assert not waiter.done(), "The other process should not give back uses of the window"
+        await wait_for(waiter, 1)
+        await store.close()
+
+    run(inner())
+
+
+def test_broker_store_is_shared(tmp_path):
+    async def inner():
+        path = str(tmp_path / "broker.sock")
+        broker = RatelimitBroker(path)
+        await broker.start()
+        first = BrokerRatelimitStore(path)
+        second = BrokerRatelimitStore(path)
+
+        await assert_shares_fixed_window(first, second)
+        await assert_shares_header_limits(first, second)
+        await assert_shares_header_windows(first, second)
+
+        await first.close()
+        await second.close()
+        await broker.close()
+
+    run(inner())
+
+
+def test_broker_store_reconnects(tmp_path):
+    async def inner():
+        path = str(tmp_path / "broker.sock")
+        connections = []
+
+        async def unresponsive(reader, writer):
+            # Takes the request without answering, like a broker dying in the middle of it
+            connections.append(writer)
+            await reader.read()
+
+        server = await start_unix_server(unresponsive, path)
+        store = BrokerRatelimitStore(path)
+        waiter = get_running_loop().create_task(store.acquire("bucket"))
+        await sleep(0.1)
+        assert not waiter.done()
+
+        server.close()
+        for writer in connections:
+            writer.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        try:
+            await wait_for(waiter, 1)
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+        else:
+            raise AssertionError("Acquiring should fail when the broker is gone and cannot be reached")
+
+        broker = RatelimitBroker(path)
+        await broker.start()
+        await wait_for(store.acquire("bucket"), 1)
+
+        # Restarting the broker drops the connection, the store should connect to the new one
+        await broker.close()
+        broker = RatelimitBroker(path)
+        await broker.start()
+        await wait_for(store.acquire("bucket"), 1)
+
+        await store.close()
+        await broker.close()
+
+    run(inner())
+
+
+class FakeClient:
+    ...
+
+
+def test_shared_buckets_use_the_bucket_hash(tmp_path):
+    async def inner():
+        store = MMapRatelimitStore(str(tmp_path / "ratelimits"))
+        type_sheet = TypeSheet.default()
+        type_sheet.http_bucket = SharedBucket.using(store)
+        first = State(FakeClient(), type_sheet, "token", 0, None).http  # type: ignore
+        second = State(FakeClient(), type_sheet, "token", 0, None).http  # type: ignore
+
+        # Each process reaches the same discord bucket through a different route
+        send = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+        edit = Route("PATCH", "/channels/{channel_id}/messages/{message_id}", channel_id=1, message_id=2)
+        first_bucket = first._get_bucket(send)
+        second_bucket = second._get_bucket(edit)
+        assert first_bucket._key != second_bucket._key, "Routes are all we know before the hash"
+
+        first._set_bucket_hash(send, first_bucket, "abc")
+        second._set_bucket_hash(edit, second_bucket, "abc")
+        assert first._get_bucket(send)._key == second._get_bucket(edit)._key
+        other_channel = Route("POST", "/channels/{channel_id}/messages", channel_id=3)
+        assert first._get_bucket(other_channel)._key == "abc:None:3:None:None"
+
+        await first.close()
+        await second.close()
+        await store.close()
+
+    run(inner())
@@ -0,0 +1,51 @@
+from asyncio import gather, get_running_loop, run, sleep
+
+from nextcord.core.ratelimiter import TimerWheel, TimesPer
+
+
+def test_times_per_releases_in_order():
+    async def inner():
+        ratelimiter = TimesPer(2, 0.1)
+        order = []
+
+        async def use(number: int):
+            async with ratelimiter:
+                order.append(number)
+
+        await gather(*(use(number) for number in range(6)))
+        assert order == list(range(6)), "Waiters should be released oldest first"
+
+    run(inner())
+
+
+def test_times_per_limits_per_window():
+    async def inner():
+        ratelimiter = TimesPer(2, 0.2)
+        for _ in range(2):
+            await ratelimiter.acquire()
+
+        waiter = get_running_loop().create_task(ratelimiter.acquire())
+        await sleep(0.1)
+        assert not waiter.done(), "Third use in a window should wait"
+        await sleep(0.2)
+        assert waiter.done(), "Reset should release the waiter"
+
+    run(inner())
+
+
+def test_timer_wheel_never_fires_early():
+    async def inner():
+        loop = get_running_loop()
+        wheel = TimerWheel(loop, resolution=0.01)
+        fired = {}
+
+        for delay in (0, 0.015, 0.05):
+            wheel.schedule(delay, lambda delay=delay: fired.setdefault(delay, loop.time()))
+        start = loop.time()
+
+        await sleep(0.1)
+        assert len(wheel) == 0, "Every callback should have fired"
+        for delay, fired_at in fired.items():
+            assert fired_at - start >= delay - 0.001, "Callback fired early"
+
+    run(inner())
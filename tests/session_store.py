@@ -0,0 +1,32 @@
+from asyncio import run
+
+from nextcord.core.gateway.session_store import (
+    FileSessionStore,
+    SessionInfo,
+    SQLiteSessionStore,
+)
+
+
+def round_trip(store_type, path):
+    async def inner():
+        sessions = {0: SessionInfo("abc", 42, "wss://resume.discord.gg", 2), 1: SessionInfo("def", None, None, 2)}
+        await store_type(path).save(sessions)
+
+        store = store_type(path)
+        assert await store.load(0) == sessions[0]
+        assert await store.load(1) == sessions[1]
+        assert await store.load(2) is None
+
+        await store.save({0: SessionInfo("ghi", 1, None, 2)})
+        assert (await store_type(path).load(0)).session_id == "ghi", "Saving should replace the old session"
+        assert (await store_type(path).load(1)).session_id == "def", "Saving should keep other sessions"
+
+    run(inner())
+
+
+def test_file_session_store(tmp_path):
+    round_trip(FileSessionStore, str(tmp_path / "sessions.json"))
+
+
+def test_sqlite_session_store(tmp_path):
+    round_trip(SQLiteSessionStore, str(tmp_path / "sessions.db"))
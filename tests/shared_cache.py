@@ -0,0 +1,98 @@
+from asyncio import run
+
+from nextcord import Client, Intents
+from nextcord.core.cache import UserRecord
+from nextcord.core.shared_cache import MMapStore, Shared
+
+
+def test_processes_share_entities(tmp_path):
+    async def inner():
+        shared = Shared(str(tmp_path), slot_count=64, max_roles=2)
+        policies = {"guilds": shared, "channels": shared, "members": shared, "users": shared}
+        writer = Client("token", Intents(), cache_policies=policies)
+        reader = Client("token", Intents(), cache_policies=policies)
+
+        guild = {
+            "id": "613425648685547541",
+            "name": "ü" * 150,
+            "owner_id": "1",
+            "icon": None,
+            "channels": [{"id": "2", "type": 0, "name": "general", "position": 0}],
+            "members": [
+                {"user": {"id": "3", "username": "three", "discriminator": "0003"}, "roles": ["4"], "nick": None},
+                {"user": {"id": "5", "username": "five", "discriminator": "0005"}, "roles": ["4", "6", "7"]},
+            ],
+        }
+        writer.state.gateway.event_dispatcher.dispatch("GUILD_CREATE", None, guild)
+        cache = reader.state.cache
+
+        assert cache.get_guild(613425648685547541).name == "ü" * 100, "Names should be cut on a character boundary"
+        assert cache.get_channel(2).parent_id is None and cache.get_channel(2).position == 0
+        assert cache.get_member(613425648685547541, 3).roles == (4,)
+        assert cache.get_member(613425648685547541, 5) is None, "Members with too many roles should not be cached"
+        assert cache.get_user(5).username == "five"
+
+        member_update = {"guild_id": "613425648685547541", "user": {"id": "3", "username": "new", "discriminator": "0"}}
+        writer.state.gateway.event_dispatcher.dispatch("GUILD_MEMBER_UPDATE", None, {**member_update, "nick": "x"})
+        assert cache.get_member(613425648685547541, 3).nick == "x", "Updates should be written back"
+
+        writer.state.gateway.event_dispatcher.dispatch("CHANNEL_DELETE", None, {"id": "2", "type": 0})
+        assert cache.get_channel(2) is None
+        assert len(cache.members) == 1
+
+        await writer.state.http.close()
+        await reader.state.http.close()
+
+    run(inner())
+
+
+def test_deleted_slots_are_reused(tmp_path):
+    store = MMapStore(str(tmp_path / "users.cache"), "users", slot_count=4)
+    for user_id in range(1, 20):
+        store[user_id] = UserRecord(user_id, "name", "0001", None, False)
+        store.pop(user_id)
+    store[20] = UserRecord(20, "name", "0001", None, True)
+    assert store.get(20).bot
+    assert len(store) == 1
+    store.close()
+
+
+def test_dead_writers_do_not_block_readers(tmp_path):
+    store = MMapStore(str(tmp_path / "users.cache"), "users", slot_count=4)
+    store[1] = UserRecord(1, "name", "0001", None, False)
+    offset = next(offset for offset in range(0, len(store._map), store._slot_size) if store._map[offset + 4] == 1)
+    # A writer died in the middle of writing the slot, leaving its version odd
+    version, *header = store._header.unpack_from(store._map, offset)
+    store._header.pack_into(store._map, offset, version + 1, *header)
+
+    assert store.get(1) is None, "A slot stuck being written should read as a miss"
+    assert len(store) == 0
+    store[1] = UserRecord(1, "new", "0001", None, False)
+    assert store.get(1).username == "new", "Writing the slot again should repair it"
+    assert store.pop(1).username == "new", "Popping should return the removed record"
+    assert store.pop(1, "default") == "default"
+    store.close()
+
+
+def test_deleted_slots_are_compacted(tmp_path):
+    store = MMapStore(str(tmp_path / "users.cache"), "users", slot_count=64)
+    for user_id in range(1, 8):
+        store[user_id] = UserRecord(user_id, "kept", "0001", None, False)
+    for user_id in range(100, 10_000):
+        store[user_id] = UserRecord(user_id, "churn", "0001", None, False)
+        store.pop(user_id)
+
+    probed = 0
+    read = store._read
+
+    def counting_read(offset, key):
+        nonlocal probed
+        probed += 1
+        return read(offset, key)
+
+    store._read = counting_read
+    assert store.get(50) is None
+    assert probed < 32, "Misses should stop at a empty slot instead of scanning every deleted one"
+    assert [store.get(user_id).username for user_id in range(1, 8)] == ["kept"] * 7, "Compacting should keep records"
+    assert len(store) == 7
+    store.close()
@@ -0,0 +1,43 @@
+from asyncio import Event, run, wait_for
+
+from benchmarks.fake_discord import FakeDiscord, bucket_key, load_trace
+from nextcord import Client, Intents
+from nextcord.core.http import Route
+
+
+def test_bucket_keys():
+    assert bucket_key("GET", "/channels/1/messages/2") == "GET:/channels/1/messages/{id}"
+    assert bucket_key("GET", "/channels/1/messages/2", keep_major=False) == "GET:/channels/{id}/messages/{id}"
+
+
+def test_client_against_fake_discord():
+    async def inner():
+        events = load_trace()[:50]
+        async with FakeDiscord(
+            events=events, loops=2, shards=2, max_concurrency=2, route_limit=2, route_per=0.2
+        ) as discord:
+            client = Client("token", Intents())
+            client.state.http.api_base = discord.api_base
+            received = 0
+            done = Event()
+
+            def listener(*_):
+                nonlocal received
+                received += 1
+                if received == (len(events) * 2 + 1) * 2:
+                    done.set()
+
+            client.state.gateway.event_dispatcher.add_listener(listener)
+            await client.state.gateway.connect()
+            await wait_for(done.wait(), 10)
+            assert discord.identifies == 2
+
+            route = Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+            for _ in range(6):
+                await client.state.http.request(route, json={"content": "hello"})
+            assert discord.ratelimited == 0, "The client should wait for the bucket instead of hitting 429s"
+
+            await client.state.gateway.close()
+            await client.state.http.close()
+
+    run(inner())